@@ -12,6 +12,7 @@ from app.core.database import get_db
 from app.core.auth import get_current_user
 from app.models.user import User
 from app.models.enterprise import Enterprise
+from app.services.enterprise_cache import enterprise_cache
 from app.schemas.enterprise import DataConnector
 
 router = APIRouter(prefix="/api/connectors", tags=["connectors"])
@@ -142,8 +143,7 @@ async def setup_connector(
 
 @router.get("/configured")
 async def list_configured_connectors(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     List all configured connectors for the enterprise
@@ -151,13 +151,10 @@ async def list_configured_connectors(
     if not current_user.enterprise_id:
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
-    # Get enterprise to check configured connectors
-    result = await db.execute(
-        select(Enterprise).where(Enterprise.id == current_user.enterprise_id)
-    )
-    enterprise = result.scalar_one()
+    # Get enterprise to check configured connectors (cached snapshot, read-only)
+    enterprise = await enterprise_cache.get(current_user.enterprise_id)
     
-    configured_connectors = enterprise.connected_systems or {}
+    configured_connectors = (enterprise or {}).get("connected_systems") or {}
     
     # Format response with status information
     connectors_info = []
@@ -2,7 +2,7 @@
 Documents API - Enhanced from ai-chatbot for enterprise document management
 Supports advanced file types and batch processing
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from typing import List, Optional
@@ -12,6 +12,7 @@ from datetime import datetime
 
 from app.core.database import get_db
 from app.core.auth import get_current_user
+from app.core.pagination import apply_keyset, next_cursor, NEXT_CURSOR_HEADER
 from app.models.user import User
 from app.models.document import Document
 from app.services.document_service import DocumentService
@@ -87,8 +88,10 @@ async def upload_document(
 
 @router.get("/")
 async def list_documents(
+    response: Response,
     limit: int = Query(20, description="Number of documents to return"),
-    offset: int = Query(0, description="Number of documents to skip"),
+    offset: int = Query(0, description="Number of documents to skip (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     category: Optional[str] = Query(None, description="Filter by category"),
     department_id: Optional[int] = Query(None, description="Filter by department"),
     processed_only: bool = Query(True, description="Show only processed documents"),
@@ -98,14 +101,29 @@ async def list_documents(
     """
     List enterprise documents with filtering
     Enhanced with enterprise-specific metadata
+    Uses keyset pagination on (created_at, id); follow X-Next-Cursor for the next page
     """
     if not current_user.enterprise_id:
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
-    # Build query with filters
-    query = select(Document).where(
+    # Select only the listed columns - skips metadata, error text and ACL blobs
+    query = select(
+        Document.id,
+        Document.filename,
+        Document.category,
+        Document.department_id,
+        Document.tags,
+        Document.is_confidential,
+        Document.fiscal_period,
+        Document.file_size,
+        Document.processed,
+        Document.chunks_count,
+        Document.created_at,
+        Document.processed_at,
+        Document.user_id
+    ).where(
         Document.enterprise_id == current_user.enterprise_id
-    ).order_by(desc(Document.created_at))
+    )
     
     if category:
         query = query.where(Document.category == category)
@@ -113,11 +131,18 @@ async def list_documents(
         query = query.where(Document.department_id == department_id)
     if processed_only:
         query = query.where(Document.processed == True)
-        
-    query = query.offset(offset).limit(limit)
+    
+    query = apply_keyset(query, Document.created_at, Document.id, cursor)
+    if not cursor and offset:
+        query = query.offset(offset)
+    query = query.limit(limit)
     
     result = await db.execute(query)
-    documents = result.scalars().all()
+    documents = result.all()
+    
+    cursor_value = next_cursor(documents, limit)
+    if cursor_value:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
     
     return [
         {
@@ -178,7 +203,7 @@ async def get_document_details(
         "processed": document.processed,
         "chunks_count": document.chunks_count,
         "processing_time_seconds": document.processing_time_seconds,
-        "metadata": document.metadata,
+        "metadata": document.doc_metadata,
         "created_at": document.created_at,
         "processed_at": document.processed_at,
         "uploaded_by": document.user_id,
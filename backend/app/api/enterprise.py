@@ -2,7 +2,7 @@
 Enterprise API routes - Core business intelligence endpoints
 Enhanced from ai-chatbot with advanced query processing
 """
-from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from typing import List, Optional, Dict, Any
@@ -10,10 +10,23 @@ from datetime import datetime, timedelta
 
 from app.core.database import get_db
 from app.core.auth import get_current_user
+from app.core.rate_limit import enforce_query_limits
+from app.core.pagination import apply_keyset, next_cursor, NEXT_CURSOR_HEADER
 from app.models.user import User
-from app.models.enterprise import Enterprise, Department
+from app.models.enterprise import Enterprise
 from app.models.enterprise_query import EnterpriseQuery, QueryType, QueryComplexity
 from app.services.enterprise_analysis_service import EnterpriseAnalysisService
+from app.services.query_scheduler import QueryRejected, query_scheduler
+from app.services.query_coalescer import query_coalescer
+from app.services.extractive_answering import extractive_answerer
+from app.services.prompt_templates import prefix_cache_stats
+from app.services.enterprise_cache import enterprise_cache
+from app.services.conversation_memory import conversation_memory
+from app.services.table_query_engine import table_query_engine
+from app.services.vector_shards import shard_router
+from app.services.reranker import reranker
+from app.services.response_store import load_body
+from app.services.audit_writer import audit_writer
 from app.schemas.enterprise import (
     EnterpriseQuery as EnterpriseQuerySchema,
     EnterpriseResponse,
@@ -24,7 +37,7 @@ from app.schemas.enterprise import (
 router = APIRouter(prefix="/api/enterprise", tags=["enterprise"])
 
 
-@router.post("/query", response_model=EnterpriseResponse)
+@router.post("/query", response_model=EnterpriseResponse, dependencies=[Depends(enforce_query_limits)])
 async def process_enterprise_query(
     request: EnterpriseQuerySchema,
     current_user: User = Depends(get_current_user),
@@ -37,6 +50,12 @@ async def process_enterprise_query(
     if not current_user.enterprise_id:
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
+    # department_id is an FK of the audit row; reject unknown ones here, not at write time
+    if request.department_id is not None:
+        enterprise = await enterprise_cache.get(current_user.enterprise_id)
+        if not enterprise or request.department_id not in {d["id"] for d in enterprise["departments"]}:
+            raise HTTPException(status_code=400, detail="Unknown department for this enterprise")
+    
     # Initialize analysis service
     analysis_service = EnterpriseAnalysisService()
     
@@ -47,7 +66,9 @@ async def process_enterprise_query(
             enterprise_id=current_user.enterprise_id,
             user_id=current_user.id,
             db=db,
-            department_id=request.department_id
+            department_id=request.department_id,
+            priority=request.priority,
+            parent_query_id=request.parent_query_id
         )
         
         return EnterpriseResponse(
@@ -62,14 +83,22 @@ async def process_enterprise_query(
             suggested_follow_ups=result["suggested_follow_ups"]
         )
         
+    except QueryRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
 
 @router.get("/queries/history", response_model=List[QueryHistoryResponse])
 async def get_query_history(
+    response: Response,
     limit: int = Query(20, description="Number of queries to return"),
-    offset: int = Query(0, description="Number of queries to skip"),
+    offset: int = Query(0, description="Number of queries to skip (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     query_type: Optional[QueryType] = Query(None, description="Filter by query type"),
     complexity: Optional[QueryComplexity] = Query(None, description="Filter by complexity"),
     current_user: User = Depends(get_current_user),
@@ -78,24 +107,42 @@ async def get_query_history(
     """
     Get enterprise query history with filtering
     Useful for analytics and finding previous analyses
+    Uses keyset pagination on (created_at, id); follow X-Next-Cursor for the next page
     """
     if not current_user.enterprise_id:
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
-    # Build query with filters
-    query = select(EnterpriseQuery).where(
+    # Select only the listed columns - skips ai_response and JSON blobs
+    query = select(
+        EnterpriseQuery.id,
+        EnterpriseQuery.original_query,
+        EnterpriseQuery.query_type,
+        EnterpriseQuery.complexity,
+        EnterpriseQuery.confidence_score,
+        EnterpriseQuery.processing_time_ms,
+        EnterpriseQuery.created_at,
+        EnterpriseQuery.was_helpful,
+        EnterpriseQuery.user_satisfaction
+    ).where(
         EnterpriseQuery.enterprise_id == current_user.enterprise_id
-    ).order_by(desc(EnterpriseQuery.created_at))
+    )
     
     if query_type:
         query = query.where(EnterpriseQuery.query_type == query_type)
     if complexity:
         query = query.where(EnterpriseQuery.complexity == complexity)
-        
-    query = query.offset(offset).limit(limit)
+    
+    query = apply_keyset(query, EnterpriseQuery.created_at, EnterpriseQuery.id, cursor)
+    if not cursor and offset:
+        query = query.offset(offset)
+    query = query.limit(limit)
     
     result = await db.execute(query)
-    queries = result.scalars().all()
+    queries = result.all()
+    
+    cursor_value = next_cursor(queries, limit)
+    if cursor_value:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
     
     return [
         QueryHistoryResponse(
@@ -126,6 +173,8 @@ async def get_query_details(
     if not current_user.enterprise_id:
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
+    # Async audit writes may still hold the row; it is written before being read back
+    await audit_writer.ensure_written(query_id)
     result = await db.execute(
         select(EnterpriseQuery).where(
             EnterpriseQuery.id == query_id,
@@ -137,13 +186,17 @@ async def get_query_details(
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     
+    # Response body lives in cold storage; fetched only for this detail view
+    body = await load_body(db, query.id, query.created_at)
+    
     return {
         "id": query.id,
         "original_query": query.original_query,
         "query_type": query.query_type,
         "complexity": query.complexity,
-        "ai_response": query.ai_response,
-        "structured_data": query.structured_data,
+        "ai_response": body["ai_response"],
+        "structured_data": body["structured_data"],
+        "conversation_context": body["conversation_context"],
         "confidence_score": query.confidence_score,
         "processing_time_ms": query.processing_time_ms,
         "documents_used": query.documents_used,
@@ -171,6 +224,7 @@ async def submit_query_feedback(
     satisfaction = body.get("satisfaction")  # 1-5 rating
     feedback_text = body.get("feedback_text")
     
+    await audit_writer.ensure_written(query_id)
     result = await db.execute(
         select(EnterpriseQuery).where(
             EnterpriseQuery.id == query_id,
@@ -260,10 +314,30 @@ async def get_enterprise_stats(
     )
 
 
+@router.get("/stats/query-engine")
+async def get_query_engine_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Live counters of this worker's query pipeline
+    How often the extractive fast path answers without the LLM, scheduler load and coalescing
+    """
+    return {
+        "extractive": extractive_answerer.report(),
+        "scheduler": query_scheduler.stats(),
+        "coalescing": {**query_coalescer.stats, "in_flight": query_coalescer.in_flight()},
+        "prompt_prefix_cache": prefix_cache_stats(),
+        "enterprise_cache": enterprise_cache.stats(),
+        "conversations": conversation_memory.stats,
+        "table_queries": table_query_engine.report(),
+        "vector_shards": shard_router.report(),
+        "reranking": reranker.report()
+    }
+
+
 @router.get("/departments", response_model=List[Dict])
 async def get_departments(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get departments for the current enterprise
@@ -272,17 +346,15 @@ async def get_departments(
     if not current_user.enterprise_id:
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
-    result = await db.execute(
-        select(Department).where(Department.enterprise_id == current_user.enterprise_id)
-    )
-    departments = result.scalars().all()
+    enterprise = await enterprise_cache.get(current_user.enterprise_id)
+    departments = enterprise["departments"] if enterprise else []
     
     return [
         {
-            "id": dept.id,
-            "name": dept.name,
-            "code": dept.code,
-            "description": dept.description
+            "id": dept["id"],
+            "name": dept["name"],
+            "code": dept["code"],
+            "description": dept["description"]
         }
         for dept in departments
     ]
@@ -303,6 +375,7 @@ async def export_query_results(
     export_format = body.get("format", "pdf")  # pdf, excel, csv
     
     # Validate query exists and user has access
+    await audit_writer.ensure_written(query_id)
     result = await db.execute(
         select(EnterpriseQuery).where(
             EnterpriseQuery.id == query_id,
@@ -338,6 +411,7 @@ async def get_similar_queries(
         raise HTTPException(status_code=400, detail="User not associated with enterprise")
     
     # Get the original query
+    await audit_writer.ensure_written(query_id)
     result = await db.execute(
         select(EnterpriseQuery).where(
             EnterpriseQuery.id == query_id,
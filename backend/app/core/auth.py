@@ -2,21 +2,40 @@
 Authentication and authorization for Enterprise AI Brain
 Enhanced from ai-chatbot with enterprise features
 """
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy import select, event, inspect
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Pinning min = max = default rounds makes verify_and_update
+# flag every hash made at another cost, so changing BCRYPT_ROUNDS rehashes on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_pending_hash_jobs = 0
 
 # JWT token scheme
 security = HTTPBearer()
@@ -24,15 +43,81 @@ security = HTTPBearer()
 # Router for auth endpoints
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
+# Decoded token -> user id, and user id -> active-user projection.
+# Per process: other workers see a deactivation or role change within the TTL.
+token_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+user_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+
+# Columns needed by request handlers; everything else stays in the database
+USER_PROJECTION = (
+    User.id, User.email, User.name, User.enterprise_id, User.department_id,
+    User.role, User.is_active, User.is_verified, User.created_at
+)
+
+_STALE_USERS_KEY = "auth_cache_stale_users"
+
+
+def invalidate_user(user_id: int) -> None:
+    """Evict a cached user; call after bulk UPDATEs that bypass ORM events"""
+    user_cache.pop(user_id)
+
+
+@event.listens_for(User.is_active, "set")
+@event.listens_for(User.role, "set")
+def _invalidate_user_on_change(target, value, oldvalue, initiator):
+    """Deactivation and role changes take effect on the next request"""
+    state = inspect(target)
+    if not state.has_identity or value == oldvalue:
+        return
+    invalidate_user(target.id)
+    # Evict again on commit, in case a concurrent request re-cached the old row
+    if state.session is not None:
+        state.session.info.setdefault(_STALE_USERS_KEY, set()).add(target.id)
+
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop(_STALE_USERS_KEY, ()):
+        invalidate_user(user_id)
+
+
+async def _run_hash_job(func: Callable[..., Any], *args) -> Any:
+    """
+    Run a bcrypt call on the hashing pool
+    Beyond PASSWORD_HASH_MAX_PENDING queued jobs the caller gets a 429 instead of waiting
+    """
+    global _pending_hash_jobs
+    if _pending_hash_jobs >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Authentication service busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    
+    _pending_hash_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending_hash_jobs -= 1
 
 
-def get_password_hash(password: str) -> str:
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password against its hash
+    Returns (valid, new_hash); new_hash is set when the stored hash uses an outdated cost
+    """
+    return await _run_hash_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password, rounds=settings.BCRYPT_ROUNDS)
+    return await _run_hash_job(pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -59,32 +144,43 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(
-            credentials.credentials, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    # Get user from database
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    token = credentials.credentials
+    user_id = token_cache.get(token)
     
-    if user is None:
-        raise credentials_exception
+    if user_id is None:
+        try:
+            payload = jwt.decode(
+                token, 
+                settings.JWT_SECRET_KEY, 
+                algorithms=[settings.JWT_ALGORITHM]
+            )
+            user_id = int(payload.get("sub"))
+        except (JWTError, TypeError, ValueError):
+            raise credentials_exception
+        
+        # Never serve a token from cache past its own expiry
+        expires_at = payload.get("exp")
+        token_cache.set(token, user_id, ttl_seconds=expires_at - time.time() if expires_at else None)
     
-    if not user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User account is disabled"
-        )
+    projection = user_cache.get(user_id)
+    if projection is None:
+        result = await db.execute(select(*USER_PROJECTION).where(User.id == user_id))
+        row = result.first()
+        
+        if row is None:
+            raise credentials_exception
+        
+        projection = dict(row._mapping)
+        if not projection["is_active"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User account is disabled"
+            )
+        # Only active users are cached, so reactivation needs no invalidation
+        user_cache.set(user_id, projection)
     
-    return user
+    # Detached, read-only view of the user; not attached to the request session
+    return User(**projection)
 
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -106,7 +202,8 @@ async def login(
     result = await db.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(password, user.password_hash):
+    valid, new_hash = await verify_password(password, user.password_hash) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -119,6 +216,11 @@ async def login(
             detail="User account is disabled"
         )
     
+    # Transparently move the hash to the configured cost
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+    
     # Create access token
     access_token_expires = timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -159,7 +261,7 @@ async def register(
     # Create new user
     user = User(
         email=email,
-        password_hash=get_password_hash(password),
+        password_hash=await get_password_hash(password),
         name=name,
         enterprise_id=enterprise_id,
         role="user",
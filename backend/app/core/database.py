@@ -9,9 +9,14 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def async_database_url() -> str:
+    """DATABASE_URL rewritten for the asyncpg driver"""
+    return settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
+
+
 # Create async engine
 engine = create_async_engine(
-    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+    async_database_url(),
     echo=settings.DEBUG,
     pool_pre_ping=True,
     pool_recycle=300,
@@ -50,6 +55,27 @@ async def create_tables():
         raise
 
 
+async def run_migrations():
+    """Upgrade the database schema to the latest Alembic revision"""
+    import asyncio
+    import os
+    from alembic import command
+    from alembic.config import Config
+    
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    alembic_cfg = Config(os.path.join(backend_dir, "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", os.path.join(backend_dir, "migrations"))
+    alembic_cfg.attributes["configure_logger"] = False
+    
+    try:
+        # env.py drives its own event loop, so run it off the app's loop
+        await asyncio.to_thread(command.upgrade, alembic_cfg, "head")
+        logger.info("✅ Database migrations applied")
+    except Exception as e:
+        logger.error(f"❌ Error applying database migrations: {e}")
+        raise
+
+
 async def drop_tables():
     """Drop all database tables (use with caution!)"""
     try:
@@ -0,0 +1,238 @@
+"""
+Rate limiting and query quotas for Enterprise AI Brain
+Token buckets per user and per enterprise, plus daily/monthly query quotas
+from the Enterprise plan, enforced before any DB or LLM work is done
+"""
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Depends, HTTPException, Response, status
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.models.user import User
+from app.services.enterprise_cache import enterprise_cache
+
+logger = logging.getLogger(__name__)
+
+# (key, capacity, refill per second)
+Bucket = Tuple[str, float, float]
+# (allowed, [(tokens left, seconds until one token is available) per bucket])
+BucketResult = Tuple[bool, List[Tuple[float, float]]]
+
+
+def _levels(buckets: Sequence[Bucket], tokens: Sequence[float]) -> List[Tuple[float, float]]:
+    return [
+        (left, 0.0 if left >= 1 else (1 - left) / rate)
+        for (_, _, rate), left in zip(buckets, tokens)
+    ]
+
+
+class MemoryRateLimitStore:
+    """In-process store; exact for a single worker, per-worker otherwise"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._counters: Dict[str, Tuple[int, float]] = {}
+
+    async def take(self, buckets: Sequence[Bucket], cost: float = 1) -> BucketResult:
+        """Take `cost` from every bucket, or from none when any of them is short"""
+        now = time.monotonic()
+        levels = []
+        for key, capacity, rate in buckets:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            levels.append(min(capacity, tokens + (now - updated_at) * rate))
+
+        allowed = all(tokens >= cost for tokens in levels)
+        if allowed:
+            levels = [tokens - cost for tokens in levels]
+        for (key, _, _), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return allowed, _levels(buckets, levels)
+
+    async def incr(self, key: str, amount: int, ttl_seconds: int) -> int:
+        now = time.time()
+        value, expires_at = self._counters.get(key, (0, now + ttl_seconds))
+        if expires_at <= now:
+            value, expires_at = 0, now + ttl_seconds
+        value += amount
+        self._counters[key] = (value, expires_at)
+        return value
+
+    def _prune(self, now: float) -> None:
+        """Drop the least recently touched half of the buckets"""
+        by_age = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in by_age[: len(by_age) // 2]:
+            del self._buckets[key]
+        wall = time.time()
+        self._counters = {k: v for k, v in self._counters.items() if v[1] > wall}
+
+
+# Refill every bucket, then take from all of them or from none; state is a hash {tokens, ts} per key.
+# ARGV: cost, now, then capacity and refill rate per key
+_TAKE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local levels = {}
+local allowed = 1
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i + 1])
+  local rate = tonumber(ARGV[2 * i + 2])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  levels[i] = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+  if levels[i] < cost then
+    allowed = 0
+  end
+end
+local result = {allowed}
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i + 1])
+  local rate = tonumber(ARGV[2 * i + 2])
+  if allowed == 1 then
+    levels[i] = levels[i] - cost
+  end
+  redis.call('HSET', key, 'tokens', levels[i], 'ts', now)
+  redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+  result[i + 1] = tostring(levels[i])
+end
+return result
+"""
+
+
+class RedisRateLimitStore:
+    """
+    Shared store for multi-worker deployments
+    Takes any redis.asyncio-compatible client; tests pass tests/fake_redis.FakeRedis
+    """
+
+    def __init__(self, client: Any = None, prefix: str = "ratelimit:"):
+        if client is None:
+            import redis.asyncio as redis  # Optional dependency, only needed for this backend
+            client = redis.from_url(settings.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, buckets: Sequence[Bucket], cost: float = 1) -> BucketResult:
+        """Take `cost` from every bucket, or from none when any of them is short"""
+        args = [cost, time.time()]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        allowed, *tokens = await self._take(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        return bool(int(allowed)), _levels(buckets, [float(left) for left in tokens])
+
+    async def incr(self, key: str, amount: int, ttl_seconds: int) -> int:
+        pipe = self.client.pipeline()
+        pipe.incrby(self.prefix + key, amount)
+        # Quota keys are per window and the TTL always points at the window end
+        pipe.expire(self.prefix + key, ttl_seconds)
+        value, _ = await pipe.execute()
+        return int(value)
+
+def _create_store():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitStore()
+    return MemoryRateLimitStore()
+
+
+# Global limiter store
+rate_limit_store = _create_store()
+
+
+async def _get_enterprise_limits(enterprise_id: int) -> Dict[str, Optional[int]]:
+    """max_queries_per_day / monthly_query_limit from the enterprise cache, so the check stays off the DB"""
+    enterprise = await enterprise_cache.get(enterprise_id)
+    return {
+        "daily": enterprise["max_queries_per_day"] if enterprise else None,
+        "monthly": enterprise["monthly_query_limit"] if enterprise else None
+    }
+
+
+def _too_many(detail: str, retry_after: float, headers: Dict[str, str]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={**headers, "Retry-After": str(max(1, int(retry_after + 0.999)))}
+    )
+
+
+def _seconds_until_tomorrow(now: datetime) -> int:
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(86400 - (now - midnight).total_seconds()) + 1
+
+
+def _seconds_until_next_month(now: datetime) -> int:
+    year, month = (now.year + 1, 1) if now.month == 12 else (now.year, now.month + 1)
+    return int((datetime(year, month, 1, tzinfo=timezone.utc) - now).total_seconds()) + 1
+
+
+async def enforce_query_limits(
+    response: Response,
+    current_user: User = Depends(get_current_user)
+) -> None:
+    """
+    Dependency guarding expensive query endpoints
+    Rejects with 429 + Retry-After; otherwise reports what is left in X-RateLimit-* / X-Quota-* headers
+    """
+    if not settings.ENABLE_API_RATE_LIMITING:
+        return
+
+    store = rate_limit_store
+    headers: Dict[str, str] = {}
+
+    # Plan quotas first: fixed UTC day and month windows per enterprise
+    limits = await _get_enterprise_limits(current_user.enterprise_id)
+    now = datetime.now(timezone.utc)
+    windows = [
+        ("Daily", limits["daily"], f"quota:day:{current_user.enterprise_id}:{now:%Y%m%d}", _seconds_until_tomorrow(now)),
+        ("Monthly", limits["monthly"], f"quota:month:{current_user.enterprise_id}:{now:%Y%m}", _seconds_until_next_month(now)),
+    ]
+    charged = []
+
+    async def refund_quotas() -> None:
+        # Rejected requests do not consume quota
+        for charged_key, charged_ttl in charged:
+            await store.incr(charged_key, -1, charged_ttl)
+
+    for label, limit, key, ttl in windows:
+        if not limit:
+            continue
+        used = await store.incr(key, 1, ttl)
+        charged.append((key, ttl))
+        headers[f"X-Quota-{label}-Limit"] = str(limit)
+        headers[f"X-Quota-{label}-Remaining"] = str(max(0, limit - used))
+        if used > limit:
+            await refund_quotas()
+            raise _too_many(f"{label} query quota exhausted", ttl, headers)
+
+    # Burst control: one bucket per user, one per enterprise; a limit of 0 disables that bucket.
+    # Tokens are taken from both or from neither, so a rejection never costs the caller a token
+    buckets = [
+        (scope, f"bucket:{key}", per_minute)
+        for scope, key, per_minute in (
+            ("user", f"user:{current_user.id}", settings.RATE_LIMIT_PER_MINUTE),
+            ("enterprise", f"enterprise:{current_user.enterprise_id}", settings.RATE_LIMIT_ENTERPRISE_PER_MINUTE),
+        )
+        if per_minute > 0
+    ]
+    if buckets:
+        allowed, levels = await store.take([(key, per_minute, per_minute / 60) for _, key, per_minute in buckets])
+        for (scope, _, per_minute), (tokens, _) in zip(buckets, levels):
+            if scope == "user":
+                headers["X-RateLimit-Limit"] = str(per_minute)
+                headers["X-RateLimit-Remaining"] = str(int(tokens))
+        if not allowed:
+            await refund_quotas()
+            scope, retry_after = next(
+                (scope, retry_after) for (scope, _, _), (tokens, retry_after) in zip(buckets, levels) if tokens < 1
+            )
+            raise _too_many(f"Rate limit exceeded for {scope}", retry_after, headers)
+
+    response.headers.update(headers)
@@ -0,0 +1,42 @@
+"""
+Token counting for prompt budgets
+Uses tiktoken (installed with langchain-openai) when available, otherwise a
+~4 characters per token estimate that is close enough for English text
+"""
+from functools import lru_cache
+from typing import Any
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Any:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Number of tokens `text` takes in `model`'s prompt"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4") -> str:
+    """Longest prefix of `text` that fits in `max_tokens`"""
+    if max_tokens <= 0:
+        return ""
+    if tiktoken is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
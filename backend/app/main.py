@@ -10,7 +10,10 @@ import time
 import logging
 
 from app.core.config import settings
-from app.core.database import engine, create_tables
+from app.core.database import engine, create_tables, run_migrations
+from app.services.retention_service import ensure_partitions, retention_loop
+from app.services.audit_writer import audit_writer
+from app.services.pdf_pipeline import pdf_pipeline
 from app.core.auth import router as auth_router
 from app.api.enterprise import router as enterprise_router
 # from app.api.documents import router as documents_router
@@ -35,8 +38,13 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Debug mode: {settings.DEBUG}")
     
-    # Create database tables
-    await create_tables()
+    # Bring the schema up to date
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        await run_migrations()
+    else:
+        await create_tables()
+    async with engine.begin() as conn:
+        await ensure_partitions(conn)
     logger.info("✅ Database tables created/verified")
     
     # Initialize vector store directory
@@ -45,10 +53,21 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     logger.info("✅ Storage directories initialized")
     
+    # Query log partition maintenance and retention
+    import asyncio
+    retention_task = asyncio.create_task(retention_loop()) if settings.ENABLE_RETENTION_JOB else None
+    
+    # Write-behind query log
+    await audit_writer.start()
+    
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down Enterprise AI Brain...")
+    if retention_task:
+        retention_task.cancel()
+    await audit_writer.stop()
+    pdf_pipeline.shutdown()
 
 
 # Initialize FastAPI app
@@ -68,6 +87,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor", "Retry-After",
+        "X-RateLimit-Limit", "X-RateLimit-Remaining",
+        "X-Quota-Daily-Limit", "X-Quota-Daily-Remaining",
+        "X-Quota-Monthly-Limit", "X-Quota-Monthly-Remaining",
+    ],
 )
 
 
@@ -114,7 +139,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "status_code": exc.status_code,
             "path": request.url.path,
             "timestamp": time.time()
-        }
+        },
+        headers=exc.headers
     )
 
 
@@ -185,7 +211,7 @@ async def system_info():
         "python_version": "3.11+",
         "framework": "FastAPI",
         "database": "PostgreSQL with AsyncPG",
-        "vector_store": "ChromaDB",
+        "vector_store": settings.VECTOR_BACKEND,
         "ai_models": {
             "llm": settings.LLM_MODEL,
             "embeddings": settings.EMBEDDING_MODEL
@@ -200,7 +226,7 @@ async def system_info():
             "multi_language": settings.ENABLE_MULTI_LANGUAGE
         },
         "limits": {
-            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_max_tokens": settings.CHUNK_MAX_TOKENS,
             "max_results_per_page": settings.MAX_RESULTS_PER_PAGE,
             "rate_limit_per_minute": settings.RATE_LIMIT_PER_MINUTE,
             "cache_ttl_hours": settings.REDIS_CACHE_TTL // 3600
@@ -2,7 +2,7 @@
 Document model for Enterprise AI Brain
 Enhanced from ai-chatbot with enterprise metadata
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, Float, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -14,6 +14,19 @@ class Document(Base):
     Enhanced with enterprise-specific metadata
     """
     __tablename__ = "documents"
+    __table_args__ = (
+        # Listing / keyset pagination and "recent uploads" scans
+        Index("ix_documents_enterprise_created", "enterprise_id", "created_at", "id"),
+        # Category filters and category analytics over processed documents
+        Index(
+            "ix_documents_enterprise_category_processed", "enterprise_id", "category",
+            postgresql_where=text("processed = true")
+        ),
+        Index("ix_documents_enterprise_processed", "enterprise_id", "processed"),
+        Index("ix_documents_enterprise_department", "enterprise_id", "department_id"),
+        # Shard list of an enterprise's vector collection
+        Index("ix_documents_enterprise_vector_shard", "enterprise_id", "vector_shard"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -39,11 +52,13 @@ class Document(Base):
     processed = Column(Boolean, default=False)
     processing_status = Column(String, default="pending")  # pending, processing, completed, failed
     chunks_count = Column(Integer, default=0)
+    vector_shard = Column(String, nullable=True)  # e.g. "fiscal_year:2023" (see vector_shards.py); NULL = base collection
     processing_time_seconds = Column(Float, nullable=True)
     error_message = Column(Text, nullable=True)
     
     # Advanced metadata (NEW)
-    metadata = Column(JSON, nullable=True)  # Extracted metadata (tables, entities, etc.)
+    # "metadata" is reserved by the declarative API, so the attribute is renamed
+    doc_metadata = Column("metadata", JSON, nullable=True)  # Extracted metadata (tables, entities, etc.)
     language = Column(String, default="en")
     content_hash = Column(String, nullable=True)  # For deduplication
     
@@ -2,7 +2,7 @@
 Enterprise Query models - For complex business intelligence queries
 Extends simple chat to handle analytical and data-driven questions
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, Float, ForeignKey, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
@@ -33,8 +33,26 @@ class EnterpriseQuery(Base):
     Extends basic chat to track analytical queries with metadata
     """
     __tablename__ = "enterprise_queries"
-    
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        # History, keyset pagination and every created_at-windowed dashboard scan
+        Index("ix_enterprise_queries_enterprise_created", "enterprise_id", "created_at", "id"),
+        # query_type / complexity filters and breakdowns
+        Index("ix_enterprise_queries_enterprise_type_created", "enterprise_id", "query_type", "created_at"),
+        Index("ix_enterprise_queries_enterprise_complexity_created", "enterprise_id", "complexity", "created_at"),
+        # Per-user engagement aggregates
+        Index("ix_enterprise_queries_enterprise_user_created", "enterprise_id", "user_id", "created_at"),
+        # Satisfaction averages only touch rated queries
+        Index(
+            "ix_enterprise_queries_rated", "enterprise_id", "created_at",
+            postgresql_where=text("user_satisfaction IS NOT NULL")
+        ),
+        # One LIST partition per retention tier, each split into monthly RANGE partitions,
+        # managed by app.services.retention_service
+        {"postgresql_partition_by": "LIST (retention_days)"},
+    )
+    
+    # The partition keys must be part of the primary key, hence (id, created_at, retention_days)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     
     # Basic Info (similar to ai-chatbot Message)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -59,9 +77,10 @@ class EnterpriseQuery(Base):
     keywords_detected = Column(JSON, nullable=True)   # Important business terms
     
     # Response Data
-    ai_response = Column(Text, nullable=True)
+    # ai_response, structured_data and conversation_context live compressed in
+    # QueryResponseBody so analytic scans stay narrow (see response_store)
     response_format = Column(String, default="text")  # "text", "table", "chart", "report"
-    structured_data = Column(JSON, nullable=True)     # Tables, charts data
+    response_length = Column(Integer, nullable=True)  # Characters in ai_response
     confidence_score = Column(Float, nullable=True)   # AI confidence 0-1
     
     # Processing Info (enhanced from ai-chatbot)
@@ -77,9 +96,9 @@ class EnterpriseQuery(Base):
     is_public = Column(Boolean, default=False)        # Shareable within enterprise
     
     # Follow-up & Context (NEW)
-    parent_query_id = Column(Integer, ForeignKey("enterprise_queries.id"), nullable=True)
+    # No FK: a partitioned table cannot be referenced by id alone
+    parent_query_id = Column(Integer, nullable=True)
     has_follow_ups = Column(Boolean, default=False)
-    conversation_context = Column(JSON, nullable=True) # Previous questions in thread
     
     # Analytics & Learning (NEW)
     user_satisfaction = Column(Integer, nullable=True) # 1-5 rating
@@ -88,7 +107,9 @@ class EnterpriseQuery(Base):
     similar_queries_count = Column(Integer, default=0) # How often this type is asked
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
+    # Retention tier of the enterprise when the row was written (see retention_service.retention_tier)
+    retention_days = Column(Integer, primary_key=True, nullable=False)
     responded_at = Column(DateTime(timezone=True), nullable=True)
     last_accessed = Column(DateTime(timezone=True), nullable=True)
     
@@ -96,8 +117,17 @@ class EnterpriseQuery(Base):
     user = relationship("User", back_populates="queries")
     enterprise = relationship("Enterprise", back_populates="queries")
     department = relationship("Department")
-    follow_ups = relationship("EnterpriseQuery", remote_side=[id])
-    exports = relationship("QueryExport", back_populates="query")
+    follow_ups = relationship(
+        "EnterpriseQuery",
+        primaryjoin="foreign(EnterpriseQuery.parent_query_id) == EnterpriseQuery.id",
+        remote_side=[id],
+        viewonly=True
+    )
+    exports = relationship(
+        "QueryExport",
+        primaryjoin="EnterpriseQuery.id == foreign(QueryExport.query_id)",
+        back_populates="query"
+    )
     
     def __repr__(self):
         return f"<EnterpriseQuery(id={self.id}, type='{self.query_type}', user_id={self.user_id})>"
@@ -111,11 +141,46 @@ class EnterpriseQuery(Base):
     def is_complex(self):
         """Check if query requires advanced processing"""
         return self.complexity in [QueryComplexity.HIGH, QueryComplexity.CRITICAL]
+
+
+class QueryResponseBody(Base):
+    """
+    Cold storage for large query payloads (NEW)
+    Holds the compressed ai_response, structured_data and conversation_context
+    of an EnterpriseQuery, fetched only when a single query is opened
+    """
+    __tablename__ = "enterprise_query_bodies"
+    __table_args__ = (
+        # Partitioned like enterprise_queries so retention drops both together
+        {"postgresql_partition_by": "LIST (retention_days)"},
+    )
     
-    @property
-    def response_length(self):
-        """Calculate response length"""
-        return len(self.ai_response) if self.ai_response else 0
+    query_id = Column(Integer, primary_key=True)  # enterprise_queries.id
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False)  # Same as the query row
+    retention_days = Column(Integer, primary_key=True, nullable=False)  # Same as the query row
+    
+    codec = Column(String, nullable=False)        # "zstd" or "zlib"
+    payload = Column(LargeBinary, nullable=False) # Compressed JSON document
+    raw_bytes = Column(Integer, nullable=False)   # Uncompressed size
+    
+    def __repr__(self):
+        return f"<QueryResponseBody(query_id={self.query_id}, codec='{self.codec}', raw_bytes={self.raw_bytes})>"
+
+
+class QueryLogRetention(Base):
+    """
+    Retention tier each enterprise's query log is stored under (NEW)
+    When an enterprise's data_retention_days maps to another tier, the
+    retention job moves its existing rows once and records the new tier here
+    """
+    __tablename__ = "query_log_retention"
+    
+    enterprise_id = Column(Integer, ForeignKey("enterprises.id", ondelete="CASCADE"), primary_key=True)
+    retention_days = Column(Integer, nullable=False)  # Tier the enterprise's rows are in
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<QueryLogRetention(enterprise_id={self.enterprise_id}, retention_days={self.retention_days})>"
 
 
 class QueryExport(Base):
@@ -126,7 +191,7 @@ class QueryExport(Base):
     __tablename__ = "query_exports"
     
     id = Column(Integer, primary_key=True, index=True)
-    query_id = Column(Integer, ForeignKey("enterprise_queries.id"), nullable=False)
+    query_id = Column(Integer, nullable=False, index=True)  # enterprise_queries.id (partitioned, no FK)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     export_format = Column(String, nullable=False)  # "pdf", "excel", "csv", "json"
@@ -143,7 +208,11 @@ class QueryExport(Base):
     last_downloaded = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
-    query = relationship("EnterpriseQuery", back_populates="exports")
+    query = relationship(
+        "EnterpriseQuery",
+        primaryjoin="foreign(QueryExport.query_id) == EnterpriseQuery.id",
+        back_populates="exports"
+    )
     user = relationship("User")
     
     def __repr__(self):
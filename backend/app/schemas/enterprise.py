@@ -16,6 +16,7 @@ class EnterpriseQuery(BaseModel):
     department_id: Optional[int] = Field(None, description="Department context for the query")
     context: Optional[str] = Field(None, description="Additional context or instructions")
     priority: Optional[str] = Field("normal", description="Query priority: low, normal, high, urgent")
+    parent_query_id: Optional[int] = Field(None, description="Previous query of the conversation, for follow-ups")
     
 
 class EnterpriseResponse(BaseModel):
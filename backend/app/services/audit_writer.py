@@ -0,0 +1,246 @@
+"""
+Audit Writer - Write-behind buffer for the enterprise query log
+Hands out query IDs from the enterprise_queries sequence in blocks and
+batches query/body rows into multi-row INSERTs, so the user's response
+no longer waits on the audit write. A batch the database rejects is split
+until the offending rows are isolated; rows that keep failing on their own
+are logged and dropped, so one bad row never blocks the rows behind it
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.core.database import engine
+from app.models.enterprise_query import EnterpriseQuery, QueryResponseBody
+
+logger = logging.getLogger(__name__)
+
+QUERY_ID_SEQUENCE = "enterprise_queries_id_seq"
+
+# Durability modes
+MODE_SYNC = "sync"    # Rows are committed before record() returns
+MODE_ASYNC = "async"  # Rows are committed by the background flusher
+
+AuditRecord = Tuple[Dict[str, Any], Dict[str, Any]]
+
+# Errors caused by the rows themselves (FK/check violations, bad values); anything else
+# (connection loss, timeouts) is treated as the database being unavailable
+ROW_ERRORS = (IntegrityError, DataError)
+
+EVICTION_LOG_EVERY = 1000
+
+
+class AuditWriter:
+    """
+    Buffered writer for EnterpriseQuery rows and their QueryResponseBody
+
+    In async mode a crash can lose at most one flush interval of audit rows;
+    set AUDIT_WRITE_MODE=sync where every query must be on disk before the
+    response is sent. While the database is unreachable rows are kept up to
+    AUDIT_MAX_BUFFERED, beyond which the oldest are dropped.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        flush_interval_ms: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        id_block_size: Optional[int] = None,
+        max_buffered: Optional[int] = None,
+        max_attempts: Optional[int] = None
+    ):
+        self.mode = mode or settings.AUDIT_WRITE_MODE
+        self.flush_interval = (flush_interval_ms or settings.AUDIT_FLUSH_INTERVAL_MS) / 1000
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.max_pending = max_pending or settings.AUDIT_MAX_PENDING
+        self.id_block_size = id_block_size or settings.AUDIT_ID_BLOCK_SIZE
+        self.max_buffered = max(self.max_pending, max_buffered or settings.AUDIT_MAX_BUFFERED)
+        self.max_attempts = max_attempts or settings.AUDIT_MAX_ATTEMPTS
+
+        if self.mode not in (MODE_SYNC, MODE_ASYNC):
+            raise ValueError(f"Unknown AUDIT_WRITE_MODE: {self.mode}")
+
+        self._pending: Deque[AuditRecord] = deque()
+        self._pending_ids: Set[int] = set()
+        # Failed attempts of rows that were rejected on their own, by query id
+        self._attempts: Dict[int, int] = {}
+        # After a failed flush, record() stops forcing flushes until this monotonic time
+        self._retry_at = 0.0
+        self._ids: Deque[int] = deque()
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {
+            "records": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0,
+            "rows_rejected": 0, "rows_dropped": 0, "rows_evicted": 0,
+        }
+
+    async def next_id(self) -> int:
+        """Next query id, reserving a block from the sequence when the local pool runs dry"""
+        async with self._id_lock:
+            if not self._ids:
+                async with engine.connect() as conn:
+                    result = await conn.execute(
+                        text(f"SELECT nextval('{QUERY_ID_SEQUENCE}') FROM generate_series(1, :n)"),
+                        {"n": self.id_block_size}
+                    )
+                    self._ids.extend(row[0] for row in result.fetchall())
+            return self._ids.popleft()
+
+    async def record(self, query_row: Dict[str, Any], body_row: Dict[str, Any]) -> None:
+        """
+        Queue one query row (with id and created_at already set) and its body row
+        Sync mode writes straight through; async mode only blocks when the buffer is full
+        """
+        self.stats["records"] += 1
+
+        if self.mode == MODE_SYNC:
+            await self._write([(query_row, body_row)])
+            return
+
+        self._pending.append((query_row, body_row))
+        self._pending_ids.add(query_row["id"])
+        if len(self._pending) > self.max_buffered:
+            self._evict(len(self._pending) - self.max_buffered)
+        if len(self._pending) >= self.max_pending and time.monotonic() >= self._retry_at:
+            # Backpressure; skipped while the database is failing, so requests do not retry it one by one
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def is_pending(self, query_id: int) -> bool:
+        """True while the query's rows are buffered and not yet in the database"""
+        return query_id in self._pending_ids
+
+    async def ensure_written(self, query_id: int) -> None:
+        """Flush now if `query_id` is still buffered, for endpoints that read it back"""
+        if self.is_pending(query_id):
+            await self.flush()
+
+    def _evict(self, count: int) -> None:
+        """Hard cap on the buffer: the oldest rows go first"""
+        for _ in range(count):
+            query_row, _ = self._pending.popleft()
+            self._forget(query_row["id"])
+        previous = self.stats["rows_evicted"]
+        self.stats["rows_evicted"] += count
+        # Once per outage start, then every EVICTION_LOG_EVERY rows, not once per request
+        if previous == 0 or previous // EVICTION_LOG_EVERY != self.stats["rows_evicted"] // EVICTION_LOG_EVERY:
+            logger.error(
+                f"❌ Audit buffer full ({self.max_buffered} rows), dropping the oldest query rows "
+                f"({self.stats['rows_evicted']} dropped so far)"
+            )
+
+    def _forget(self, query_id: int) -> None:
+        self._pending_ids.discard(query_id)
+        self._attempts.pop(query_id, None)
+
+    async def flush(self) -> int:
+        """Write everything currently buffered; returns the number of query rows written"""
+        written = 0
+        retry: List[AuditRecord] = []
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    written += await self._write_isolating(batch, retry)
+                except Exception as e:
+                    self.stats["flush_errors"] += 1
+                    self._retry_at = time.monotonic() + self.flush_interval
+                    # Keep the rows not yet written or queued for retry (a split batch may be part-written), oldest first
+                    retrying = {query_row["id"] for query_row, _ in retry}
+                    unwritten = [
+                        record for record in batch
+                        if record[0]["id"] in self._pending_ids and record[0]["id"] not in retrying
+                    ]
+                    self._pending.extendleft(reversed(unwritten))
+                    logger.error(f"❌ Audit flush failed ({len(unwritten)} rows kept for retry): {e}")
+                    break
+            # Rejected rows with attempts left go back to the front, for the next flush
+            self._pending.extendleft(reversed(retry))
+        return written
+
+    async def _write_isolating(self, batch: List[AuditRecord], retry: List[AuditRecord]) -> int:
+        """
+        Write a batch, splitting it in halves when the database rejects its rows
+        A row rejected on its own is queued in `retry`, or dropped after max_attempts
+        """
+        try:
+            await self._write(batch)
+        except ROW_ERRORS as e:
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                return (
+                    await self._write_isolating(batch[:middle], retry)
+                    + await self._write_isolating(batch[middle:], retry)
+                )
+            query_row, _ = batch[0]
+            attempts = self._attempts.get(query_row["id"], 0) + 1
+            self.stats["rows_rejected"] += 1
+            if attempts >= self.max_attempts:
+                self._forget(query_row["id"])
+                self.stats["rows_dropped"] += 1
+                logger.error(
+                    f"❌ Dropped audit row for query {query_row['id']} after {attempts} rejected writes: "
+                    f"{getattr(e, 'orig', e)}"
+                )
+            else:
+                self._attempts[query_row["id"]] = attempts
+                retry.append(batch[0])
+            return 0
+        for query_row, _ in batch:
+            self._forget(query_row["id"])
+        return len(batch)
+
+    async def _write(self, batch: List[AuditRecord]) -> None:
+        """One transaction, one multi-row INSERT per table"""
+        async with engine.begin() as conn:
+            await conn.execute(insert(EnterpriseQuery.__table__), [query_row for query_row, _ in batch])
+            await conn.execute(insert(QueryResponseBody.__table__), [body_row for _, body_row in batch])
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(batch)
+
+    async def _flush_loop(self) -> None:
+        """Flush every interval, or sooner once a full batch is waiting"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        """Start the background flusher (async mode only)"""
+        if self.mode == MODE_ASYNC and self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info(f"✅ Audit writer started (flush every {int(self.flush_interval * 1000)}ms)")
+
+    async def stop(self) -> None:
+        """Stop the flusher and drain the buffer"""
+        if self._task:
+            # Let the loop finish its current write rather than cancelling mid-batch
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        written = await self.flush()
+        if self._pending:
+            logger.error(f"❌ Audit writer stopped with {len(self._pending)} unwritten query rows")
+        else:
+            logger.info(f"✅ Audit writer drained ({written} rows on shutdown)")
+
+
+# Global audit writer instance
+audit_writer = AuditWriter()
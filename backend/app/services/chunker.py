@@ -0,0 +1,243 @@
+"""
+Structure-Aware Chunker - Token-sized chunks that follow document structure
+Loader sections are parsed into headings, tables and paragraphs. Chunks are
+cut at headings (always at financial statement titles), tables stay whole
+or are split by row groups that repeat the header row, and every size is
+measured in tokens. Small sections are merged, so a document yields fewer,
+denser chunks than fixed-size character windows that cut statements mid-row
+"""
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.tokens import count_tokens, truncate_to_tokens
+
+Block = Dict[str, Any]
+Chunk = Dict[str, Any]
+
+# Statement titles, optionally numbered and qualified ("3. Consolidated Balance Sheets")
+_STATEMENT = re.compile(
+    r"^(?:[\d.]+\s+)?(?:(?:consolidated|condensed|unaudited|interim|combined)\s+)*(balance sheets?|income statements?|statements? of (cash flows?|operations|income|financial position|"
+    r"comprehensive income|changes in equity|stockholders'? equity)|cash flow statements?|profit and loss|"
+    r"p&l|notes to the (consolidated )?financial statements|management'?s discussion)\b",
+    re.IGNORECASE
+)
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[ivxlc]+\.|[A-Z]\.)\s+\S")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_TABLE_ROW = re.compile(r"\S\s*(\||\t)\s*\S")
+_MAX_HEADING_CHARS = 90
+
+
+def _heading_level(line: str) -> Optional[int]:
+    """1 for statement titles, 2 for other headings, None for body text"""
+    text = line.strip()
+    if not text or len(text) > _MAX_HEADING_CHARS or _TABLE_ROW.search(text):
+        return None
+    if text.startswith("#"):
+        return 1 if _STATEMENT.search(text.lstrip("#").strip()) else 2
+    if text.endswith((".", ",", ";")) or len(text.split()) > 12:
+        return None
+    if _STATEMENT.search(text):
+        return 1
+    letters = [c for c in text if c.isalpha()]
+    if len(letters) >= 3 and (text.isupper() or _NUMBERED_HEADING.match(text) or text.endswith(":")):
+        return 2
+    return None
+
+
+def parse_blocks(section: Dict[str, Any]) -> Iterator[Block]:
+    """Headings, tables (runs of pipe/tab rows) and paragraphs of one loader section"""
+    metadata = section.get("metadata", {})
+    lines = section["content"].splitlines()
+    if metadata.get("block") == "table":
+        yield {"kind": "table", "rows": [line for line in lines if line.strip()], "metadata": metadata}
+        return
+
+    paragraph: List[str] = []
+    table: List[str] = []
+
+    def flush_paragraph() -> Iterator[Block]:
+        if paragraph:
+            yield {"kind": "text", "text": "\n".join(paragraph), "metadata": metadata}
+            paragraph.clear()
+
+    def flush_table() -> Iterator[Block]:
+        if len(table) >= 2:
+            yield {"kind": "table", "rows": list(table), "metadata": metadata}
+        elif table:
+            paragraph.extend(table)
+        table.clear()
+
+    for line in lines:
+        if _TABLE_ROW.search(line) and (table or len(re.split(r"\||\t", line)) >= 2):
+            yield from flush_paragraph()
+            table.append(line.strip())
+            continue
+        yield from flush_table()
+        level = _heading_level(line)
+        if level is not None:
+            yield from flush_paragraph()
+            yield {"kind": "heading", "text": line.strip().lstrip("#").strip(), "level": level, "metadata": metadata}
+        elif line.strip():
+            paragraph.append(line.strip())
+        else:
+            yield from flush_paragraph()
+    yield from flush_table()
+    yield from flush_paragraph()
+
+
+class _ChunkBuilder:
+    """The chunk being filled: its parts, token count, first block's metadata and heading path"""
+
+    def __init__(self):
+        self.chunks: List[Chunk] = []
+        self.headings: List[Tuple[int, str]] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self.parts: List[str] = []
+        self.tokens = 0
+        self.metadata: Dict[str, Any] = {}
+        self.section = ""
+        self.only_table = True
+
+    def path(self) -> str:
+        return " > ".join(text for _, text in self.headings)
+
+    def add(self, text: str, tokens: int, metadata: Dict[str, Any], is_table: bool = False) -> None:
+        if not self.metadata:
+            self.metadata = dict(metadata)
+            self.section = self.path()  # Heading path where the chunk starts
+        self.metadata["page_end"] = metadata.get("page")
+        self.parts.append(text)
+        self.tokens += tokens
+        self.only_table = self.only_table and is_table
+
+    def flush(self, carry: str = "") -> None:
+        """Close the current chunk; `carry` (overlap text) opens the next one"""
+        if any(part.strip() for part in self.parts):
+            self.chunks.append({"content": "\n\n".join(self.parts), "metadata": self._chunk_metadata()})
+        self._reset()
+        if carry:
+            self.parts, self.tokens, self.only_table = [carry], count_tokens(carry), False
+
+    def _chunk_metadata(self) -> Dict[str, Any]:
+        """Scalar metadata for the vector store: first/last page, heading path, table marker"""
+        first = self.metadata
+        metadata = {key: value for key, value in first.items() if key not in ("block", "page_end") and value is not None}
+        if first.get("page_end") is not None and first.get("page_end") != first.get("page"):
+            metadata["page_end"] = first["page_end"]
+        if self.section:
+            metadata["section"] = self.section[:200]
+        if self.only_table:
+            metadata["block"] = "table"
+        else:
+            metadata.pop("bbox", None)  # Only meaningful for a chunk that is a single table
+        return metadata
+
+
+class StructuredChunker:
+    """Groups parsed blocks into chunks of at most max_tokens"""
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        min_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None
+    ):
+        self.max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+        self.min_tokens = min_tokens if min_tokens is not None else settings.CHUNK_MIN_TOKENS
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else settings.CHUNK_OVERLAP_TOKENS
+
+    def split(self, sections: List[Dict[str, Any]]) -> List[Chunk]:
+        """Chunks ({"content", "metadata"}) of a document's loader sections, in order"""
+        builder = _ChunkBuilder()
+        for section in sections:
+            for block in parse_blocks(section):
+                metadata = block["metadata"]
+                if block["kind"] == "heading":
+                    level = block["level"]
+                    # A statement title always starts a chunk; other headings unless the chunk is still small
+                    if level == 1 or builder.tokens >= self.min_tokens:
+                        builder.flush()
+                    tokens = count_tokens(block["text"])
+                    if builder.tokens + tokens > self.max_tokens:
+                        builder.flush()
+                    builder.headings = [(lvl, text) for lvl, text in builder.headings if lvl < level]
+                    builder.headings.append((level, block["text"]))
+                    builder.add(block["text"], tokens, metadata)
+                elif block["kind"] == "table":
+                    self._add_table(builder, block["rows"], metadata)
+                else:
+                    for piece in self._pieces(block["text"]):
+                        tokens = count_tokens(piece)
+                        if builder.tokens + tokens > self.max_tokens:
+                            builder.flush(self._overlap(builder.parts))
+                        builder.add(piece, tokens, metadata)
+        builder.flush()
+        return builder.chunks
+
+    def _add_table(self, builder: _ChunkBuilder, rows: List[str], metadata: Dict[str, Any]) -> None:
+        """Whole table if it fits (in this chunk or a fresh one); otherwise row groups under the header"""
+        text = "\n".join(rows)
+        tokens = count_tokens(text)
+        if builder.tokens + tokens <= self.max_tokens:
+            builder.add(text, tokens, metadata, is_table=True)
+            return
+        if tokens <= self.max_tokens:
+            builder.flush()
+            builder.add(text, tokens, metadata, is_table=True)
+            return
+
+        # Too big for any chunk: the first row group may join a still-small chunk (e.g. its heading)
+        if builder.tokens >= self.min_tokens:
+            builder.flush()
+        header, body = rows[0], rows[1:]
+        continued = f"{builder.path()} (continued)\n{header}" if builder.headings else header
+        lead, lead_tokens = header, count_tokens(header)
+        row_budget = self.max_tokens - count_tokens(continued) - 1
+        group: List[str] = []
+        group_tokens = 0
+        for row in body:
+            row = truncate_to_tokens(row, row_budget)
+            row_tokens = count_tokens(row) + 1
+            if group and builder.tokens + lead_tokens + group_tokens + row_tokens > self.max_tokens:
+                builder.add("\n".join([lead] + group), lead_tokens + group_tokens, metadata, is_table=True)
+                builder.flush()
+                lead, lead_tokens = continued, count_tokens(continued)
+                group, group_tokens = [], 0
+            group.append(row)
+            group_tokens += row_tokens
+        if group:
+            builder.add("\n".join([lead] + group), lead_tokens + group_tokens, metadata, is_table=True)
+
+    def _pieces(self, text: str) -> Iterator[str]:
+        """A paragraph, or its sentences (hard-cut if one is still too long) when it exceeds max_tokens"""
+        if count_tokens(text) <= self.max_tokens:
+            yield text
+            return
+        for sentence in _SENTENCE_END.split(text):
+            while count_tokens(sentence) > self.max_tokens:
+                head = truncate_to_tokens(sentence, self.max_tokens)
+                yield head
+                sentence = sentence[len(head):]
+            if sentence.strip():
+                yield sentence
+
+    def _overlap(self, parts: List[str]) -> str:
+        """Trailing sentences of the previous chunk's last paragraph, up to overlap_tokens"""
+        if not self.overlap_tokens or not parts:
+            return ""
+        carried: List[str] = []
+        tokens = 0
+        for sentence in reversed(_SENTENCE_END.split(parts[-1])):
+            sentence_tokens = count_tokens(sentence)
+            if tokens + sentence_tokens > self.overlap_tokens or _TABLE_ROW.search(sentence):
+                break
+            carried.insert(0, sentence)
+            tokens += sentence_tokens
+        return " ".join(carried)
+
+
+# Global chunker (sizes from settings)
+chunker = StructuredChunker()
@@ -0,0 +1,188 @@
+"""
+Conversation Memory - Rolling context for multi-turn enterprise queries
+Every answered query leaves a compact state: a token-bounded summary of the
+conversation so far and the IDs of the chunks it was answered from. A
+follow-up (parent_query_id) reranks that working set against the new
+question instead of running a fresh vector search, and only searches again
+when the question has moved to a different topic
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.tokens import count_tokens, truncate_to_tokens
+from app.models.enterprise_query import EnterpriseQuery
+from app.services.audit_writer import audit_writer
+from app.services.document_service import chunk_id
+from app.services.response_store import load_body
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9$%&]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "did", "do", "does", "for", "from", "how", "in",
+    "is", "it", "its", "me", "of", "on", "or", "our", "show", "that", "the", "their", "them", "then", "there",
+    "these", "they", "this", "those", "to", "was", "we", "were", "what", "when", "which", "who", "why", "with",
+    "about", "also", "same", "please", "tell", "give", "more", "now", "just",
+}
+
+# Tokens of each answer kept in the summary
+ANSWER_BRIEF_TOKENS = 120
+
+
+def _terms(text: str) -> set:
+    return {word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS and len(word) > 1}
+
+
+def _brief(answer: str) -> str:
+    """First paragraph of an answer, bounded, as the summary of that turn"""
+    paragraph = next((part.strip() for part in (answer or "").split("\n\n") if part.strip()), "")
+    return truncate_to_tokens(" ".join(paragraph.split()), ANSWER_BRIEF_TOKENS)
+
+
+class ConversationMemory:
+    """
+    Conversation state keyed by the id of its latest query
+    Kept in process with the chunk contents for fast follow-ups; the same
+    state minus chunk contents is persisted as the query's
+    conversation_context, so other workers can pick the conversation up
+    """
+
+    def __init__(self):
+        self._states = TTLCache(settings.CONVERSATION_CACHE_MAX_ENTRIES, settings.CONVERSATION_CACHE_SECONDS)
+        self.stats = {"follow_ups": 0, "reused_working_set": 0, "fresh_searches": 0}
+
+    async def load(
+        self,
+        db: AsyncSession,
+        parent_query_id: int,
+        user_id: int,
+        enterprise_id: int
+    ) -> Optional[Dict[str, Any]]:
+        """State left by `parent_query_id`, or None when it is unknown or not the caller's"""
+        state = self._states.get(parent_query_id)
+        if state is not None:
+            return state if (state["user_id"], state["enterprise_id"]) == (user_id, enterprise_id) else None
+
+        await audit_writer.ensure_written(parent_query_id)
+        result = await db.execute(
+            select(
+                EnterpriseQuery.user_id,
+                EnterpriseQuery.enterprise_id,
+                EnterpriseQuery.original_query,
+                EnterpriseQuery.created_at
+            ).where(EnterpriseQuery.id == parent_query_id)
+        )
+        parent = result.first()
+        if parent is None or (parent.user_id, parent.enterprise_id) != (user_id, enterprise_id):
+            # Also the case for a parent the audit writer has not flushed yet on another worker
+            logger.info(f"💬 Parent query {parent_query_id} not available; answering as a new conversation")
+            return None
+
+        body = await load_body(db, parent_query_id, parent.created_at)
+        context = body["conversation_context"] or {
+            # Queries answered before conversations were tracked
+            "turns": [f"Q: {parent.original_query}\nA: {_brief(body['ai_response'])}"],
+            "chunk_ids": [],
+        }
+        return {
+            "query_id": parent_query_id,
+            "user_id": user_id,
+            "enterprise_id": enterprise_id,
+            "turns": context["turns"],
+            "chunk_ids": context["chunk_ids"],
+            "chunks": None,
+        }
+
+    def summary(self, state: Optional[Dict[str, Any]]) -> str:
+        return "\n\n".join(state["turns"]) if state else ""
+
+    async def working_set(
+        self,
+        state: Dict[str, Any],
+        query: str,
+        enterprise_id: int,
+        document_service: Any
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        The previous turn's chunks reranked for the follow-up
+        None means the follow-up needs a fresh search (no usable set, or a new topic)
+        """
+        self.stats["follow_ups"] += 1
+        chunks = state.get("chunks")
+        if chunks is None and state["chunk_ids"]:
+            chunks = await document_service.get_chunks(enterprise_id, state["chunk_ids"])
+        if not chunks:
+            self.stats["fresh_searches"] += 1
+            return None
+
+        terms = _terms(query)
+        if not terms:
+            # "And last year?" style follow-ups carry no new terms: keep the set as it was ranked
+            self.stats["reused_working_set"] += 1
+            return chunks
+
+        ranked = []
+        for rank, chunk in enumerate(chunks):
+            coverage = len(terms & _terms(chunk["content"])) / len(terms)
+            # Ties keep the order the previous search produced
+            ranked.append((coverage, -rank, {**chunk, "score": coverage}))
+        ranked.sort(key=lambda item: item[:2], reverse=True)
+
+        if ranked[0][0] < settings.CONVERSATION_REUSE_MIN_OVERLAP:
+            self.stats["fresh_searches"] += 1
+            return None
+        self.stats["reused_working_set"] += 1
+        return [chunk for _, _, chunk in ranked]
+
+    def next_context(
+        self,
+        state: Optional[Dict[str, Any]],
+        query: str,
+        answer: str,
+        documents: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Persistable conversation_context after this turn"""
+        turns = list(state["turns"]) if state else []
+        turns.append(f"Q: {query}\nA: {_brief(answer)}")
+        # Oldest turns fall out first; the latest one is always kept
+        while len(turns) > 1 and (
+            len(turns) > settings.CONVERSATION_HISTORY_LIMIT
+            or count_tokens("\n\n".join(turns)) > settings.CONVERSATION_SUMMARY_MAX_TOKENS
+        ):
+            turns.pop(0)
+
+        chunk_ids = []
+        for doc in documents:
+            metadata = doc.get("metadata", {})
+            if metadata.get("document_id") is not None and metadata.get("chunk_index") is not None:
+                chunk_ids.append(chunk_id(metadata["document_id"], metadata["chunk_index"]))
+        return {"turns": turns, "chunk_ids": chunk_ids}
+
+    def remember(
+        self,
+        query_id: int,
+        user_id: int,
+        enterprise_id: int,
+        context: Dict[str, Any],
+        documents: List[Dict[str, Any]]
+    ) -> None:
+        """Keep this turn's state, chunk contents included, for its follow-ups"""
+        self._states.set(query_id, {
+            "query_id": query_id,
+            "user_id": user_id,
+            "enterprise_id": enterprise_id,
+            "turns": context["turns"],
+            "chunk_ids": context["chunk_ids"],
+            "chunks": [{"content": doc.get("content", ""), "metadata": doc.get("metadata", {}), "score": doc.get("score", 0)}
+                       for doc in documents],
+        })
+
+
+# Global conversation memory
+conversation_memory = ConversationMemory()
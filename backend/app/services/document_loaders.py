@@ -0,0 +1,394 @@
+"""
+Document Loaders - Format detection and streaming text extraction
+Loaders are registered per format and picked from the file's magic bytes
+(falling back to its extension), never from the client-supplied content
+type. Each loader yields sections ({"content", "metadata"}) as it reads, so
+large files are never held in memory as a whole tree:
+- DOCX: paragraphs and tables in document order, split at headings
+- PPTX: one section per slide with its tables and speaker notes
+- JSON: records flattened to "field.path: value" lines
+"""
+import json
+import logging
+import os
+import posixpath
+import zipfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+
+from app.core.config import settings
+from app.services.pdf_pipeline import pdf_pipeline
+
+logger = logging.getLogger(__name__)
+
+Section = Dict[str, Any]
+Loader = Callable[[str], Iterator[Section]]
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Bytes read from the head of a file to detect its format
+_SNIFF_BYTES = 2048
+# Bytes read per step while streaming JSON
+_JSON_READ_BYTES = 1 << 16
+
+_LOADERS: Dict[str, Loader] = {}
+_EXTENSIONS: Dict[str, str] = {}
+
+
+def register_loader(name: str, extensions: Tuple[str, ...]) -> Callable[[Loader], Loader]:
+    """Register a loader for a format name and the extensions that imply it"""
+    def decorator(loader: Loader) -> Loader:
+        _LOADERS[name] = loader
+        for extension in extensions:
+            _EXTENSIONS[extension] = name
+        return loader
+    return decorator
+
+
+def detect_format(file_path: str, filename: Optional[str] = None) -> str:
+    """
+    Format of a file from its content, falling back to the extension
+    Office files are ZIP containers, so the archive's part names decide
+    between DOCX and PPTX
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            names = set()
+        if "word/document.xml" in names:
+            return "docx"
+        if "ppt/presentation.xml" in names:
+            return "pptx"
+
+    extension = os.path.splitext(filename or file_path)[1].lower()
+    if extension in _EXTENSIONS:
+        return _EXTENSIONS[extension]
+    if head.lstrip(b"\xef\xbb\xbf \t\r\n")[:1] in (b"{", b"["):
+        return "json"
+    return "text"
+
+
+def load_document(file_path: str, filename: Optional[str] = None) -> Iterator[Section]:
+    """Sections of a document; blocking, iterate it in a thread"""
+    name = detect_format(file_path, filename)
+    logger.info(f"📄 Loading {filename or file_path} as {name}")
+    return _LOADERS[name](file_path)
+
+
+class _SectionBuffer:
+    """Collects blocks of text and cuts them into sections of about LOADER_SECTION_CHARS"""
+
+    def __init__(self, **metadata: Any):
+        self.blocks: List[str] = []
+        self.size = 0
+        self.number = 0
+        self.metadata = metadata
+
+    def add(self, text: str) -> Optional[Section]:
+        self.blocks.append(text)
+        self.size += len(text) + 1
+        return self.flush() if self.size >= settings.LOADER_SECTION_CHARS else None
+
+    def flush(self, **next_metadata: Any) -> Optional[Section]:
+        section = None
+        if self.blocks:
+            self.number += 1
+            metadata = {key: value for key, value in self.metadata.items() if value is not None}
+            section = {"content": "\n".join(self.blocks), "metadata": {"page": self.number, **metadata}}
+        self.blocks, self.size = [], 0
+        self.metadata.update(next_metadata)
+        return section
+
+
+def _table_text(rows: List[List[str]]) -> str:
+    return "\n".join(" | ".join(cells) for cells in rows if any(cells))
+
+
+# --- DOCX ---
+
+def _docx_heading(paragraph: ElementTree.Element) -> bool:
+    style = paragraph.find(f"{_W}pPr/{_W}pStyle")
+    value = style.get(f"{_W}val", "") if style is not None else ""
+    return value.lower().startswith(("heading", "title"))
+
+
+def _docx_paragraph_text(paragraph: ElementTree.Element) -> str:
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f"{_W}t" and node.text:
+            parts.append(node.text)
+        elif node.tag == f"{_W}tab":
+            parts.append("\t")
+        elif node.tag in (f"{_W}br", f"{_W}cr"):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def _docx_table_rows(table: ElementTree.Element) -> List[List[str]]:
+    rows = []
+    for row in table.iter(f"{_W}tr"):
+        cells = [
+            " ".join(filter(None, (_docx_paragraph_text(p) for p in cell.iter(f"{_W}p"))))
+            for cell in row.findall(f"{_W}tc")
+        ]
+        rows.append(cells)
+    return rows
+
+
+@register_loader("docx", extensions=(".docx",))
+def load_docx(file_path: str) -> Iterator[Section]:
+    """Body paragraphs and tables in document order; a heading starts a new section"""
+    buffer = _SectionBuffer(section=None)
+    depth = {"tbl": 0, "xml": 0}
+    body = None
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        for event, element in ElementTree.iterparse(xml, events=("start", "end")):
+            depth["xml"] += 1 if event == "start" else -1
+            if event == "start" and element.tag == f"{_W}body":
+                body = element
+            elif event == "end" and depth["xml"] == 2 and body is not None:
+                # A top-level block just ended (handled below): drop it so the tree never grows
+                body.clear()
+            if element.tag == f"{_W}tbl":
+                if event == "start":
+                    depth["tbl"] += 1
+                    continue
+                depth["tbl"] -= 1
+                if depth["tbl"] == 0:
+                    text = _table_text(_docx_table_rows(element))
+                    element.clear()
+                    if text:
+                        section = buffer.add(text)
+                        if section:
+                            yield section
+            elif event == "end" and element.tag == f"{_W}p" and depth["tbl"] == 0:
+                text = _docx_paragraph_text(element)
+                heading = _docx_heading(element)
+                element.clear()
+                if not text:
+                    continue
+                if heading:
+                    section = buffer.flush(section=text[:200])
+                    if section:
+                        yield section
+                section = buffer.add(text)
+                if section:
+                    yield section
+    section = buffer.flush()
+    if section:
+        yield section
+
+
+# --- PPTX ---
+
+def _relationships(archive: zipfile.ZipFile, names: Set[str], part: str) -> Dict[str, Tuple[str, str]]:
+    """rId -> (type, absolute part name) of a part's relationships"""
+    folder, name = posixpath.split(part)
+    rels_name = posixpath.join(folder, "_rels", f"{name}.rels")
+    if rels_name not in names:
+        return {}
+    relationships = {}
+    for rel in ElementTree.fromstring(archive.read(rels_name)).iter(f"{_REL}Relationship"):
+        target = posixpath.normpath(posixpath.join(folder, rel.get("Target", "")))
+        relationships[rel.get("Id")] = (rel.get("Type", "").rsplit("/", 1)[-1], target)
+    return relationships
+
+
+def _slide_order(archive: zipfile.ZipFile, names: Set[str]) -> List[str]:
+    """Slide part names in presentation order (not file name order)"""
+    presentation = ElementTree.fromstring(archive.read("ppt/presentation.xml"))
+    relationships = _relationships(archive, names, "ppt/presentation.xml")
+    slides = []
+    for slide_id in presentation.iter(f"{_P}sldId"):
+        rel = relationships.get(slide_id.get(f"{_R}id"))
+        if rel and rel[1] in names:
+            slides.append(rel[1])
+    return slides
+
+
+def _shape_text(root: ElementTree.Element, skip_placeholders: Tuple[str, ...] = ()) -> List[str]:
+    """Text frames and tables of a slide or notes page, in shape order"""
+    blocks = []
+    for shape in root.iter():
+        if shape.tag == f"{_P}sp":
+            placeholder = shape.find(f"{_P}nvSpPr/{_P}nvPr/{_P}ph")
+            if placeholder is not None and placeholder.get("type") in skip_placeholders:
+                continue
+            body = shape.find(f"{_P}txBody")
+            if body is None:
+                continue
+            lines = ["".join(run.text or "" for run in p.iter(f"{_A}t")).strip() for p in body.iter(f"{_A}p")]
+            text = "\n".join(line for line in lines if line)
+            if text:
+                blocks.append(text)
+        elif shape.tag == f"{_A}tbl":
+            rows = [
+                ["".join(t.text or "" for t in cell.iter(f"{_A}t")).strip() for cell in row.findall(f"{_A}tc")]
+                for row in shape.findall(f"{_A}tr")
+            ]
+            text = _table_text(rows)
+            if text:
+                blocks.append(text)
+    return blocks
+
+
+@register_loader("pptx", extensions=(".pptx",))
+def load_pptx(file_path: str) -> Iterator[Section]:
+    """One section per slide: its text and tables, then its speaker notes"""
+    with zipfile.ZipFile(file_path) as archive:
+        names = set(archive.namelist())
+        for number, slide_part in enumerate(_slide_order(archive, names), start=1):
+            blocks = _shape_text(ElementTree.fromstring(archive.read(slide_part)))
+            notes_part = next(
+                (target for kind, target in _relationships(archive, names, slide_part).values() if kind == "notesSlide"),
+                None
+            )
+            if notes_part and notes_part in names:
+                notes = _shape_text(ElementTree.fromstring(archive.read(notes_part)), ("sldNum", "sldImg", "hdr", "ftr", "dt"))
+                if notes:
+                    blocks.append("Speaker notes:\n" + "\n".join(notes))
+            if blocks:
+                yield {"content": "\n\n".join(blocks), "metadata": {"page": number, "slide": number}}
+
+
+# --- JSON ---
+
+def _flatten(value: Any, path: str, lines: List[str]) -> None:
+    """Append "path: value" for every scalar under `value`"""
+    if isinstance(value, dict):
+        if not value:
+            lines.append(f"{path or '$'}: {{}}")
+        for key, item in value.items():
+            _flatten(item, f"{path}.{key}" if path else str(key), lines)
+    elif isinstance(value, list):
+        if not value:
+            lines.append(f"{path or '$'}: []")
+        for index, item in enumerate(value):
+            _flatten(item, f"{path}[{index}]", lines)
+    else:
+        lines.append(f"{path or '$'}: {json.dumps(value, ensure_ascii=False) if not isinstance(value, str) else value}")
+
+
+def _json_values(file_path: str) -> Iterator[Tuple[str, Any]]:
+    """
+    (path, value) of the records in a JSON file
+    A top-level array or a JSON Lines file is decoded one element at a time;
+    any other document is decoded whole, with each top-level key as a record
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        buffer = f.read(_JSON_READ_BYTES).lstrip()
+        if not buffer.startswith("["):
+            rest = f.read()
+            try:
+                document = json.loads(buffer + rest)
+            except json.JSONDecodeError:
+                # JSON Lines: one value per line
+                for number, line in enumerate((buffer + rest).splitlines()):
+                    if line.strip():
+                        yield f"[{number}]", json.loads(line)
+                return
+            if isinstance(document, dict):
+                yield from document.items()
+            else:
+                yield "", document
+            return
+
+        buffer, index, eof = buffer[1:], 0, False
+        read_size = _JSON_READ_BYTES
+        while True:
+            buffer = buffer.lstrip(" \t\r\n,")
+            if buffer.startswith("]"):
+                return
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Element spans past the buffer; read more, growing the step for large elements
+                chunk = f.read(read_size)
+                read_size *= 2
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield f"[{index}]", value
+            index += 1
+            buffer = buffer[end:]
+            read_size = _JSON_READ_BYTES
+            if len(buffer) < _JSON_READ_BYTES and not eof:
+                chunk = f.read(_JSON_READ_BYTES)
+                eof = not chunk
+                buffer += chunk
+
+
+@register_loader("json", extensions=(".json", ".jsonl", ".ndjson"))
+def load_json(file_path: str) -> Iterator[Section]:
+    """Records flattened to field paths, so "customer.address.city" survives chunking"""
+    buffer = _SectionBuffer(json_path=None)
+    for path, value in _json_values(file_path):
+        if not buffer.blocks:
+            buffer.metadata["json_path"] = path or "$"
+        lines: List[str] = []
+        _flatten(value, path, lines)
+        section = buffer.add("\n".join(lines))
+        if section:
+            yield section
+    section = buffer.flush()
+    if section:
+        yield section
+
+
+# --- PDF and plain text ---
+
+@register_loader("pdf", extensions=(".pdf",))
+def load_pdf(file_path: str) -> Iterator[Section]:
+    """
+    Page text plus one section per detected table (pipe-separated rows)
+    Table sections also carry the structured table under "table"
+    """
+    if pdf_pipeline.available:
+        for page in pdf_pipeline.pages(file_path):
+            if page["text"] and "ocr" in page:
+                yield {"content": page["text"], "metadata": {"page": page["page"], "ocr": True}, "ocr": page["ocr"]}
+            elif page["text"]:
+                yield {"content": page["text"], "metadata": {"page": page["page"]}}
+            for table in page["tables"]:
+                text = _table_text(table["rows"])
+                if text:
+                    yield {
+                        "content": text,
+                        "metadata": {"page": page["page"], "block": "table", "bbox": ",".join(map(str, table["bbox"]))},
+                        "table": table,
+                    }
+        return
+
+    # Without pdfplumber: text only, one page at a time
+    from langchain_community.document_loaders import PyPDFLoader
+
+    for page in PyPDFLoader(file_path).lazy_load():
+        yield {"content": page.page_content, "metadata": {"page": page.metadata.get("page", 0) + 1}}
+
+
+@register_loader("text", extensions=(".txt", ".md"))
+def load_text(file_path: str) -> Iterator[Section]:
+    """Plain text read line by line; undecodable bytes are replaced instead of failing the upload"""
+    buffer = _SectionBuffer()
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            section = buffer.add(line.rstrip("\n"))
+            if section:
+                yield section
+    section = buffer.flush()
+    if section:
+        yield section
@@ -15,17 +15,25 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.models.document import Document
 from app.models.user import User
+from app.services.query_coalescer import bump_corpus_version
+from app.services.tabular_store import tabular_store, is_tabular, describe_table
+from app.services.document_loaders import load_document
+from app.services.chunker import chunker
+from app.services.vector_store import create_vector_store
+from app.services.vector_shards import shard_router, shard_collection, fiscal_year
 
 # Import processing libraries
 try:
-    from langchain_community.document_loaders import PyPDFLoader, TextLoader
-    from langchain_community.vectorstores import Chroma
     from langchain_openai import OpenAIEmbeddings
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
 except ImportError as e:
     print(f"Warning: Some LangChain imports failed: {e}")
 
 
+def chunk_id(document_id: int, chunk_index: int) -> str:
+    """Vector store id of a chunk, so chunks can be fetched again by id"""
+    return f"{document_id}:{chunk_index}"
+
+
 class DocumentService:
     """Enhanced document service for enterprise needs"""
     
@@ -34,11 +42,6 @@ class DocumentService:
             openai_api_key=settings.OPENAI_API_KEY,
             model=settings.EMBEDDING_MODEL
         )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            length_function=len,
-        )
     
     async def create_document(
         self,
@@ -108,44 +111,77 @@ class DocumentService:
             await db.commit()
             
             start_time = datetime.utcnow()
+            tables = None
+            pdf_tables = ocr_pages = None
             
             # Load and process document based on file type
-            if document.file_type == "application/pdf":
-                loader = PyPDFLoader(document.file_path)
+            if settings.ENABLE_TABULAR_INGESTION and is_tabular(document.original_filename):
+                # Spreadsheets become typed Parquet tables; only a card per table is embedded
+                tables = await asyncio.to_thread(
+                    tabular_store.ingest,
+                    document.enterprise_id, document.id, document.file_path, document.original_filename
+                )
+                chunks = [
+                    {
+                        "content": describe_table(table, await asyncio.to_thread(self._table_preview, table)),
+                        "metadata": {"source": document.original_filename, "table": table["name"], "table_path": table["path"]}
+                    }
+                    for table in tables
+                ]
             else:
-                loader = TextLoader(document.file_path, encoding="utf-8")
-            
-            # Load document
-            pages = loader.load()
+                # Loader picked from the file's content, not the client's content type
+                sections = await asyncio.to_thread(
+                    lambda: list(load_document(document.file_path, document.original_filename))
+                )
+                pdf_tables = [section["table"] for section in sections if "table" in section]
+                ocr_pages = [{"page": section["metadata"]["page"], **section["ocr"]} for section in sections if "ocr" in section]
+                
+                # Split into chunks along headings and table boundaries, sized in tokens
+                chunks = [
+                    {"content": chunk["content"], "metadata": {"source": document.original_filename, **chunk["metadata"]}}
+                    for chunk in await asyncio.to_thread(chunker.split, sections)
+                ]
             
-            # Split into chunks
-            chunks = self.text_splitter.split_documents(pages)
-            
-            # Create vector store namespace for enterprise
-            collection_name = f"enterprise_{document.enterprise_id}_docs"
-            
-            # Store in ChromaDB
-            vector_store = Chroma(
-                collection_name=collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=settings.VECTOR_STORE_PATH
-            )
+            # Enterprise collection, or its fiscal year / category shard (VECTOR_SHARD_BY)
+            shard = shard_router.shard_for(document)
+            vector_store = create_vector_store(shard_collection(document.enterprise_id, shard))
             
             # Add chunks with metadata
             for i, chunk in enumerate(chunks):
-                chunk.metadata.update({
+                chunk["metadata"].update({
                     "document_id": document.id,
                     "enterprise_id": document.enterprise_id,
                     "category": document.category,
                     "fiscal_period": document.fiscal_period,
+                    "fiscal_year": fiscal_year(document.fiscal_period),
                     "chunk_index": i,
                     "is_confidential": document.is_confidential
                 })
             
-            vector_store.add_documents(chunks)
+            contents = [chunk["content"] for chunk in chunks]
+            vectors = await asyncio.to_thread(self.embeddings.embed_documents, contents) if contents else []
+            # A reprocessed document may now have fewer chunks, or a new shard: drop all of its old ones first
+            previous_store = create_vector_store(shard_collection(document.enterprise_id, document.vector_shard))
+            await asyncio.to_thread(previous_store.delete, where={"document_id": document.id})
+            if shard != document.vector_shard:
+                await asyncio.to_thread(vector_store.delete, where={"document_id": document.id})
+            if contents:
+                await asyncio.to_thread(
+                    vector_store.upsert,
+                    [chunk_id(document.id, i) for i in range(len(chunks))],
+                    vectors, contents, [chunk["metadata"] for chunk in chunks]
+                )
             
             # Extract additional metadata (tables, entities, etc.)
             metadata = await self._extract_document_metadata(document.file_path)
+            if tables is not None:
+                metadata["tables"] = tables
+            if pdf_tables:
+                # Structured tables with page and bbox, for citing and re-rendering them
+                metadata["pdf_tables"] = pdf_tables
+            if ocr_pages:
+                # Per-page OCR timing (render, recognition, cache hit)
+                metadata["ocr_pages"] = ocr_pages
             
             # Update document record
             processing_time = (datetime.utcnow() - start_time).total_seconds()
@@ -153,11 +189,14 @@ class DocumentService:
             document.processed = True
             document.processing_status = "completed"
             document.chunks_count = len(chunks)
+            document.vector_shard = shard
             document.processing_time_seconds = processing_time
             document.processed_at = datetime.utcnow()
-            document.metadata = metadata
+            document.doc_metadata = metadata
             
             await db.commit()
+            shard_router.register(document.enterprise_id, shard)
+            bump_corpus_version(document.enterprise_id)
             
         except Exception as e:
             # Update with error
@@ -165,6 +204,10 @@ class DocumentService:
             document.error_message = str(e)
             await db.commit()
     
+    def _table_preview(self, table: Dict[str, Any]):
+        """First rows of an ingested table, for its search card"""
+        return tabular_store.read(table).head(settings.TABULAR_PREVIEW_ROWS)
+    
     async def _extract_document_metadata(self, file_path: str) -> Dict[str, Any]:
         """Extract advanced metadata from document"""
         metadata = {
@@ -198,29 +241,28 @@ class DocumentService:
         user_id: Optional[int],
         k: int = 10,
         enterprise: Optional[int] = None,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
-        """Search documents with enterprise context"""
+        """Search documents with enterprise context; `filters` match chunk metadata, e.g. {"fiscal_year": 2023}"""
         try:
-            collection_name = f"enterprise_{enterprise}_docs" if enterprise else "default"
-            
-            vector_store = Chroma(
-                collection_name=collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=settings.VECTOR_STORE_PATH
-            )
-            
-            # Perform similarity search
-            results = vector_store.similarity_search_with_score(query, k=k)
+            # Perform similarity search (scores are cosine similarities for every backend)
+            query_vector = await asyncio.to_thread(self.embeddings.embed_query, query)
+            if enterprise:
+                # Fans out to the enterprise's shards that the filters do not rule out
+                results = await shard_router.query(enterprise, query_vector, k, filters)
+            else:
+                vector_store = create_vector_store("default")
+                results = await asyncio.to_thread(vector_store.query, query_vector, k, filters)
             
             # Filter by similarity threshold and format results
             filtered_results = []
-            for doc, score in results:
-                if score >= similarity_threshold:
+            for hit in results:
+                if hit["score"] >= similarity_threshold:
                     filtered_results.append({
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "score": score
+                        "content": hit["content"],
+                        "metadata": hit["metadata"],
+                        "score": hit["score"]
                     })
             
             return filtered_results
@@ -229,27 +271,38 @@ class DocumentService:
             print(f"Search error: {e}")
             return []
     
+    async def get_chunks(self, enterprise_id: int, chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch chunks by id (see chunk_id), in the order given; missing ids are skipped"""
+        try:
+            found = await shard_router.get(enterprise_id, chunk_ids)
+            by_id = {
+                hit["id"]: {"content": hit["content"], "metadata": hit["metadata"], "score": 0}
+                for hit in found
+            }
+            return [by_id[requested] for requested in chunk_ids if requested in by_id]
+            
+        except Exception as e:
+            print(f"Chunk fetch error: {e}")
+            return []
+    
     async def delete_document(self, document: Document, db: AsyncSession):
         """Delete document and associated data"""
         try:
-            # Remove from vector store
-            collection_name = f"enterprise_{document.enterprise_id}_docs"
-            vector_store = Chroma(
-                collection_name=collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=settings.VECTOR_STORE_PATH
-            )
+            # Remove from vector store (the document's shard, or the base collection)
+            vector_store = create_vector_store(shard_collection(document.enterprise_id, document.vector_shard))
             
             # Delete chunks associated with this document
-            # TODO: Implement vector store cleanup
+            await asyncio.to_thread(vector_store.delete, where={"document_id": document.id})
             
-            # Delete physical file
+            # Delete physical file and any tables ingested from it
             if os.path.exists(document.file_path):
                 os.remove(document.file_path)
+            tabular_store.delete(document.enterprise_id, document.id)
             
             # Delete database record
             await db.delete(document)
             await db.commit()
+            bump_corpus_version(document.enterprise_id)
             
         except Exception as e:
             raise Exception(f"Failed to delete document: {str(e)}")
@@ -5,22 +5,37 @@ Based on ai-chatbot's LangChain service but enhanced for enterprise needs
 """
 import re
 import json
+import asyncio
+import logging
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.models.enterprise import Enterprise
-from app.models.enterprise_query import EnterpriseQuery, QueryType, QueryComplexity
+from app.models.enterprise_query import QueryType, QueryComplexity
 from app.models.document import Document
 from app.services.document_service import DocumentService
+from app.services.response_store import build_body_row
+from app.services.retention_service import retention_tier
+from app.services.audit_writer import audit_writer
+from app.services.query_scheduler import query_scheduler
+from app.services.model_router import model_router
+from app.services.prompt_templates import render_messages
+from app.services.enterprise_cache import enterprise_cache
+from app.services.conversation_memory import conversation_memory
+from app.services.query_coalescer import query_coalescer, coalescing_key
+from app.services.extractive_answering import extractive_answerer, is_lookup_question
+from app.services.table_query_engine import table_query_engine, result_to_context
+from app.services.reranker import reranker
+from app.core.database import AsyncSessionLocal
 from app.core.config import settings
 
 import openai
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.prompts import PromptTemplate
+
+logger = logging.getLogger(__name__)
 
 
 class EnterpriseAnalysisService:
@@ -40,76 +55,6 @@ class EnterpriseAnalysisService:
             model=settings.EMBEDDING_MODEL
         )
         self.document_service = DocumentService()
-        
-        # Enterprise-specific prompts (enhanced from ai-chatbot)
-        self.executive_prompt = PromptTemplate(
-            input_variables=["context", "question", "enterprise_info"],
-            template="""
-            You are a senior business analyst AI for {enterprise_info[name]}, a {enterprise_info[industry]} company.
-            
-            CONTEXT FROM DOCUMENTS:
-            {context}
-            
-            EXECUTIVE QUESTION:
-            {question}
-            
-            INSTRUCTIONS:
-            1. Provide factual, data-driven responses based ONLY on the provided context
-            2. Include specific numbers, dates, and references when available
-            3. If data spans multiple time periods, provide comparisons
-            4. Structure responses with clear sections and bullet points
-            5. Flag any limitations or missing data
-            6. Suggest follow-up questions for deeper analysis
-            
-            RESPONSE FORMAT:
-            📊 EXECUTIVE SUMMARY: [Brief key findings]
-            
-            📈 DETAILED ANALYSIS: [In-depth breakdown]
-            
-            🔍 DATA SOURCES: [Documents referenced]
-            
-            ⚠️ LIMITATIONS: [What data might be missing]
-            
-            🎯 RECOMMENDED ACTIONS: [Strategic recommendations]
-            """
-        )
-        
-        self.financial_prompt = PromptTemplate(
-            input_variables=["context", "question", "date_range"],
-            template="""
-            You are a financial analyst AI specializing in corporate financial analysis.
-            
-            FINANCIAL DATA CONTEXT:
-            {context}
-            
-            FINANCIAL QUESTION:
-            {question}
-            
-            ANALYSIS PERIOD: {date_range}
-            
-            INSTRUCTIONS:
-            1. Extract and analyze financial metrics with precision
-            2. Calculate ratios, percentages, and trends where applicable
-            3. Compare periods if historical data is available
-            4. Present data in structured format (tables/lists)
-            5. Flag any accounting inconsistencies or red flags
-            6. Provide context for the numbers (industry benchmarks if known)
-            
-            RESPONSE FORMAT:
-            💰 FINANCIAL SUMMARY
-            • Key Metric 1: $X,XXX (vs previous period: +/-X%)
-            • Key Metric 2: $X,XXX (vs budget: +/-X%)
-            
-            📊 DETAILED BREAKDOWN
-            [Table format where possible]
-            
-            📈 TRENDS & INSIGHTS
-            [Analysis of patterns and changes]
-            
-            🚨 ATTENTION ITEMS
-            [Anything requiring management attention]
-            """
-        )
 
     async def process_enterprise_query(
         self,
@@ -117,7 +62,9 @@ class EnterpriseAnalysisService:
         enterprise_id: int,
         user_id: int,
         db: AsyncSession,
-        department_id: Optional[int] = None
+        department_id: Optional[int] = None,
+        priority: Optional[str] = None,
+        parent_query_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Main method to process complex enterprise queries
@@ -128,46 +75,56 @@ class EnterpriseAnalysisService:
             user_id: ID of the user asking
             db: Database session
             department_id: Optional department context
+            priority: Request priority (low, normal, high, urgent) used for LLM scheduling
+            parent_query_id: Previous query of the conversation, for follow-ups
             
         Returns:
             Dict with analysis results, structured data, and metadata
         """
         start_time = datetime.utcnow()
         
-        # 1. Get enterprise context
-        enterprise = await self._get_enterprise_context(db, enterprise_id)
+        # 1. Analyze and classify the query (pure CPU, sizes the scheduling cost)
+        query_analysis = await self._analyze_query(query)
         
-        # 2. Analyze and classify the query
-        query_analysis = await self._analyze_query(query, enterprise)
+        # Follow-ups continue from the previous turn's summary and working set
+        conversation = None
+        if parent_query_id is not None:
+            conversation = await conversation_memory.load(db, parent_query_id, user_id, enterprise_id)
+        conversation_id = parent_query_id if conversation else None
         
-        # 3. Search relevant documents with enhanced filtering
-        documents = await self._search_enterprise_documents(
-            query, enterprise_id, query_analysis, db
-        )
-        
-        # 4. Extract and process data from documents
-        processed_data = await self._process_document_data(documents, query_analysis)
+        # Don't hold a pooled connection while queued for an LLM slot
+        await db.close()
         
-        # 5. Generate AI response based on query type
-        ai_response = await self._generate_enterprise_response(
-            query, processed_data, query_analysis, enterprise
-        )
+        # 2-6. Retrieval and generation, shared with identical in-flight queries
+        compute = lambda: self._compute_answer(query, enterprise_id, query_analysis, priority, conversation)
+        if settings.ENABLE_QUERY_COALESCING:
+            answer, _ = await query_coalescer.do(
+                coalescing_key(query, enterprise_id, department_id, conversation_id), compute
+            )
+        else:
+            answer = await compute()
         
-        # 6. Post-process for structured data (tables, charts)
-        structured_response = await self._structure_response(ai_response, query_analysis)
+        ai_response = answer["ai_response"]
+        structured_response = answer["structured_response"]
+        documents = answer["documents"]
         
         # 7. Calculate processing metrics
         processing_time = (datetime.utcnow() - start_time).total_seconds() * 1000
         
-        # 8. Save query for analytics and future reference
-        query_record = await self._save_enterprise_query(
+        # 8. Save query for analytics and future reference (one row per request)
+        conversation_context = conversation_memory.next_context(conversation, query, ai_response, documents)
+        query_id = await self._save_enterprise_query(
             db, query, ai_response, query_analysis, 
             enterprise_id, user_id, department_id,
-            processing_time, documents
+            processing_time, documents,
+            structured_data=structured_response["data"],
+            parent_query_id=conversation_id,
+            conversation_context=conversation_context
         )
+        conversation_memory.remember(query_id, user_id, enterprise_id, conversation_context, documents)
         
         return {
-            "query_id": query_record.id,
+            "query_id": query_id,
             "response": structured_response["text"],
             "structured_data": structured_response["data"],
             "query_type": query_analysis["type"],
@@ -178,7 +135,105 @@ class EnterpriseAnalysisService:
             "suggested_follow_ups": structured_response["follow_ups"]
         }
 
-    async def _analyze_query(self, query: str, enterprise: Enterprise) -> Dict[str, Any]:
+    async def _compute_answer(
+        self,
+        query: str,
+        enterprise_id: int,
+        query_analysis: Dict[str, Any],
+        priority: Optional[str],
+        conversation: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Retrieval + generation for one query
+        Uses its own session, since coalesced callers may outlive the request that started it
+        """
+        # 2. Get enterprise context (cached snapshot)
+        enterprise = await self._get_enterprise_context(enterprise_id)
+        
+        # 3. Follow-ups rerank the previous turn's chunks; otherwise search relevant documents
+        documents = None
+        if conversation:
+            documents = await conversation_memory.working_set(
+                conversation, query, enterprise_id, self.document_service
+            )
+        if documents is None:
+            async with AsyncSessionLocal() as db:
+                documents = await self._search_enterprise_documents(
+                    query, enterprise_id, query_analysis, db
+                )
+        
+        # 4. Extract and process data from documents
+        processed_data = await self._process_document_data(documents, query_analysis)
+        processed_data["conversation_summary"] = conversation_memory.summary(conversation)
+        
+        # 4b. Sums, comparisons and trends over ingested spreadsheets are computed, not generated
+        computed = await self._compute_table_results(query, query_analysis, documents)
+        processed_data["computed_results"] = computed
+        
+        # 5a. Numeric lookups answered from a table cell never wait for an LLM slot
+        if settings.ENABLE_EXTRACTIVE_ANSWERS and query_analysis.get("is_lookup"):
+            extracted = extractive_answerer.answer(
+                query,
+                processed_data["tables"],
+                processed_data["financial_data"],
+                route=model_router.route_for(query_analysis)
+            )
+            if extracted:
+                structured_response = await self._structure_response(extracted["text"], query_analysis)
+                structured_response["data"]["answer"] = extracted["answer"]
+                return {
+                    "ai_response": extracted["text"],
+                    "structured_response": structured_response,
+                    "documents": documents
+                }
+        
+        async with query_scheduler.slot(
+            priority=priority,
+            complexity=query_analysis["complexity"],
+            estimated_ms=query_analysis["estimated_processing_time"]
+        ):
+            # 5b. Generate AI response based on query type
+            ai_response = await self._generate_enterprise_response(
+                query, processed_data, query_analysis, enterprise
+            )
+        
+        # 6. Post-process for structured data (tables, charts)
+        structured_response = await self._structure_response(ai_response, query_analysis)
+        if computed:
+            structured_response["data"]["computed"] = computed
+        
+        return {
+            "ai_response": ai_response,
+            "structured_response": structured_response,
+            "documents": documents
+        }
+
+    async def _compute_table_results(
+        self,
+        query: str,
+        query_analysis: Dict[str, Any],
+        documents: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Run the question over the tables behind retrieved table cards"""
+        if not settings.ENABLE_TABLE_QUERIES:
+            return []
+        tables, seen = [], set()
+        for doc in documents:
+            metadata = doc.get("metadata", {})
+            path = metadata.get("table_path")
+            if path and path not in seen:
+                seen.add(path)
+                tables.append({"path": path, "name": metadata.get("table"), "source": metadata.get("source")})
+        if not tables:
+            return []
+        try:
+            return await asyncio.to_thread(table_query_engine.run, query, query_analysis, tables)
+        except Exception as e:
+            # Never fail the query over it; the LLM still sees the table cards
+            logger.warning(f"⚠️ Table query failed, falling back to text context: {e}")
+            return []
+
+    async def _analyze_query(self, query: str, enterprise: Optional[Enterprise] = None) -> Dict[str, Any]:
         """
         Analyze query to determine type, complexity, and processing approach
         Enhanced from basic ai-chatbot classification
@@ -254,7 +309,8 @@ class EnterpriseAnalysisService:
             "numerical_filters": numerical_filters,
             "confidence": 0.8,  # Would use ML model in production
             "requires_approval": complexity == QueryComplexity.CRITICAL,
-            "estimated_processing_time": self._estimate_processing_time(complexity)
+            "estimated_processing_time": self._estimate_processing_time(complexity),
+            "is_lookup": is_lookup_question(query)
         }
 
     async def _search_enterprise_documents(
@@ -275,24 +331,35 @@ class EnterpriseAnalysisService:
         )
         
         # Filter by document type based on query
+        filters = None
         if query_analysis["type"] == QueryType.FINANCIAL:
             # Prioritize financial documents
-            documents_query = documents_query.where(
-                Document.category.in_(["financial", "accounting", "budget"])
-            )
+            financial_categories = ["financial", "accounting", "budget"]
+            documents_query = documents_query.where(Document.category.in_(financial_categories))
+            filters = {"category": financial_categories}
         
         result = await db.execute(documents_query)
         documents = result.scalars().all()
         
+        if settings.ENABLE_RERANKING:
+            # Over-fetch cheaply by embedding; the reranker keeps the best few for the prompt
+            k = settings.RERANK_CANDIDATES if documents else 0
+        else:
+            k = min(15, len(documents))  # More documents for complex queries
+        
         # Use enhanced RAG search with more context
         relevant_docs = await self.document_service.search_documents(
             query=query,
             user_id=None,  # Enterprise context
-            k=min(15, len(documents)),  # More documents for complex queries
+            k=k,
             enterprise=enterprise_id,
-            similarity_threshold=0.6  # Lower threshold for broader results
+            similarity_threshold=0.6,  # Lower threshold for broader results
+            filters=filters  # Pushed down: category shards outside it are not searched
         )
         
+        if settings.ENABLE_RERANKING:
+            relevant_docs = await reranker.rerank(query, relevant_docs)
+        
         return relevant_docs
 
     async def _process_document_data(
@@ -319,18 +386,21 @@ class EnterpriseAnalysisService:
             # Basic text content (like ai-chatbot)
             processed_data["text_content"].append({
                 "content": content,
-                "source": metadata.get("filename", "unknown"),
+                "source": metadata.get("source", "unknown"),
                 "relevance": doc.get("score", 0)
             })
             
-            # Extract tables if query is analytical/financial
-            if query_analysis["type"] in [QueryType.FINANCIAL, QueryType.ANALYTICAL]:
+            # Extract tables if query is analytical/financial or a lookup the extractive path may answer
+            if query_analysis["type"] in [QueryType.FINANCIAL, QueryType.ANALYTICAL] or query_analysis.get("is_lookup"):
+                # Keep the source on every item so extractive answers can cite it
+                citation = {"source": metadata.get("source", "unknown"), "document_id": metadata.get("document_id")}
+                
                 tables = self._extract_tables_from_text(content)
-                processed_data["tables"].extend(tables)
+                processed_data["tables"].extend({**table, **citation} for table in tables)
                 
                 # Extract financial numbers
                 financial_data = self._extract_financial_data(content)
-                processed_data["financial_data"].extend(financial_data)
+                processed_data["financial_data"].extend({**item, **citation} for item in financial_data)
             
             # Extract dates
             dates = self._extract_dates_from_text(content)
@@ -347,7 +417,7 @@ class EnterpriseAnalysisService:
         query: str,
         processed_data: Dict[str, Any],
         query_analysis: Dict[str, Any],
-        enterprise: Enterprise
+        enterprise: Dict[str, Any]
     ) -> str:
         """
         Generate AI response using appropriate prompt template
@@ -356,39 +426,24 @@ class EnterpriseAnalysisService:
         # Prepare context from processed data
         context = self._prepare_context_for_ai(processed_data)
         
-        # Choose appropriate prompt based on query type
-        if query_analysis["type"] == QueryType.FINANCIAL:
-            prompt = self.financial_prompt.format(
-                context=context,
-                question=query,
-                date_range=", ".join(query_analysis.get("date_mentions", ["Not specified"]))
-            )
-        else:
-            prompt = self.executive_prompt.format(
+        date_range = ", ".join(query_analysis.get("date_mentions") or ["Not specified"])
+        
+        def build_prompt(template: str) -> List[Dict[str, str]]:
+            """Render the template chosen by the model router (static prefix first, see prompt_templates)"""
+            return render_messages(
+                template,
+                enterprise,
                 context=context,
                 question=query,
-                enterprise_info={
-                    "name": enterprise.name,
-                    "industry": enterprise.industry or "Business"
-                }
+                date_range=date_range if template == "financial" else None
             )
         
-        # Call OpenAI with enterprise-optimized parameters
+        # Model, token budget and template depend on type/complexity (see model_router)
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
-            response = client.chat.completions.create(
-                model="gpt-4",  # Better model for complex queries
-                messages=[
-                    {"role": "system", "content": "You are a senior business intelligence analyst."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,  # Lower for factual responses
-                max_tokens=2000,  # Longer for detailed analysis
-            )
-            
-            return response.choices[0].message.content
+            result = await model_router.generate(query_analysis, build_prompt)
+            # What an extractive answer on this route saves (see extractive_answering)
+            extractive_answerer.observe_llm_latency(result.get("escalated_from", result["route"]), result["latency_ms"])
+            return result["text"]
             
         except Exception as e:
             # Fallback response
@@ -528,10 +583,12 @@ class EnterpriseAnalysisService:
         return match.group(1).strip() if match else None
 
     # Additional helper methods...
-    async def _get_enterprise_context(self, db: AsyncSession, enterprise_id: int) -> Enterprise:
-        """Get enterprise information for context"""
-        result = await db.execute(select(Enterprise).where(Enterprise.id == enterprise_id))
-        return result.scalar_one()
+    async def _get_enterprise_context(self, enterprise_id: int) -> Dict[str, Any]:
+        """Get enterprise information for context (snapshot from enterprise_cache)"""
+        enterprise = await enterprise_cache.get(enterprise_id)
+        if enterprise is None:
+            raise ValueError(f"Enterprise {enterprise_id} not found")
+        return enterprise
 
     async def _save_enterprise_query(
         self,
@@ -543,34 +600,67 @@ class EnterpriseAnalysisService:
         user_id: int,
         department_id: Optional[int],
         processing_time: float,
-        documents: List[Dict]
-    ) -> EnterpriseQuery:
-        """Save query record for analytics and audit"""
-        query_record = EnterpriseQuery(
-            user_id=user_id,
-            enterprise_id=enterprise_id,
-            department_id=department_id,
-            original_query=query,
-            query_type=analysis["type"],
-            complexity=analysis["complexity"],
+        documents: List[Dict],
+        structured_data: Optional[Dict[str, Any]] = None,
+        parent_query_id: Optional[int] = None,
+        conversation_context: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Record the query for analytics and audit; the response body goes to cold storage
+        The write is handed to the audit writer, so only the id allocation is on the request path
+        """
+        query_id = await audit_writer.next_id()
+        now = datetime.now(timezone.utc)
+        # Rows land in the partition tier of the enterprise's retention period
+        snapshot = await enterprise_cache.get(enterprise_id)
+        retention_days = retention_tier(snapshot["data_retention_days"] if snapshot else None)
+        
+        query_row = {
+            "id": query_id,
+            "user_id": user_id,
+            "enterprise_id": enterprise_id,
+            "department_id": department_id,
+            "original_query": query,
+            "query_type": analysis["type"],
+            "complexity": analysis["complexity"],
+            "response_length": len(response) if response else 0,
+            "processing_time_ms": int(processing_time),
+            "documents_used": [doc.get("metadata", {}).get("document_id") for doc in documents],
+            "confidence_score": analysis["confidence"],
+            "entities_mentioned": analysis["entities"],
+            "parent_query_id": parent_query_id,
+            "created_at": now,
+            "retention_days": retention_days,
+            "responded_at": now
+        }
+        body_row = build_body_row(
+            query_id=query_id,
+            created_at=now,
+            retention_days=retention_days,
             ai_response=response,
-            processing_time_ms=int(processing_time),
-            documents_used=[doc.get("metadata", {}).get("document_id") for doc in documents],
-            confidence_score=analysis["confidence"],
-            entities_mentioned=analysis["entities"],
-            responded_at=datetime.utcnow()
+            structured_data=structured_data,
+            conversation_context=conversation_context
         )
+        await audit_writer.record(query_row, body_row)
         
-        db.add(query_record)
-        await db.commit()
-        await db.refresh(query_record)
-        
-        return query_record
+        return query_id
 
     def _prepare_context_for_ai(self, processed_data: Dict[str, Any]) -> str:
         """Prepare structured context for AI prompt"""
         context_parts = []
         
+        # Earlier turns of the conversation
+        if processed_data.get("conversation_summary"):
+            context_parts.append(f"CONVERSATION SO FAR:\n{processed_data['conversation_summary']}\n")
+        
+        # Results computed from source tables; the table cards stay below so a misread question can be caught
+        computed = processed_data.get("computed_results")
+        if computed:
+            context_parts.append(
+                "COMPUTED RESULTS (from source tables; prefer these figures unless they do not answer the question):"
+            )
+            context_parts.extend(f"{result_to_context(result)}\n" for result in computed)
+        
         # Text content
         for item in processed_data["text_content"][:10]:  # Limit context
             context_parts.append(f"Source: {item['source']}\n{item['content']}\n")
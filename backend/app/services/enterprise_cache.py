@@ -0,0 +1,117 @@
+"""
+Enterprise Cache - In-process snapshots of enterprise and department metadata
+Hot paths (query processing, rate limits, connector listing) read settings
+from here instead of selecting the enterprise row per request. ORM writes to
+Enterprise/Department evict the snapshot on commit; the TTL bounds how long
+other workers can keep serving an old one
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.enterprise import Enterprise, Department
+from app.services.query_coalescer import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+ENTERPRISE_COLUMNS = tuple(Enterprise.__table__.columns)
+DEPARTMENT_COLUMNS = (
+    Department.id, Department.name, Department.code, Department.description,
+    Department.specialized_instructions, Department.allowed_data_types,
+    Department.can_access_all_data, Department.restricted_keywords
+)
+
+_STALE_ENTERPRISES_KEY = "enterprise_cache_stale"
+
+
+class EnterpriseCache:
+    """
+    enterprise id -> snapshot dict of the enterprise columns, plus
+    "departments" (list of dicts) and "version" (changes on every edit)
+    Snapshots are shared between requests and must not be mutated
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self._cache = TTLCache(
+            max_entries if max_entries is not None else settings.ENTERPRISE_CACHE_MAX_ENTRIES,
+            ttl_seconds if ttl_seconds is not None else settings.ENTERPRISE_CACHE_SECONDS
+        )
+        self._loads = SingleFlight()
+        self._generations: Dict[int, int] = {}
+
+    async def get(self, enterprise_id: int) -> Optional[Dict[str, Any]]:
+        """Snapshot of an enterprise, or None if it does not exist; no DB round-trip on a hit"""
+        snapshot = self._cache.get(enterprise_id)
+        if snapshot is None:
+            # Concurrent misses share one load; an invalidation starts a new one
+            generation = self._generations.get(enterprise_id, 0)
+            snapshot, _ = await self._loads.do(
+                (enterprise_id, generation), lambda: self._load(enterprise_id, generation)
+            )
+        return snapshot
+
+    async def _load(self, enterprise_id: int, generation: int) -> Optional[Dict[str, Any]]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(*ENTERPRISE_COLUMNS).where(Enterprise.id == enterprise_id))
+            row = result.mappings().first()
+            if row is None:
+                return None
+            result = await db.execute(
+                select(*DEPARTMENT_COLUMNS)
+                .where(Department.enterprise_id == enterprise_id)
+                .order_by(Department.id)
+            )
+            departments = [dict(department) for department in result.mappings()]
+
+        stamp = row["updated_at"] or row["created_at"]
+        snapshot = {
+            **row,
+            "departments": departments,
+            "version": stamp.isoformat() if stamp else "",
+        }
+        # A write committed while we were reading would be lost if cached now
+        if self._generations.get(enterprise_id, 0) == generation:
+            self._cache.set(enterprise_id, snapshot)
+        return snapshot
+
+    def invalidate(self, enterprise_id: int) -> None:
+        """Drop a snapshot; call after bulk UPDATEs that bypass ORM events"""
+        self._generations[enterprise_id] = self._generations.get(enterprise_id, 0) + 1
+        self._cache.pop(enterprise_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+# Global enterprise metadata cache
+enterprise_cache = EnterpriseCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_enterprises(session, flush_context):
+    """Remember which enterprises this transaction touched"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Enterprise):
+            enterprise_id = obj.id
+        elif isinstance(obj, Department):
+            enterprise_id = obj.enterprise_id
+        else:
+            continue
+        if enterprise_id is not None:
+            session.info.setdefault(_STALE_ENTERPRISES_KEY, set()).add(enterprise_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_enterprises(session):
+    for enterprise_id in session.info.pop(_STALE_ENTERPRISES_KEY, ()):
+        enterprise_cache.invalidate(enterprise_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_enterprises(session):
+    session.info.pop(_STALE_ENTERPRISES_KEY, None)
@@ -0,0 +1,215 @@
+"""
+Extractive Answering - Deterministic fast path for numeric lookups
+Answers "what was marketing spend in January" style questions straight from
+table cells (or figures in running text) found in the retrieved documents,
+so confident lookups skip the LLM call entirely
+"""
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_LOOKUP_PREFIX = re.compile(
+    r"^\s*(what\s+(was|is|were|are)|how\s+(much|many)|show\s+me|give\s+me|tell\s+me)\b", re.IGNORECASE
+)
+# Questions that need reasoning rather than a single figure
+_NON_LOOKUP_TERMS = re.compile(
+    r"\b(why|compare|comparison|trend|versus|vs|explain|forecast|predict|should|recommend|analy[sz]e|correlat\w*)\b",
+    re.IGNORECASE
+)
+_NUMBER = re.compile(r"^\(?-?[$€£]?\s*-?\d[\d,]*(\.\d+)?\s*(%|[kKmMbB]|mm|bn)?\)?$")
+_WORD = re.compile(r"[a-z0-9&]+")
+
+_MONTHS = {
+    "january": "jan", "february": "feb", "march": "mar", "april": "apr", "may": "may", "june": "jun",
+    "july": "jul", "august": "aug", "september": "sep", "sept": "sep", "october": "oct",
+    "november": "nov", "december": "dec",
+}
+_PERIOD_TOKENS = set(_MONTHS.values()) | {"q1", "q2", "q3", "q4", "h1", "h2", "fy", "ytd"}
+_STOPWORDS = {
+    "what", "was", "is", "were", "are", "how", "much", "many", "show", "me", "give", "tell", "the", "a", "an",
+    "of", "for", "in", "on", "at", "to", "our", "we", "did", "do", "does", "total", "value", "amount",
+    "during", "by", "and", "with", "from", "this", "that", "last", "year", "month", "quarter",
+}
+
+
+def _tokens(text: str) -> List[str]:
+    words = _WORD.findall(str(text).lower())
+    return [_MONTHS.get(word, word) for word in words]
+
+
+def _split_terms(text: str) -> Tuple[Set[str], Set[str]]:
+    """(metric terms, period terms) of a question or cell label"""
+    metric, period = set(), set()
+    for token in _tokens(text):
+        if token in _PERIOD_TOKENS or re.fullmatch(r"(19|20)\d{2}", token):
+            period.add(token)
+        elif token not in _STOPWORDS:
+            metric.add(token)
+    return metric, period
+
+
+def _is_number(cell: Any) -> bool:
+    return bool(_NUMBER.match(str(cell).strip())) and any(ch.isdigit() for ch in str(cell))
+
+
+def _trim(cells: List[Any]) -> List[str]:
+    """Drop the empty edge cells that "| a | b |" rows split into"""
+    cells = [str(cell).strip() for cell in cells]
+    while cells and not cells[0]:
+        cells.pop(0)
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def is_lookup_question(query: str) -> bool:
+    """Single-figure questions the fast path may answer"""
+    return bool(_LOOKUP_PREFIX.search(query)) and not _NON_LOOKUP_TERMS.search(query)
+
+
+class ExtractiveAnswerer:
+    """
+    Scores every numeric table cell by how well its row label and column
+    header cover the question's metric and period terms. Fires only when the
+    best cell covers the question fully and clearly beats the runner-up.
+    """
+
+    def __init__(self, min_confidence: Optional[float] = None):
+        self.min_confidence = min_confidence if min_confidence is not None else settings.EXTRACTIVE_MIN_CONFIDENCE
+        self.stats = {"attempts": 0, "answered": 0, "llm_ms_saved": 0.0, "extractive_ms": 0.0}
+        self._llm_latency_ms: Dict[str, float] = {}
+
+    def observe_llm_latency(self, route: str, latency_ms: float) -> None:
+        """Moving average of LLM latency per route, used to price what the fast path saves"""
+        previous = self._llm_latency_ms.get(route)
+        self._llm_latency_ms[route] = latency_ms if previous is None else 0.8 * previous + 0.2 * latency_ms
+
+    def answer(self, query: str, tables: List[Dict[str, Any]], financial_data: Optional[List[Dict[str, Any]]] = None,
+               route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Structured answer with citation, or None to fall back to the LLM"""
+        if not is_lookup_question(query):
+            return None
+
+        start = time.perf_counter()
+        self.stats["attempts"] += 1
+
+        metric, period = _split_terms(query)
+        if not metric:
+            return None
+
+        candidates = self._table_candidates(metric, period, tables)
+        if not candidates:
+            candidates = self._text_candidates(metric, period, financial_data or [])
+        if not candidates:
+            return None
+
+        candidates.sort(key=lambda candidate: candidate["confidence"], reverse=True)
+        best = candidates[0]
+        runner_up = candidates[1]["confidence"] if len(candidates) > 1 else 0.0
+        # Two equally good cells with different values: ambiguous, let the LLM handle it
+        if best["confidence"] < self.min_confidence or (
+            best["confidence"] - runner_up < 0.1 and candidates[1]["value"] != best["value"]
+        ):
+            return None
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats["answered"] += 1
+        self.stats["extractive_ms"] += elapsed_ms
+        if route in self._llm_latency_ms:
+            self.stats["llm_ms_saved"] += max(0.0, self._llm_latency_ms[route] - elapsed_ms)
+
+        label = " ".join(part for part in (best["metric_label"], best["period_label"]) if part)
+        source = best.get("source") or "retrieved document"
+        logger.info(f"⚡ Extractive answer from {source} ({best['confidence']:.2f}, {elapsed_ms:.1f} ms)")
+        return {
+            "text": f"{label}: {best['value']} (source: {source})",
+            "answer": {
+                "value": best["value"],
+                "metric": best["metric_label"],
+                "period": best["period_label"],
+                "source": source,
+                "document_id": best.get("document_id"),
+                "location": best["location"],
+                "confidence": round(best["confidence"], 3),
+                "answered_by": "extractive",
+            },
+        }
+
+    def _score(self, metric: Set[str], period: Set[str], label_metric: Set[str], label_period: Set[str]) -> float:
+        """Metric coverage, scaled down when the requested period is not matched"""
+        coverage = len(metric & label_metric) / len(metric)
+        if period:
+            coverage *= 1.0 if period <= label_period else 0.3
+        elif label_period:
+            coverage *= 0.85  # Table is per period but the question didn't pick one
+        return coverage
+
+    def _table_candidates(self, metric: Set[str], period: Set[str], tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        candidates = []
+        for table_index, table in enumerate(tables):
+            headers = _trim(table.get("headers", []))
+            for row_index, raw_row in enumerate(table.get("rows", [])):
+                row = _trim(raw_row)
+                if len(row) < 2:
+                    continue
+                row_label = row[0]
+                for col_index in range(1, len(row)):
+                    cell = row[col_index]
+                    if not _is_number(cell):
+                        continue
+                    header = headers[col_index] if col_index < len(headers) else ""
+                    label_metric, label_period = _split_terms(f"{row_label} {header}")
+                    confidence = self._score(metric, period, label_metric, label_period)
+                    if confidence <= 0:
+                        continue
+                    # Report whichever side carries the period as the period label
+                    header_is_period = bool(_split_terms(header)[1])
+                    candidates.append({
+                        "value": cell,
+                        "confidence": confidence,
+                        "metric_label": row_label if header_is_period else f"{row_label} {header}".strip(),
+                        "period_label": header if header_is_period else "",
+                        "source": table.get("source"),
+                        "document_id": table.get("document_id"),
+                        "location": {"table": table_index + 1, "row": row_index + 1, "column": header or col_index + 1},
+                    })
+        return candidates
+
+    def _text_candidates(self, metric: Set[str], period: Set[str], financial_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Figures in running text, judged by the words around them (held to a higher bar)"""
+        candidates = []
+        for item in financial_data:
+            context_metric, context_period = _split_terms(item.get("context", ""))
+            confidence = self._score(metric, period, context_metric, context_period) * 0.9
+            if confidence <= 0:
+                continue
+            candidates.append({
+                "value": item["value"],
+                "confidence": confidence,
+                "metric_label": " ".join(sorted(metric & context_metric)).title(),
+                "period_label": " ".join(sorted(period)).title(),
+                "source": item.get("source"),
+                "document_id": item.get("document_id"),
+                "location": {"context": item.get("context", "").strip()},
+            })
+        return candidates
+
+    def report(self) -> Dict[str, Any]:
+        attempts = self.stats["attempts"]
+        answered = self.stats["answered"]
+        return {
+            "attempts": attempts,
+            "answered": answered,
+            "hit_rate": round(answered / attempts, 3) if attempts else 0.0,
+            "llm_ms_saved": round(self.stats["llm_ms_saved"]),
+            "avg_extractive_ms": round(self.stats["extractive_ms"] / answered, 3) if answered else 0.0,
+        }
+
+
+# Global answerer instance
+extractive_answerer = ExtractiveAnswerer()
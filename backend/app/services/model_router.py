@@ -0,0 +1,183 @@
+"""
+Model Router - Picks model, token budget and prompt template per query
+Simple lookups go to a fast small model and escalate to the standard route
+when the cheap answer is not confident; analytical and financial work keeps
+the large model
+"""
+import json
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.core.config import settings
+from app.models.enterprise_query import QueryType, QueryComplexity
+
+logger = logging.getLogger(__name__)
+
+# Marker the concise template asks the fast model to emit when context is missing
+INSUFFICIENT_CONTEXT = "INSUFFICIENT_CONTEXT"
+
+SYSTEM_PROMPT = "You are a senior business intelligence analyst."
+
+
+def default_routes() -> Dict[str, Dict[str, Any]]:
+    """Route name -> model, max_tokens, template and escalation target"""
+    return {
+        "fast": {
+            "model": settings.LLM_FAST_MODEL,
+            "max_tokens": settings.LLM_FAST_MAX_TOKENS,
+            "template": "concise",
+            "escalate_to": "standard",
+        },
+        "standard": {
+            "model": settings.LLM_MODEL,
+            "max_tokens": settings.LLM_STANDARD_MAX_TOKENS,
+            "template": "executive",
+            "escalate_to": None,
+        },
+        "deep": {
+            "model": settings.LLM_MODEL,
+            "max_tokens": settings.LLM_DEEP_MAX_TOKENS,
+            "template": "executive",
+            "escalate_to": None,
+        },
+        "financial": {
+            "model": settings.LLM_MODEL,
+            "max_tokens": settings.LLM_DEEP_MAX_TOKENS,
+            "template": "financial",
+            "escalate_to": None,
+        },
+    }
+
+
+# "<type>:<complexity>", "<type>" or "<complexity>" -> route name; most specific wins
+DEFAULT_ROUTING_TABLE = {
+    f"{QueryType.SIMPLE.value}:{QueryComplexity.LOW.value}": "fast",
+    QueryType.FINANCIAL.value: "financial",
+    QueryComplexity.LOW.value: "standard",
+    QueryComplexity.MEDIUM.value: "standard",
+    QueryComplexity.HIGH.value: "deep",
+    QueryComplexity.CRITICAL.value: "deep",
+}
+
+
+def _value(enum_or_str: Any) -> str:
+    return getattr(enum_or_str, "value", enum_or_str)
+
+
+class ModelRouter:
+    """
+    Routes a classified query to a model and runs the completion
+    `client` is any AsyncOpenAI-compatible object (benchmarks pass a local stub)
+    """
+
+    def __init__(self, client: Any = None, routes: Optional[Dict[str, Dict[str, Any]]] = None,
+                 routing_table: Optional[Dict[str, str]] = None):
+        self._client = client
+        self.routes = routes or default_routes()
+        self.routing_table = dict(DEFAULT_ROUTING_TABLE)
+        self.routing_table.update(routing_table or self._configured_overrides())
+
+    @staticmethod
+    def _configured_overrides() -> Dict[str, str]:
+        if not settings.LLM_ROUTING_OVERRIDES:
+            return {}
+        try:
+            return json.loads(settings.LLM_ROUTING_OVERRIDES)
+        except ValueError:
+            logger.error("❌ LLM_ROUTING_OVERRIDES is not valid JSON; using default routing")
+            return {}
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.LLM_API_BASE_URL or None
+            )
+        return self._client
+
+    def route_for(self, query_analysis: Dict[str, Any]) -> str:
+        """Route name for a query analysis produced by _analyze_query"""
+        query_type = _value(query_analysis["type"])
+        complexity = _value(query_analysis["complexity"])
+        for key in (f"{query_type}:{complexity}", query_type, complexity):
+            route = self.routing_table.get(key)
+            if route in self.routes:
+                return route
+        return "standard"
+
+    async def complete(self, route_name: str, prompt: Union[str, List[Dict[str, str]]]) -> Dict[str, Any]:
+        """
+        One chat completion on a route, with a confidence estimate
+        `prompt` is the user message, or the full message list (see prompt_templates)
+        """
+        route = self.routes[route_name]
+        wants_confidence = route.get("escalate_to") is not None
+        start = time.perf_counter()
+
+        if isinstance(prompt, str):
+            prompt = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+        request = {
+            "model": route["model"],
+            "messages": prompt,
+            "temperature": settings.LLM_TEMPERATURE,
+            "max_tokens": route["max_tokens"],
+        }
+        if wants_confidence:
+            request["logprobs"] = True
+        response = await self.client.chat.completions.create(**request)
+
+        choice = response.choices[0]
+        text = choice.message.content or ""
+        return {
+            "text": text,
+            "route": route_name,
+            "model": route["model"],
+            "confidence": self._confidence(choice, text) if wants_confidence else None,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "tokens_used": getattr(getattr(response, "usage", None), "total_tokens", None),
+        }
+
+    @staticmethod
+    def _confidence(choice: Any, text: str) -> float:
+        """Geometric-mean token probability; 0 when the model flags missing context"""
+        if INSUFFICIENT_CONTEXT in text:
+            return 0.0
+        content = getattr(getattr(choice, "logprobs", None), "content", None)
+        if not content:
+            return 1.0  # Backend without logprobs: trust the answer
+        mean_logprob = sum(token.logprob for token in content) / len(content)
+        return math.exp(mean_logprob)
+
+    async def generate(self, query_analysis: Dict[str, Any], build_prompt: Callable[[str], Any]) -> Dict[str, Any]:
+        """
+        Route, complete and escalate when needed
+        `build_prompt` renders the named template ("concise", "executive", "financial")
+        """
+        route_name = self.route_for(query_analysis)
+        result = await self.complete(route_name, build_prompt(self.routes[route_name]["template"]))
+
+        escalate_to = self.routes[route_name].get("escalate_to")
+        if (
+            escalate_to
+            and settings.ENABLE_LLM_ESCALATION
+            and result["confidence"] is not None
+            and result["confidence"] < settings.LLM_ESCALATION_CONFIDENCE
+        ):
+            logger.info(f"⬆️ Escalating {route_name} -> {escalate_to} (confidence {result['confidence']:.2f})")
+            first_latency = result["latency_ms"]
+            result = await self.complete(escalate_to, build_prompt(self.routes[escalate_to]["template"]))
+            result["escalated_from"] = route_name
+            result["latency_ms"] += first_latency
+
+        return result
+
+
+# Global router instance
+model_router = ModelRouter()
@@ -0,0 +1,98 @@
+"""
+OCR Engine - Text for scanned PDF pages
+Only pages without a text layer are rendered and recognized, by a locally
+installed Tesseract run as at most OCR_WORKERS concurrent processes. Output
+is cached on disk by the hash of the rendered page image, so reprocessing a
+document (or uploading the same scan twice) never recognizes a page again.
+Without Tesseract the stage is skipped and those pages stay empty, as before
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OcrEngine:
+    """Tesseract behind a bounded pool and a page-image-hash cache"""
+
+    def __init__(self, cache_path: Optional[str] = None, workers: Optional[int] = None):
+        self.binary = shutil.which(settings.OCR_TESSERACT_CMD)
+        self.cache_path = cache_path or settings.OCR_CACHE_PATH
+        # Each task is a Tesseract subprocess, so this bounds the OCR processes
+        self._pool = ThreadPoolExecutor(max_workers=workers or settings.OCR_WORKERS, thread_name_prefix="ocr")
+        self.stats = {"pages": 0, "cache_hits": 0, "failures": 0, "ocr_ms": 0.0}
+
+    @property
+    def available(self) -> bool:
+        return settings.ENABLE_OCR and self.binary is not None
+
+    def _cache_file(self, image: bytes) -> str:
+        # The language and resolution change the output, so they are part of the key
+        key = hashlib.sha256(image + f"|{settings.OCR_LANGUAGES}|{settings.OCR_DPI}".encode()).hexdigest()
+        return os.path.join(self.cache_path, key[:2], f"{key}.txt")
+
+    def recognize(self, image: bytes) -> Dict[str, Any]:
+        """Text of one page image (PNG bytes): {"text", "ms", "cached"}"""
+        began = time.perf_counter()
+        cache_file = self._cache_file(image)
+        if os.path.exists(cache_file):
+            with open(cache_file, "r", encoding="utf-8") as f:
+                text = f.read()
+            self.stats["cache_hits"] += 1
+            return {"text": text, "ms": round((time.perf_counter() - began) * 1000, 1), "cached": True}
+
+        try:
+            completed = subprocess.run(
+                [self.binary, "stdin", "stdout", "-l", settings.OCR_LANGUAGES, "--psm", "3"],
+                input=image,
+                capture_output=True,
+                timeout=settings.OCR_PAGE_TIMEOUT_SECONDS,
+                check=True
+            )
+        except (subprocess.SubprocessError, OSError) as e:
+            self.stats["failures"] += 1
+            logger.warning(f"⚠️ OCR failed for a page: {e}")
+            return {"text": "", "ms": round((time.perf_counter() - began) * 1000, 1), "cached": False}
+
+        text = completed.stdout.decode("utf-8", errors="replace").strip()
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temporary = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, cache_file)  # Atomic, so concurrent workers never read half a file
+
+        elapsed = (time.perf_counter() - began) * 1000
+        self.stats["pages"] += 1
+        self.stats["ocr_ms"] += elapsed
+        return {"text": text, "ms": round(elapsed, 1), "cached": False}
+
+    def recognize_pages(self, pages: List[Dict[str, Any]]) -> None:
+        """Fill in the text of extracted pages that carry a rendered image, concurrently"""
+        scanned = [page for page in pages if page.get("image")]
+        for page, result in zip(scanned, self._pool.map(self.recognize, [page["image"] for page in scanned])):
+            page["text"] = result["text"]
+            page["ocr"] = {"ms": result["ms"], "cached": result["cached"], "render_ms": page.get("render_ms")}
+            page.pop("image")
+            logger.debug(f"🔎 OCR page {page['page']}: {result['ms']} ms{' (cached)' if result['cached'] else ''}")
+
+    def report(self) -> Dict[str, Any]:
+        recognized = self.stats["pages"]
+        return {
+            **self.stats,
+            "available": self.available,
+            "ocr_ms": round(self.stats["ocr_ms"], 1),
+            "avg_ms_per_page": round(self.stats["ocr_ms"] / recognized, 1) if recognized else 0.0,
+        }
+
+
+# Global OCR engine
+ocr_engine = OcrEngine()
@@ -0,0 +1,232 @@
+"""
+PDF Pipeline - Page-parallel text and table extraction
+A PDF is split into page ranges that worker processes extract concurrently
+with pdfplumber. Each page yields its running text (table regions excluded)
+and the tables found on it, as rows with their bounding box on the page, so
+a 400-page annual report uses every core instead of one. Pages without a
+text layer (scans) are rendered by the workers and recognized by ocr_engine
+"""
+import io
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ocr_engine import ocr_engine
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+logger = logging.getLogger(__name__)
+
+# Ruled tables: cell borders drawn as lines
+_LINE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+# Unruled tables (typical of financial statements): columns inferred from aligned words,
+# only inside a block of numeric lines so prose is never read as a table
+_TEXT_SETTINGS = {
+    "vertical_strategy": "text",
+    "horizontal_strategy": "text",
+    "min_words_vertical": 2,
+    "min_words_horizontal": 1,
+}
+_NUMERIC_CELL = re.compile(r"^\(?-?[$€£]?\s*[\d,]+(\.\d+)?%?\)?$")
+
+
+def _clean_rows(rows: List[List[Optional[str]]]) -> List[List[str]]:
+    cleaned = [[" ".join((cell or "").split()) for cell in row] for row in rows]
+    return [row for row in cleaned if any(row)]
+
+
+def _looks_tabular(rows: List[List[str]]) -> bool:
+    """
+    Whether a text-strategy candidate is a real table rather than aligned prose:
+    at least 3 rows and 2 columns, with mostly numeric values outside the label column
+    """
+    if len(rows) < 3 or max(len(row) for row in rows) < 2:
+        return False
+    values = [cell for row in rows[1:] for cell in row[1:] if cell]
+    if not values:
+        return False
+    return sum(bool(_NUMERIC_CELL.match(cell)) for cell in values) / len(values) >= 0.5
+
+
+def _numeric_blocks(page: Any) -> List[Tuple[float, float, float, float]]:
+    """
+    Regions of consecutive text lines with 2+ numeric values each, plus the
+    heading line right above them (column titles)
+    """
+    lines = page.extract_text_lines()
+    regions, block = [], []
+    for index, line in enumerate(lines + [None]):
+        numeric = line is not None and sum(bool(_NUMERIC_CELL.match(word)) for word in line["text"].split()) >= 2
+        if numeric:
+            block.append(index)
+            continue
+        if len(block) >= 2:
+            members = [lines[i] for i in block]
+            previous = lines[block[0] - 1] if block[0] > 0 else None
+            line_height = members[0]["bottom"] - members[0]["top"]
+            if previous is not None and members[0]["top"] - previous["bottom"] <= 2 * line_height:
+                members.insert(0, previous)
+            regions.append((
+                max(0, min(m["x0"] for m in members) - 2),
+                max(0, members[0]["top"] - 2),
+                min(page.width, max(m["x1"] for m in members) + 2),
+                min(page.height, members[-1]["bottom"] + 2),
+            ))
+        block = []
+    return regions
+
+
+def _page_tables(page: Any) -> List[Any]:
+    """Ruled tables first; unruled ones only where no ruled table was found"""
+    tables = page.find_tables(_LINE_SETTINGS)
+    if tables:
+        return tables
+    for region in _numeric_blocks(page):
+        found = page.crop(region).find_tables(_TEXT_SETTINGS)
+        tables.extend(table for table in found if _looks_tabular(_clean_rows(table.extract())))
+    return tables
+
+
+def _render(page: Any, dpi: int) -> bytes:
+    """Grayscale PNG of a page, for OCR"""
+    buffer = io.BytesIO()
+    page.to_image(resolution=dpi).original.convert("L").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def extract_pages(
+    file_path: str,
+    start: int,
+    end: int,
+    detect_tables: bool = True,
+    render_dpi: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Text and tables of pages [start, end) (0-based); runs inside a worker process
+    Page numbers in the result are 1-based; bbox is (x0, top, x1, bottom) in PDF points.
+    Pages without a text layer are flagged "scanned" and, with render_dpi, carry their image
+    """
+    pages = []
+    with pdfplumber.open(file_path, pages=list(range(start + 1, end + 1))) as pdf:
+        for page in pdf.pages:
+            began = time.perf_counter()
+            if not page.chars:
+                scanned = {"page": page.page_number, "width": float(page.width), "height": float(page.height),
+                           "text": "", "tables": [], "scanned": True}
+                if render_dpi:
+                    scanned["image"] = _render(page, render_dpi)
+                    scanned["render_ms"] = round((time.perf_counter() - began) * 1000, 1)
+                pages.append(scanned)
+                page.close()
+                continue
+            tables = _page_tables(page) if detect_tables else []
+            text_region = page
+            for table in tables:
+                text_region = text_region.outside_bbox(table.bbox)
+            pages.append({
+                "page": page.page_number,
+                "width": float(page.width),
+                "height": float(page.height),
+                "text": (text_region.extract_text() or "").strip(),
+                "tables": [
+                    {
+                        "page": page.page_number,
+                        "bbox": [round(float(value), 1) for value in table.bbox],
+                        "rows": _clean_rows(table.extract()),
+                    }
+                    for table in tables
+                ],
+                "extract_ms": round((time.perf_counter() - began) * 1000, 1),
+            })
+            page.close()  # Frees the page's parsed layout before the next one
+    return pages
+
+
+class PdfPipeline:
+    """Process pool that extracts PDF page ranges in parallel, in page order"""
+
+    def __init__(self, workers: Optional[int] = None, pages_per_task: Optional[int] = None):
+        self.workers = workers or settings.PDF_WORKERS or max(1, (os.cpu_count() or 2) - 1)
+        self.pages_per_task = pages_per_task or settings.PDF_PAGES_PER_TASK
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {"documents": 0, "pages": 0, "tables": 0, "seconds": 0.0, "core_seconds": 0.0}
+
+    @property
+    def available(self) -> bool:
+        return pdfplumber is not None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and DB pools is not safe
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def pages(self, file_path: str, detect_tables: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+        """Extracted pages in order, as the ranges complete; blocking, iterate it in a thread"""
+        if detect_tables is None:
+            detect_tables = settings.ENABLE_TABLE_EXTRACTION
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+        starts = list(range(0, page_count, self.pages_per_task))
+        ends = [min(start + self.pages_per_task, page_count) for start in starts]
+
+        render_dpi = settings.OCR_DPI if ocr_engine.available else 0
+        arguments = (repeat(file_path), starts, ends, repeat(detect_tables), repeat(render_dpi))
+
+        began = time.perf_counter()
+        if page_count < settings.PDF_PARALLEL_MIN_PAGES or self.workers == 1:
+            cores = 1
+            batches = map(extract_pages, *arguments)
+        else:
+            cores = min(self.workers, len(starts))
+            batches = self._executor().map(extract_pages, *arguments)
+
+        tables = scanned = 0
+        for batch in batches:
+            if render_dpi:
+                ocr_engine.recognize_pages(batch)
+            for page in batch:
+                tables += len(page["tables"])
+                scanned += page.get("scanned", False)
+                yield page
+
+        if scanned and not render_dpi:
+            logger.warning(f"⚠️ {scanned} page(s) of {file_path} have no text layer and OCR is unavailable")
+
+        elapsed = time.perf_counter() - began
+        self.stats["documents"] += 1
+        self.stats["pages"] += page_count
+        self.stats["tables"] += tables
+        self.stats["seconds"] += elapsed
+        self.stats["core_seconds"] += elapsed * cores
+        logger.info(
+            f"📑 Extracted {page_count} pages, {tables} tables in {elapsed:.1f}s on {cores} core(s) "
+            f"({page_count / max(elapsed * cores, 1e-9):.1f} pages/sec/core)"
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "seconds": round(self.stats["seconds"], 2),
+            "core_seconds": round(self.stats["core_seconds"], 2),
+            "pages_per_sec_per_core": round(self.stats["pages"] / self.stats["core_seconds"], 2)
+            if self.stats["core_seconds"] else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global pipeline instance (the pool starts on the first large PDF)
+pdf_pipeline = PdfPipeline()
@@ -0,0 +1,139 @@
+"""
+Prompt Templates - Precompiled enterprise prompts with a cache-friendly layout
+Every prompt is ordered system instructions -> enterprise static context ->
+retrieved context -> question. The first two parts never change between
+queries of the same enterprise, so they are rendered once per enterprise
+version and providers' prompt caching can reuse the shared prefix
+"""
+import logging
+import textwrap
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.model_router import SYSTEM_PROMPT, INSUFFICIENT_CONTEXT
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(text: str) -> str:
+    return textwrap.dedent(text).strip()
+
+
+# Static instruction blocks (enhanced from ai-chatbot); no per-query fields in here
+_INSTRUCTIONS = {
+    "executive": _compile("""
+        You are a senior business analyst AI.
+
+        INSTRUCTIONS:
+        1. Provide factual, data-driven responses based ONLY on the provided context
+        2. Include specific numbers, dates, and references when available
+        3. If data spans multiple time periods, provide comparisons
+        4. Structure responses with clear sections and bullet points
+        5. Flag any limitations or missing data
+        6. Suggest follow-up questions for deeper analysis
+
+        RESPONSE FORMAT:
+        📊 EXECUTIVE SUMMARY: [Brief key findings]
+
+        📈 DETAILED ANALYSIS: [In-depth breakdown]
+
+        🔍 DATA SOURCES: [Documents referenced]
+
+        ⚠️ LIMITATIONS: [What data might be missing]
+
+        🎯 RECOMMENDED ACTIONS: [Strategic recommendations]
+    """),
+    "financial": _compile("""
+        You are a financial analyst AI specializing in corporate financial analysis.
+
+        INSTRUCTIONS:
+        1. Extract and analyze financial metrics with precision
+        2. Calculate ratios, percentages, and trends where applicable
+        3. Compare periods if historical data is available
+        4. Present data in structured format (tables/lists)
+        5. Flag any accounting inconsistencies or red flags
+        6. Provide context for the numbers (industry benchmarks if known)
+
+        RESPONSE FORMAT:
+        💰 FINANCIAL SUMMARY
+        • Key Metric 1: $X,XXX (vs previous period: +/-X%)
+        • Key Metric 2: $X,XXX (vs budget: +/-X%)
+
+        📊 DETAILED BREAKDOWN
+        [Table format where possible]
+
+        📈 TRENDS & INSIGHTS
+        [Analysis of patterns and changes]
+
+        🚨 ATTENTION ITEMS
+        [Anything requiring management attention]
+    """),
+    # Short answers for simple lookups on the fast model
+    "concise": _compile(f"""
+        Answer the question using ONLY the context below, in at most three sentences.
+        Quote exact figures and name the source document.
+        If the context does not contain the answer, reply exactly: {INSUFFICIENT_CONTEXT}
+    """),
+}
+
+# Headings of the per-query part of each template
+_HEADINGS = {
+    "executive": ("CONTEXT FROM DOCUMENTS", "EXECUTIVE QUESTION"),
+    "financial": ("FINANCIAL DATA CONTEXT", "FINANCIAL QUESTION"),
+    "concise": ("CONTEXT", "QUESTION"),
+}
+
+TEMPLATE_NAMES = tuple(_INSTRUCTIONS)
+
+# (template, enterprise id, enterprise version) -> rendered system message
+_prefix_cache = TTLCache(
+    max_entries=settings.PROMPT_PREFIX_CACHE_ENTRIES,
+    ttl_seconds=settings.PROMPT_PREFIX_CACHE_SECONDS
+)
+
+
+def _enterprise_block(enterprise: Dict[str, Any]) -> str:
+    lines = [f"ENTERPRISE: {enterprise['name']}, a {enterprise.get('industry') or 'Business'} company"]
+    if enterprise.get("company_description"):
+        lines.append(f"ABOUT THE COMPANY:\n{enterprise['company_description'].strip()}")
+    if enterprise.get("business_context"):
+        lines.append(f"BUSINESS CONTEXT:\n{enterprise['business_context'].strip()}")
+    if enterprise.get("ai_instructions"):
+        lines.append(f"COMPANY-SPECIFIC INSTRUCTIONS:\n{enterprise['ai_instructions'].strip()}")
+    return "\n\n".join(lines)
+
+
+def system_prefix(template: str, enterprise: Dict[str, Any]) -> str:
+    """
+    Instructions + enterprise static context, rendered once per enterprise version
+    `enterprise` is a snapshot from enterprise_cache
+    """
+    key = (template, enterprise["id"], enterprise["version"])
+    prefix = _prefix_cache.get(key)
+    if prefix is None:
+        prefix = f"{SYSTEM_PROMPT}\n\n{_INSTRUCTIONS[template]}\n\n{_enterprise_block(enterprise)}"
+        _prefix_cache.set(key, prefix)
+    return prefix
+
+
+def render_messages(
+    template: str,
+    enterprise: Dict[str, Any],
+    context: str,
+    question: str,
+    date_range: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Chat messages for one query; only the user message varies between queries"""
+    context_heading, question_heading = _HEADINGS[template]
+    user = f"{context_heading}:\n{context}\n\n{question_heading}:\n{question}"
+    if date_range:
+        user += f"\n\nANALYSIS PERIOD: {date_range}"
+    return [
+        {"role": "system", "content": system_prefix(template, enterprise)},
+        {"role": "user", "content": user},
+    ]
+
+
+def prefix_cache_stats() -> Dict[str, Any]:
+    return _prefix_cache.stats()
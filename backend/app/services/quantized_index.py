@@ -0,0 +1,385 @@
+"""
+Quantized Vector Index - Memory-mapped int8 IVF backend for large tenants
+Embeddings are stored as int8 codes (one scale per vector) in memory-mapped
+files, with the float32 originals kept on disk and read row by row only to
+re-rank the best candidates exactly. Once a collection is large enough an IVF coarse
+quantizer (k-means centroids + posting lists) limits each search to the
+nprobe closest lists, so search is sublinear and RAM holds only the pages
+actually touched. Chunk text and metadata live in a per-collection SQLite
+file; vector_store.QuantizedStore wraps it as a VectorStore
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 32
+_ASSIGN_BATCH = 65536
+_MAX_UNSORTED_FRACTION = 0.125  # Appended rows outside list order before the index is compacted
+_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# Chunk metadata fields searches filter on get an expression index
+INDEXED_FIELDS = ("document_id", "fiscal_period", "category")
+_RECORDS_COLUMNS = "(row INTEGER PRIMARY KEY, id TEXT NOT NULL, content TEXT, metadata TEXT, alive INTEGER NOT NULL DEFAULT 1)"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 codes with one float32 scale per vector"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _kmeans(sample: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (inner-product assignment, normalized means)"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=lists)
+        empty = counts == 0
+        # Empty lists restart on random points so every centroid keeps a share of the data
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class QuantizedIndex:
+    """
+    One collection on disk: codes.i8, scales.f32, vectors.f32, lists.i32 and
+    alive.u8 are row-aligned arrays; records.sqlite maps rows to chunk ids,
+    text and metadata. The first sorted_count rows are grouped by IVF list,
+    so probing a list reads one contiguous range; newer rows are appended
+    after them until the next compaction
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "records.sqlite"), check_same_thread=False)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS records {_RECORDS_COLUMNS}")
+        self._create_indexes()
+        self._db.commit()
+
+        meta_path = os.path.join(directory, "meta.json")
+        self.meta = {"dim": None, "count": 0, "trained_count": 0, "sorted_count": 0}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        centroids_path = os.path.join(directory, "centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self._maps: Dict[str, np.memmap] = {}
+        self._offsets: Optional[np.ndarray] = None
+        self._vectors_file = None
+
+    def _create_indexes(self) -> None:
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_id ON records (id) WHERE alive = 1")
+        for field in INDEXED_FIELDS:
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS records_{field} ON records (json_extract(metadata, '$.{field}')) WHERE alive = 1"
+            )
+
+    # --- storage ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _map(self, name: str, dtype: Any, width: int = 0) -> np.ndarray:
+        """Read-write memory map of a row-aligned array, reopened when rows were appended"""
+        count = self.meta["count"]
+        cached = self._maps.get(name)
+        if cached is not None and len(cached) == count:
+            return cached
+        if count == 0:
+            return np.empty((0, width) if width else (0,), dtype=dtype)
+        shape = (count, width) if width else (count,)
+        self._maps[name] = np.memmap(self._path(name), dtype=dtype, mode="r+", shape=shape)
+        return self._maps[name]
+
+    def _read_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """float32 rows via pread: a few scattered rows would map far more of the file through the memmap"""
+        if self._vectors_file is None:
+            self._vectors_file = open(self._path("vectors.f32"), "rb")
+        row_bytes = self.meta["dim"] * 4
+        descriptor = self._vectors_file.fileno()
+        return np.frombuffer(
+            b"".join(os.pread(descriptor, row_bytes, int(row) * row_bytes) for row in rows), dtype=np.float32
+        ).reshape(len(rows), self.meta["dim"])
+
+    def _append(self, name: str, values: np.ndarray) -> None:
+        with open(self._path(name), "ab") as f:
+            f.write(np.ascontiguousarray(values).tobytes())
+
+    def _save_meta(self) -> None:
+        temporary = self._path("meta.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(temporary, self._path("meta.json"))
+
+    # --- writes ---
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, contents: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Append vectors; ids that already exist are replaced (their old rows are tombstoned)"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            if self.meta["dim"] is None:
+                self.meta["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != self.meta["dim"]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != index dimension {self.meta['dim']}")
+
+            self._delete_locked(ids)
+            first_row = self.meta["count"]
+            codes, scales = _quantize(vectors)
+            lists = (np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+                     if self.centroids is not None else np.full(len(vectors), -1, dtype=np.int32))
+            self._append("codes.i8", codes)
+            self._append("scales.f32", scales)
+            self._append("vectors.f32", vectors)
+            self._append("lists.i32", lists)
+            self._append("alive.u8", np.ones(len(vectors), dtype=np.uint8))
+            self._db.executemany(
+                "INSERT INTO records (row, id, content, metadata) VALUES (?, ?, ?, ?)",
+                [(first_row + i, ids[i], contents[i], json.dumps(metadatas[i] or {})) for i in range(len(ids))]
+            )
+            self._db.commit()
+            self.meta["count"] += len(vectors)
+            self._save_meta()
+
+            # (Re)train the coarse quantizer when the collection outgrew the last training 4x
+            count = self.meta["count"]
+            if count >= settings.QUANTIZED_TRAIN_MIN_VECTORS and count >= 4 * self.meta["trained_count"]:
+                self._train_locked()
+            elif self.centroids is not None and count - self.meta["sorted_count"] > count * _MAX_UNSORTED_FRACTION:
+                self._compact_locked()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self._lock:
+            return self._delete_locked(ids)
+
+    def delete_where(self, where: Dict[str, Any]) -> int:
+        with self._lock:
+            return self._delete_rows_locked(self.rows_where(where).tolist())
+
+    def _delete_locked(self, ids: Sequence[str]) -> int:
+        return self._delete_rows_locked(self._rows_for(ids))
+
+    def _delete_rows_locked(self, rows: List[int]) -> int:
+        if not rows:
+            return 0
+        alive = self._map("alive.u8", np.uint8)
+        alive[rows] = 0
+        alive.flush()
+        self._db.executemany("UPDATE records SET alive = 0 WHERE row = ?", [(row,) for row in rows])
+        self._db.commit()
+        return len(rows)
+
+    def _rows_for(self, ids: Sequence[str]) -> List[int]:
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(row for (row,) in self._db.execute(
+                f"SELECT row FROM records WHERE alive = 1 AND id IN ({placeholders})", batch
+            ))
+        return rows
+
+    def rows_where(self, where: Dict[str, Any]) -> np.ndarray:
+        """Live rows whose metadata matches every field of `where` (a list value matches any of its items)"""
+        clauses, params = ["alive = 1"], []
+        for key, expected in where.items():
+            if not _FIELD.match(key):
+                raise ValueError(f"Invalid metadata field in filter: {key!r}")
+            # The path is inlined (not a parameter) so the expression indexes apply
+            if isinstance(expected, (list, tuple, set)):
+                clauses.append(f"json_extract(metadata, '$.{key}') IN ({','.join('?' * len(expected))})")
+                params.extend(expected)
+            else:
+                clauses.append(f"json_extract(metadata, '$.{key}') IS ?")
+                params.append(expected)
+        query = f"SELECT row FROM records WHERE {' AND '.join(clauses)} ORDER BY row"
+        return np.fromiter((row for (row,) in self._db.execute(query, params)), dtype=np.int64)
+
+    def _train_locked(self) -> None:
+        count = self.meta["count"]
+        lists = int(min(max(16, 4 * np.sqrt(count)), settings.QUANTIZED_MAX_LISTS))
+        vectors = self._map("vectors.f32", np.float32, self.meta["dim"])
+        rng = np.random.default_rng(count)
+        sample_rows = np.sort(rng.choice(count, min(count, lists * _KMEANS_SAMPLE_PER_LIST), replace=False))
+        self.centroids = _kmeans(np.asarray(vectors[sample_rows]), lists)
+        assignment = self._map("lists.i32", np.int32)
+        for start in range(0, count, _ASSIGN_BATCH):
+            assignment[start:start + _ASSIGN_BATCH] = np.argmax(
+                np.asarray(vectors[start:start + _ASSIGN_BATCH]) @ self.centroids.T, axis=1
+            )
+        assignment.flush()
+        np.save(self._path("centroids.npy"), self.centroids)
+        self.meta["trained_count"] = count
+        self._compact_locked()
+        logger.info(f"🧭 Trained IVF index {self.directory}: {count} vectors, {lists} lists")
+
+    def _compact_locked(self) -> None:
+        """Rewrite the live rows grouped by list (tombstoned rows are dropped) and renumber the records"""
+        dim = self.meta["dim"]
+        lists = np.asarray(self._map("lists.i32", np.int32))
+        order = np.flatnonzero(np.asarray(self._map("alive.u8", np.uint8)))
+        order = order[np.argsort(lists[order], kind="stable")]
+        for name, dtype, width in (("codes.i8", np.int8, dim), ("scales.f32", np.float32, 0),
+                                   ("vectors.f32", np.float32, dim), ("lists.i32", np.int32, 0)):
+            source = self._map(name, dtype, width)
+            with open(self._path(f"{name}.tmp"), "wb") as f:
+                for start in range(0, len(order), _ASSIGN_BATCH):
+                    f.write(np.ascontiguousarray(source[order[start:start + _ASSIGN_BATCH]]).tobytes())
+        np.ones(len(order), dtype=np.uint8).tofile(self._path("alive.u8.tmp"))
+
+        self._db.execute("CREATE TEMP TABLE moved (old INTEGER PRIMARY KEY, new INTEGER)")
+        self._db.executemany("INSERT INTO moved VALUES (?, ?)", zip(order.tolist(), range(len(order))))
+        self._db.execute("DROP TABLE IF EXISTS records_compacted")
+        self._db.execute(f"CREATE TABLE records_compacted {_RECORDS_COLUMNS}")
+        self._db.execute(
+            "INSERT INTO records_compacted (row, id, content, metadata) "
+            "SELECT moved.new, id, content, metadata FROM records JOIN moved ON records.row = moved.old"
+        )
+        self._db.execute("DROP TABLE records")
+        self._db.execute("DROP TABLE moved")
+        self._db.execute("ALTER TABLE records_compacted RENAME TO records")
+        self._create_indexes()
+
+        self._maps.clear()
+        if self._vectors_file is not None:
+            self._vectors_file.close()
+            self._vectors_file = None
+        for name in ("codes.i8", "scales.f32", "vectors.f32", "lists.i32", "alive.u8"):
+            os.replace(self._path(f"{name}.tmp"), self._path(name))
+        self._db.commit()
+        self.meta["count"] = self.meta["sorted_count"] = len(order)
+        self._save_meta()
+        self._offsets = None
+
+    # --- reads ---
+
+    def _list_offsets(self) -> np.ndarray:
+        """Where each list starts in the sorted rows (list i is rows offsets[i]:offsets[i + 1])"""
+        if self._offsets is None:
+            sorted_lists = np.asarray(self._map("lists.i32", np.int32)[:self.meta["sorted_count"]])
+            self._offsets = np.searchsorted(sorted_lists, np.arange(len(self.centroids) + 1))
+        return self._offsets
+
+    def _candidates(self, probes: np.ndarray) -> np.ndarray:
+        """Rows of the given lists, sorted"""
+        offsets = self._list_offsets()
+        rows = [np.arange(offsets[probe], offsets[probe + 1]) for probe in probes]
+        # Rows appended since the last compaction are matched by their list id
+        sorted_count = self.meta["sorted_count"]
+        unsorted = np.asarray(self._map("lists.i32", np.int32)[sorted_count:])
+        rows.append(sorted_count + np.flatnonzero(np.isin(unsorted, probes)))
+        return np.sort(np.concatenate(rows))
+
+    def _filtered_candidates(self, query: np.ndarray, nprobe: int, allowed: np.ndarray, wanted: int) -> np.ndarray:
+        """
+        Allowed rows of the closest lists; nprobe is scaled by the inverse of the filter's selectivity,
+        then doubled until `wanted` allowed rows are found or every list was probed
+        """
+        lists = len(self.centroids)
+        order = np.argsort(-(self.centroids @ query))
+        probed = min(lists, int(np.ceil(nprobe * self.meta["count"] / max(len(allowed), 1))))
+        rows = self._candidates(order[:probed])
+        rows = rows[np.isin(rows, allowed, assume_unique=True)]
+        while len(rows) < wanted and probed < lists:
+            more = self._candidates(order[probed:probed * 2])
+            probed = min(lists, probed * 2)
+            rows = np.union1d(rows, more[np.isin(more, allowed, assume_unique=True)])
+        return rows
+
+    def search(self, query_vector: Sequence[float], k: int, nprobe: Optional[int] = None,
+               rerank_factor: Optional[int] = None, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the k best live rows, best first; `allowed` restricts the rows (sorted)"""
+        with self._lock:
+            if self.meta["count"] == 0:
+                return []
+            query = _normalize(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+            nprobe = nprobe or settings.QUANTIZED_NPROBE
+            wanted = k * (rerank_factor or settings.QUANTIZED_RERANK_FACTOR)
+            if self.centroids is None:
+                rows = allowed if allowed is not None else np.arange(self.meta["count"])
+            elif allowed is not None and len(allowed) <= self.meta["count"] * nprobe / len(self.centroids):
+                # A selective filter leaves fewer rows than the probed lists would: score them all
+                rows = allowed
+            elif allowed is not None:
+                rows = self._filtered_candidates(query, nprobe, allowed, wanted)
+            else:
+                rows = self._candidates(np.argsort(-(self.centroids @ query))[:nprobe])
+            rows = rows[self._map("alive.u8", np.uint8)[rows].astype(bool)]
+            if len(rows) == 0:
+                return []
+
+            # Stage 1: approximate scores from int8 codes
+            codes = self._map("codes.i8", np.int8, self.meta["dim"])
+            scales = self._map("scales.f32", np.float32)
+            approximate = (np.asarray(codes[rows], dtype=np.float32) @ query) * scales[rows]
+            shortlist_size = min(len(rows), wanted)
+            shortlist = np.sort(rows[np.argpartition(-approximate, shortlist_size - 1)[:shortlist_size]])
+
+            # Stage 2: exact float32 scores for the shortlist only
+            exact = self._read_vectors(shortlist) @ query
+            best = np.argsort(-exact)[:k]
+            return [(int(shortlist[i]), float(exact[i])) for i in best]
+
+    def query(self, query_vector: Sequence[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Records ({"id", "content", "metadata", "score"}) of the k best rows matching `where`"""
+        with self._lock:
+            allowed = self.rows_where(where) if where else None
+            if allowed is not None and len(allowed) == 0:
+                return []
+            hits = self.search(query_vector, k, allowed=allowed)
+            records = self.records([row for row, _ in hits]) if hits else {}
+            return [{**records[row], "score": score} for row, score in hits if row in records]
+
+    def records(self, rows: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        placeholders = ",".join("?" * len(rows))
+        return {
+            row: {"id": record_id, "content": content, "metadata": json.loads(metadata)}
+            for row, record_id, content, metadata in self._db.execute(
+                f"SELECT row, id, content, metadata FROM records WHERE row IN ({placeholders})", list(rows)
+            )
+        }
+
+    def get(self, ids: Sequence[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._rows_for(ids)
+            return list(self.records(rows).values()) if rows else []
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            if where:
+                return len(self.rows_where(where))
+            return self._db.execute("SELECT COUNT(*) FROM records WHERE alive = 1").fetchone()[0]
+
+
+_indexes: Dict[str, QuantizedIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def open_index(persist_directory: str, collection_name: str) -> QuantizedIndex:
+    """Process-wide index per collection, so the memory maps are shared by all callers"""
+    directory = os.path.join(persist_directory, "quantized", collection_name)
+    with _indexes_lock:
+        if directory not in _indexes:
+            _indexes[directory] = QuantizedIndex(directory)
+        return _indexes[directory]
@@ -0,0 +1,77 @@
+"""
+Query Coalescer - Single-flight deduplication of identical in-flight queries
+Concurrent requests for the same (enterprise, normalized query, department,
+corpus version) share one retrieval + LLM computation
+"""
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Per-enterprise counter bumped whenever the searchable corpus changes
+_corpus_versions: Dict[int, int] = {}
+
+
+def corpus_version(enterprise_id: int) -> int:
+    """Current corpus version of an enterprise (process local)"""
+    return _corpus_versions.get(enterprise_id, 0)
+
+
+def bump_corpus_version(enterprise_id: int) -> int:
+    """Mark the enterprise corpus as changed so new queries stop joining older computations"""
+    _corpus_versions[enterprise_id] = corpus_version(enterprise_id) + 1
+    return _corpus_versions[enterprise_id]
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer"""
+    return _WHITESPACE.sub(" ", query.lower()).strip().rstrip("?!. ")
+
+
+def coalescing_key(query: str, enterprise_id: int, department_id: Optional[int],
+                   conversation_id: Optional[int] = None) -> Tuple:
+    """Follow-ups only coalesce within the same conversation, since its context shapes the answer"""
+    return (enterprise_id, normalize_query(query), department_id, conversation_id, corpus_version(enterprise_id))
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time
+    The computation is a separate task shielded from its callers, so a
+    disconnecting leader does not cancel the result its followers wait on
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another request computed it"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["followers"] += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(compute())
+        self._inflight[key] = task
+        task.add_done_callback(lambda finished: self._finish(key, finished))
+        self.stats["leaders"] += 1
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as retrieved even when every caller has gone away
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ Coalesced query failed: {task.exception()}")
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+# Global single-flight group for enterprise queries
+query_coalescer = SingleFlight()
@@ -0,0 +1,180 @@
+"""
+Query Scheduler - Admission control in front of LLM-bound query processing
+Orders waiting queries by priority, then by estimated cost, caps concurrent
+HIGH/CRITICAL analyses and sheds low-priority load first under saturation
+"""
+import asyncio
+import bisect
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.enterprise_query import QueryComplexity
+
+logger = logging.getLogger(__name__)
+
+# Lower rank is served first
+PRIORITY_RANKS = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+DEFAULT_PRIORITY = "normal"
+
+HEAVY_COMPLEXITIES = (QueryComplexity.HIGH, QueryComplexity.CRITICAL)
+
+
+class QueryRejected(Exception):
+    """Raised when a query is shed or waits too long for a slot"""
+
+    def __init__(self, reason: str, retry_after: int = 5):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("key", "priority", "heavy", "future")
+
+    def __init__(self, key: tuple, priority: str, heavy: bool, future: asyncio.Future):
+        self.key = key
+        self.priority = priority
+        self.heavy = heavy
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class QueryScheduler:
+    """
+    Slot-based scheduler for the LLM backend
+
+    Waiters are kept sorted by (priority rank, estimated ms, arrival). A
+    heavy query blocked by the heavy cap does not hold up lighter ones.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_heavy: Optional[int] = None,
+        queue_limit: Optional[int] = None,
+        shed_low_priority_at: Optional[int] = None,
+        queue_timeout_seconds: Optional[float] = None
+    ):
+        self.max_concurrent = max_concurrent or settings.LLM_MAX_CONCURRENT
+        self.max_heavy = max_heavy or settings.LLM_MAX_CONCURRENT_HEAVY
+        self.queue_limit = queue_limit or settings.LLM_QUEUE_LIMIT
+        self.shed_low_priority_at = shed_low_priority_at or settings.LLM_SHED_LOW_PRIORITY_AT
+        self.queue_timeout = queue_timeout_seconds or settings.LLM_QUEUE_TIMEOUT_SECONDS
+
+        self.running = 0
+        self.heavy_running = 0
+        self._queue: List[_Waiter] = []
+        self._arrivals = itertools.count()
+        self.counters = {"admitted": 0, "enqueued": 0, "shed": 0, "timed_out": 0}
+
+    def _can_run(self, heavy: bool) -> bool:
+        if self.running >= self.max_concurrent:
+            return False
+        return not heavy or self.heavy_running < self.max_heavy
+
+    def _start(self, heavy: bool) -> None:
+        self.running += 1
+        if heavy:
+            self.heavy_running += 1
+        self.counters["admitted"] += 1
+
+    def _release(self, heavy: bool) -> None:
+        self.running -= 1
+        if heavy:
+            self.heavy_running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the best waiters that fit them"""
+        index = 0
+        while index < len(self._queue) and self.running < self.max_concurrent:
+            waiter = self._queue[index]
+            if waiter.future.done():
+                self._queue.pop(index)
+                continue
+            if not self._can_run(waiter.heavy):
+                index += 1  # Heavy cap reached; let lighter work through
+                continue
+            self._queue.pop(index)
+            self._start(waiter.heavy)
+            waiter.future.set_result(True)
+
+    def _shed(self, waiter: _Waiter, reason: str) -> None:
+        self.counters["shed"] += 1
+        if not waiter.future.done():
+            waiter.future.set_exception(QueryRejected(reason))
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        """Queue a waiter, shedding the least important work when the queue is full"""
+        if waiter.priority == "low" and len(self._queue) >= self.shed_low_priority_at:
+            self.counters["shed"] += 1
+            raise QueryRejected("LLM backend saturated; low-priority queries are paused")
+
+        if len(self._queue) >= self.queue_limit:
+            worst = self._queue[-1]
+            if not waiter < worst:
+                self.counters["shed"] += 1
+                raise QueryRejected("LLM backend saturated")
+            self._queue.pop()
+            self._shed(worst, "Displaced by higher-priority work")
+
+        bisect.insort(self._queue, waiter)
+        self.counters["enqueued"] += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str], complexity: Any, estimated_ms: int = 0):
+        """Hold one LLM slot for the duration of the block"""
+        priority = priority if priority in PRIORITY_RANKS else DEFAULT_PRIORITY
+        heavy = complexity in HEAVY_COMPLEXITIES
+
+        if not self._queue and self._can_run(heavy):
+            self._start(heavy)
+        else:
+            waiter = _Waiter(
+                key=(PRIORITY_RANKS[priority], estimated_ms, next(self._arrivals)),
+                priority=priority,
+                heavy=heavy,
+                future=asyncio.get_running_loop().create_future()
+            )
+            self._enqueue(waiter)
+            self._dispatch()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.counters["timed_out"] += 1
+                self._abandon(waiter, heavy)
+                raise QueryRejected("Timed out waiting for an LLM slot")
+            except asyncio.CancelledError:
+                self._abandon(waiter, heavy)
+                raise
+
+        try:
+            yield
+        finally:
+            self._release(heavy)
+
+    def _abandon(self, waiter: _Waiter, heavy: bool) -> None:
+        """Withdraw a waiter; give its slot back if one was granted meanwhile"""
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+        if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+            self._release(heavy)
+        elif not waiter.future.done():
+            waiter.future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "heavy_running": self.heavy_running,
+            "queued": len(self._queue),
+            **self.counters
+        }
+
+
+# Global scheduler instance
+query_scheduler = QueryScheduler()
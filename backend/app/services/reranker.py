@@ -0,0 +1,290 @@
+"""
+Reranker - Second retrieval stage between the vector search and the prompt
+The vector store cheaply returns RERANK_CANDIDATES chunks by embedding score.
+This stage rescores them against the question, and only the best
+RERANK_TOP_N reach the prompt. With RERANK_MODEL set (and sentence-transformers
+installed) a local CPU cross-encoder scores the pairs in batches; otherwise a
+lexical feature scorer does (BM25 over the candidates, query term coverage,
+phrase and number matches, blended with the embedding score). Scores are
+cached per (query, chunk) pair. The model only scores as many of the lexical
+top candidates as fit the latency budget, and a backed-up LLM queue skips
+reranking altogether
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.query_scheduler import query_scheduler
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9$%&]+")
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "did", "do", "does", "for", "from", "how", "in",
+    "is", "it", "its", "me", "of", "on", "or", "our", "show", "that", "the", "their", "this", "to", "was",
+    "we", "were", "what", "when", "which", "who", "why", "with", "please", "tell", "give",
+}
+
+# Blend of the lexical features; "numbers" only counts when the question has any
+FEATURE_WEIGHTS = {"bm25": 0.3, "coverage": 0.2, "phrase": 0.1, "numbers": 0.1, "vector": 0.3}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Weight of the newest timing in the per-pair cost estimates
+COST_SMOOTHING = 0.2
+# Applied to the model's estimate whenever no pair fits the budget, so a slow spell is re-probed
+MODEL_COST_DECAY = 0.8
+
+
+def _tokens(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS and len(word) > 1]
+
+
+def _numbers(text: str) -> set:
+    return {number.replace(",", "").rstrip(".") for number in _NUMBER.findall(text)}
+
+
+def _bigrams(tokens: List[str]) -> set:
+    return set(zip(tokens, tokens[1:]))
+
+
+def _content_key(content: str) -> str:
+    # By content rather than chunk id, so a re-ingested document is never scored from stale text
+    return hashlib.sha1(content.encode("utf-8", "replace")).hexdigest()
+
+
+class Reranker:
+    """Rescores over-fetched candidates and keeps the best few"""
+
+    def __init__(self):
+        self._scores = TTLCache(settings.RERANK_CACHE_ENTRIES, settings.RERANK_CACHE_SECONDS)
+        self._model = None
+        self._model_lock = threading.Lock()
+        # Smoothed milliseconds per uncached pair, per scorer; None until first measured
+        self._ms_per_pair: Dict[str, Optional[float]] = {"model": None, "lexical": None}
+        # The first predict pays for warm-up and is left out of the estimate
+        self._model_warm = False
+        self.stats = {
+            "reranked": 0, "skipped_under_load": 0, "skipped_over_budget": 0, "model_over_budget": 0,
+            "candidates_in": 0, "chunks_out": 0, "pairs_scored": 0,
+        }
+
+    def _load_model(self):
+        """The cross-encoder, loaded once; None when not configured or not loadable"""
+        if not settings.RERANK_MODEL or CrossEncoder is None:
+            return None
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    self._model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+                    logger.info(f"🎯 Loaded reranking model {settings.RERANK_MODEL}")
+                except Exception as e:
+                    logger.warning(f"⚠️ Reranking model {settings.RERANK_MODEL} unavailable, using lexical scores: {e}")
+                    self._model = False
+        return self._model or None
+
+    def _estimate_ms(self, scorer: str, pairs: int) -> float:
+        per_pair = self._ms_per_pair[scorer]
+        return 0.0 if per_pair is None else per_pair * pairs
+
+    def _record_cost(self, scorer: str, pairs: int, elapsed_ms: float) -> None:
+        if not pairs:
+            return
+        per_pair = elapsed_ms / pairs
+        previous = self._ms_per_pair[scorer]
+        self._ms_per_pair[scorer] = per_pair if previous is None else (
+            COST_SMOOTHING * per_pair + (1 - COST_SMOOTHING) * previous
+        )
+
+    def _model_scores(self, query: str, candidates: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Optional[float]]:
+        """
+        Cross-encoder relevance in [0, 1]; cached pairs are not sent to the model
+        At most `limit` uncached pairs are scored, the first ones in candidate order; the rest stay None
+        """
+        normalized = " ".join(query.lower().split())
+        keys = [("model", settings.RERANK_MODEL, normalized, _content_key(doc["content"])) for doc in candidates]
+        scores = [self._scores.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None][:limit]
+        if missing:
+            began = time.perf_counter()
+            logits = self._load_model().predict(
+                [(query, candidates[i]["content"]) for i in missing],
+                batch_size=settings.RERANK_BATCH_SIZE,
+                show_progress_bar=False
+            )
+            if self._model_warm:
+                self._record_cost("model", len(missing), (time.perf_counter() - began) * 1000)
+            self._model_warm = True
+            for i, logit in zip(missing, logits):
+                scores[i] = 1 / (1 + math.exp(-float(logit)))
+                self._scores.set(keys[i], scores[i])
+            self.stats["pairs_scored"] += len(missing)
+        return scores
+
+    def _model_budget(self, spent_ms: float) -> Optional[int]:
+        """Uncached pairs the model may score in what is left of the budget; None = all (not measured yet)"""
+        per_pair = self._ms_per_pair["model"]
+        if per_pair is None:
+            return None
+        pairs = int(max(0.0, settings.RERANK_BUDGET_MS - spent_ms) / per_pair) if per_pair > 0 else None
+        if pairs == 0:
+            self._ms_per_pair["model"] = per_pair * MODEL_COST_DECAY
+        return pairs
+
+    def _pair_features(self, query_terms: List[str], query_bigrams: set, query_numbers: set, content: str) -> Dict[str, Any]:
+        """Features of one (query, chunk) pair that do not depend on the other candidates"""
+        tokens = _tokens(content)
+        counts: Dict[str, int] = {}
+        wanted = set(query_terms)
+        for token in tokens:
+            if token in wanted:
+                counts[token] = counts.get(token, 0) + 1
+        return {
+            "tf": counts,
+            "length": len(tokens),
+            "phrase": len(query_bigrams & _bigrams(tokens)) / len(query_bigrams) if query_bigrams else 0.0,
+            "numbers": len(query_numbers & _numbers(content)) / len(query_numbers) if query_numbers else 0.0,
+        }
+
+    def _lexical_scores(self, query: str, candidates: List[Dict[str, Any]]) -> Optional[List[float]]:
+        """Blended lexical + embedding score in [0, 1]; None when the question has no content words"""
+        query_tokens = _tokens(query)
+        if not query_tokens:
+            return None
+        query_terms = list(dict.fromkeys(query_tokens))
+        query_bigrams = _bigrams(query_tokens)
+        query_numbers = _numbers(query)
+        normalized = " ".join(query_tokens)
+
+        began, computed = time.perf_counter(), 0
+        features = []
+        for doc in candidates:
+            key = ("lexical", normalized, tuple(sorted(query_numbers)), _content_key(doc["content"]))
+            pair = self._scores.get(key)
+            if pair is None:
+                pair = self._pair_features(query_terms, query_bigrams, query_numbers, doc["content"])
+                self._scores.set(key, pair)
+                computed += 1
+            features.append(pair)
+        self._record_cost("lexical", computed, (time.perf_counter() - began) * 1000)
+        self.stats["pairs_scored"] += computed
+
+        # Collection statistics come from the candidate set itself
+        total = len(candidates)
+        idf = {}
+        for term in query_terms:
+            df = sum(1 for pair in features if term in pair["tf"])
+            idf[term] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        average_length = sum(pair["length"] for pair in features) / total or 1.0
+        bm25 = []
+        for pair in features:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * pair["length"] / average_length)
+            bm25.append(sum(idf[term] * tf * (BM25_K1 + 1) / (tf + norm) for term, tf in pair["tf"].items()))
+        best_bm25 = max(bm25) or 1.0
+        idf_total = sum(idf.values()) or 1.0
+        vectors = [doc.get("score", 0.0) for doc in candidates]
+        low, high = min(vectors), max(vectors)
+
+        weights = dict(FEATURE_WEIGHTS)
+        if not query_numbers:
+            weights.pop("numbers")
+        weight_total = sum(weights.values())
+        scores = []
+        for pair, lexical, vector in zip(features, bm25, vectors):
+            values = {
+                "bm25": lexical / best_bm25,
+                "coverage": sum(idf[term] for term in pair["tf"]) / idf_total,
+                "phrase": pair["phrase"],
+                "numbers": pair["numbers"],
+                "vector": (vector - low) / (high - low) if high > low else 1.0,
+            }
+            scores.append(sum(weight * values[name] for name, weight in weights.items()) / weight_total)
+        return scores
+
+    def _score(self, query: str, candidates: List[Dict[str, Any]]) -> Optional[List[float]]:
+        """
+        Lexical scores, refined by the model for as many of the lexical top candidates as fit the budget
+        Candidates the model did not reach rank below those it did, in lexical order
+        """
+        began = time.perf_counter()
+        lexical = self._lexical_scores(query, candidates)
+        if self._load_model() is None:
+            return lexical
+
+        limit = self._model_budget((time.perf_counter() - began) * 1000)
+        order = list(range(len(candidates)))
+        if lexical is not None:
+            order.sort(key=lambda i: (-lexical[i], i))
+        model = self._model_scores(query, [candidates[i] for i in order], limit)
+        if any(score is None for score in model):
+            self.stats["model_over_budget"] += 1
+
+        scored = [score for score in model if score is not None]
+        if not scored:
+            return lexical
+        floor = min(scored)
+        scores = [0.0] * len(candidates)
+        for position, i in enumerate(order):
+            score = model[position]
+            scores[i] = score if score is not None else (lexical[i] if lexical is not None else 0.0) * floor
+        return scores
+
+    async def rerank(self, query: str, candidates: List[Dict[str, Any]], top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        The `top_n` best candidates, best first, each with a "rerank_score"
+        Candidates come in vector-score order; that order is kept when reranking is skipped
+        """
+        top_n = top_n or settings.RERANK_TOP_N
+        if len(candidates) <= 1:
+            return candidates[:top_n]
+        self.stats["candidates_in"] += len(candidates)
+
+        if query_scheduler.stats()["queued"] >= settings.RERANK_SKIP_QUEUE_DEPTH:
+            self.stats["skipped_under_load"] += 1
+            kept = candidates[:top_n]
+        elif self._estimate_ms("lexical", len(candidates)) > settings.RERANK_BUDGET_MS:
+            self.stats["skipped_over_budget"] += 1
+            kept = candidates[:top_n]
+        else:
+            try:
+                scores = await asyncio.to_thread(self._score, query, candidates)
+            except Exception as e:
+                # Never fail the query over it; the vector order is still a ranking
+                logger.warning(f"⚠️ Reranking failed, keeping the vector order: {e}")
+                scores = None
+            if scores is None:
+                kept = candidates[:top_n]
+            else:
+                self.stats["reranked"] += 1
+                # Ties keep the vector order
+                ranked = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+                kept = [{**candidates[i], "rerank_score": round(scores[i], 4)} for i in ranked[:top_n]]
+        self.stats["chunks_out"] += len(kept)
+        return kept
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": settings.ENABLE_RERANKING,
+            "scorer": "model" if self._model else "lexical",
+            "ms_per_pair": {
+                scorer: round(cost, 3) if cost is not None else None for scorer, cost in self._ms_per_pair.items()
+            },
+            "score_cache": self._scores.stats(),
+        }
+
+
+# Global reranker instance
+reranker = Reranker()
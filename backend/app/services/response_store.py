@@ -0,0 +1,84 @@
+"""
+Response Store - Compressed cold storage for query response bodies
+Keeps ai_response, structured_data and conversation_context out of the
+enterprise_queries heap; bodies are loaded only when a query is opened
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.enterprise_query import QueryResponseBody
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_LEVEL = 6
+ZLIB_LEVEL = 6
+
+EMPTY_BODY = {"ai_response": None, "structured_data": None, "conversation_context": None}
+
+
+def compress_body(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize and compress a body; zstd when installed, zlib otherwise"""
+    raw = json.dumps(body, default=str, separators=(",", ":")).encode("utf-8")
+    if zstandard is not None:
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        codec = "zstd"
+    else:
+        payload = zlib.compress(raw, ZLIB_LEVEL)
+        codec = "zlib"
+    return {"codec": codec, "payload": payload, "raw_bytes": len(raw)}
+
+
+def decompress_body(codec: str, payload: bytes) -> Dict[str, Any]:
+    """Inverse of compress_body"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed query bodies")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec == "zlib":
+        raw = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown query body codec: {codec}")
+    return json.loads(raw)
+
+
+def build_body_row(
+    query_id: int,
+    created_at: datetime,
+    retention_days: int,
+    ai_response: Optional[str],
+    structured_data: Optional[Dict[str, Any]] = None,
+    conversation_context: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Row values for enterprise_query_bodies; created_at and retention_days as on the query row"""
+    row = compress_body({
+        "ai_response": ai_response,
+        "structured_data": structured_data,
+        "conversation_context": conversation_context
+    })
+    row.update({"query_id": query_id, "created_at": created_at, "retention_days": retention_days})
+    return row
+
+
+async def load_body(db: AsyncSession, query_id: int, created_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Fetch and decompress the body of one query
+    Passing created_at lets PostgreSQL prune to a single partition
+    """
+    query = select(QueryResponseBody.codec, QueryResponseBody.payload).where(
+        QueryResponseBody.query_id == query_id
+    )
+    if created_at is not None:
+        query = query.where(QueryResponseBody.created_at == created_at)
+
+    row = (await db.execute(query)).first()
+    if row is None:
+        return dict(EMPTY_BODY)
+    return {**EMPTY_BODY, **decompress_body(row.codec, row.payload)}
@@ -0,0 +1,252 @@
+"""
+Retention Service - Partition maintenance for the query log
+The query log is LIST-partitioned by retention tier and each tier is
+RANGE-partitioned by month, so Enterprise.data_retention_days is enforced by
+detaching and dropping whole monthly partitions of the enterprise's tier,
+never by deleting rows. An enterprise whose retention moves to another tier
+has its existing rows moved once (recorded in query_log_retention)
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Tables LIST-partitioned by retention tier, then RANGE-partitioned by month on created_at
+PARTITIONED_TABLES = ("enterprise_queries", "enterprise_query_bodies")
+
+# Retention applied to enterprises without an explicit data_retention_days
+DEFAULT_RETENTION_DAYS = 2555
+
+# Retention periods the query log is partitioned by; an enterprise's retention is
+# rounded down to a tier, so rows are never kept longer than the enterprise allows
+RETENTION_TIERS = (30, 90, 180, 365, 730, 1095, 1825, 2555, 3650)
+
+# Rows written under the previous tier by workers with a stale enterprise snapshot are
+# swept into the new tier for this long after a change
+RETIER_SWEEP_DAYS = 7
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(value: date) -> date:
+    """First day of the month containing `value`"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """Shift a first-of-month date by a number of months"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retention_tier(retention_days: Optional[int]) -> int:
+    """Tier an enterprise's rows are stored under: the longest tier not above its retention"""
+    days = retention_days or DEFAULT_RETENTION_DAYS
+    eligible = [tier for tier in RETENTION_TIERS if tier <= days]
+    return eligible[-1] if eligible else RETENTION_TIERS[0]
+
+
+def tier_name(table: str, tier: int) -> str:
+    """Tier partition naming convention: <table>_r<days>"""
+    return f"{table}_r{tier}"
+
+
+def partition_name(table: str, tier: int, month: date) -> str:
+    """Monthly partition naming convention: <table>_r<days>_pYYYYMM"""
+    return f"{tier_name(table, tier)}_p{month.year:04d}{month.month:02d}"
+
+
+def tier_ddl(table: str, tier: int) -> str:
+    """DDL creating the retention tier partition of `table`, itself partitioned by month"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {tier_name(table, tier)} "
+        f"PARTITION OF {table} FOR VALUES IN ({int(tier)}) PARTITION BY RANGE (created_at)"
+    )
+
+
+def partition_ddl(table: str, tier: int, month: date) -> str:
+    """DDL creating the monthly partition of a tier of `table` that starts at `month`"""
+    start = month_start(month)
+    end = add_months(start, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, tier, start)} "
+        f"PARTITION OF {tier_name(table, tier)} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+async def ensure_partitions(conn: AsyncConnection, months_ahead: Optional[int] = None) -> None:
+    """
+    Create every tier and, in each, the current month's partition and the next few months
+    There is deliberately no DEFAULT partition: it would block DETACH CONCURRENTLY
+    """
+    months_ahead = settings.QUERY_LOG_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(datetime.utcnow().date())
+
+    for table in PARTITIONED_TABLES:
+        for tier in RETENTION_TIERS:
+            await conn.execute(text(tier_ddl(table, tier)))
+            for offset in range(months_ahead + 1):
+                await conn.execute(text(partition_ddl(table, tier, add_months(current, offset))))
+
+
+async def _list_partitions(conn: AsyncConnection, parent: str) -> List[Tuple[str, date]]:
+    """Monthly partitions of `parent` (a tier partition) as (name, first day of month), oldest first"""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ),
+        {"parent": parent}
+    )
+    partitions = []
+    for (name,) in result.fetchall():
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+async def _move_enterprise(
+    conn: AsyncConnection,
+    enterprise_id: int,
+    tier: int,
+    since: Optional[datetime] = None
+) -> int:
+    """Move an enterprise's rows written under another tier into `tier`; returns query rows moved"""
+    params = {"enterprise_id": enterprise_id, "tier": tier, "since": since or datetime(1970, 1, 1, tzinfo=timezone.utc)}
+    oldest = (await conn.execute(
+        text(
+            "SELECT min(created_at) FROM enterprise_queries "
+            "WHERE enterprise_id = :enterprise_id AND created_at >= :since AND retention_days <> :tier"
+        ),
+        params
+    )).scalar()
+    if oldest is None:
+        return 0
+
+    # The target tier needs partitions for every month being moved in
+    month = month_start(oldest.date())
+    current = month_start(datetime.utcnow().date())
+    while month <= current:
+        for table in PARTITIONED_TABLES:
+            await conn.execute(text(partition_ddl(table, tier, month)))
+        month = add_months(month, 1)
+
+    # Bodies first: they are matched through query rows still in the old tier
+    await conn.execute(
+        text(
+            "UPDATE enterprise_query_bodies b SET retention_days = :tier FROM enterprise_queries q "
+            "WHERE b.query_id = q.id AND b.created_at = q.created_at AND b.retention_days = q.retention_days "
+            "AND q.enterprise_id = :enterprise_id AND q.created_at >= :since AND q.retention_days <> :tier"
+        ),
+        params
+    )
+    result = await conn.execute(
+        text(
+            "UPDATE enterprise_queries SET retention_days = :tier "
+            "WHERE enterprise_id = :enterprise_id AND created_at >= :since AND retention_days <> :tier"
+        ),
+        params
+    )
+    return result.rowcount or 0
+
+
+async def apply_retention_changes(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Re-tier enterprises whose data_retention_days now maps to another tier
+    A one-off UPDATE per policy change, one transaction per enterprise; expiry itself never touches rows
+    """
+    now = now or datetime.now(timezone.utc)
+    stats = {"enterprises_retiered": 0, "rows_moved": 0}
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT e.id, e.data_retention_days, r.retention_days AS recorded, r.changed_at "
+            "FROM enterprises e LEFT JOIN query_log_retention r ON r.enterprise_id = e.id"
+        ))
+        enterprises = result.fetchall()
+
+    for row in enterprises:
+        tier = retention_tier(row.data_retention_days)
+        if row.recorded != tier:
+            since = None
+        elif row.changed_at and row.changed_at > now - timedelta(days=RETIER_SWEEP_DAYS):
+            # Stragglers written under the old tier since the change
+            since = row.changed_at - timedelta(hours=1)
+        else:
+            continue
+
+        async with engine.begin() as conn:
+            moved = await _move_enterprise(conn, row.id, tier, since)
+            if row.recorded != tier:
+                await conn.execute(
+                    text(
+                        "INSERT INTO query_log_retention (enterprise_id, retention_days, changed_at) "
+                        "VALUES (:enterprise_id, :tier, :now) ON CONFLICT (enterprise_id) "
+                        "DO UPDATE SET retention_days = EXCLUDED.retention_days, changed_at = EXCLUDED.changed_at"
+                    ),
+                    {"enterprise_id": row.id, "tier": tier, "now": now}
+                )
+        stats["rows_moved"] += moved
+        if row.recorded is not None and row.recorded != tier:
+            stats["enterprises_retiered"] += 1
+            logger.info(f"🗂️ Enterprise {row.id} query log moved to the {tier}-day tier ({moved} rows)")
+    return stats
+
+
+async def prune_expired_partitions(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Enforce data retention on the partitioned query log
+    A monthly partition of a tier is dropped once all of it is older than that tier's retention
+    """
+    now = now or datetime.utcnow()
+    stats = {"partitions_dropped": 0}
+
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in PARTITIONED_TABLES:
+            for tier in RETENTION_TIERS:
+                cutoff = (now - timedelta(days=tier)).date()
+                parent = tier_name(table, tier)
+                for name, month in await _list_partitions(conn, parent):
+                    if add_months(month, 1) > cutoff:
+                        break
+                    await conn.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name} CONCURRENTLY"))
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                    stats["partitions_dropped"] += 1
+                    logger.info(f"🗑️ Dropped expired partition {name}")
+
+    return stats
+
+
+async def run_retention_cycle() -> Dict[str, int]:
+    """Create upcoming partitions, re-tier changed enterprises, then prune expired partitions"""
+    async with engine.begin() as conn:
+        await ensure_partitions(conn)
+    stats = await apply_retention_changes()
+    return {**stats, **await prune_expired_partitions()}
+
+
+async def retention_loop() -> None:
+    """Background task running the retention cycle on a fixed interval"""
+    interval = settings.QUERY_LOG_RETENTION_INTERVAL_HOURS * 3600
+    while True:
+        try:
+            stats = await run_retention_cycle()
+            logger.info(f"✅ Query log retention: {stats}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Query log retention failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,455 @@
+"""
+Table Query Engine - Exact filter/group/aggregate over ingested spreadsheets
+Turns what _analyze_query already extracts (date mentions, numeric
+thresholds, entities) plus aggregate keywords into a pandas plan, runs it
+vectorized over the Parquet tables behind the retrieved table cards, and
+hands the LLM the small result table to narrate instead of raw rows
+"""
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.tabular_store import SOURCE_ROW_COLUMN, tabular_store
+
+logger = logging.getLogger(__name__)
+
+_MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4,
+    "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8, "september": 9,
+    "sep": 9, "sept": 9, "october": 10, "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12,
+}
+_QUARTER = re.compile(r"^q([1-4])$")
+_YEAR = re.compile(r"^(19|20)\d{2}$")
+
+# Checked in order; the first matching keyword decides the aggregate
+_AGGREGATES = (
+    ("mean", ("average", "mean", "avg")),
+    ("count", ("how many", "number of", "count")),
+    ("max", ("highest", "largest", "maximum", "biggest", "max", "top")),
+    ("min", ("lowest", "smallest", "minimum", "min")),
+    ("sum", ("total", "sum", "how much", "spend", "spent", "expenses", "cost")),
+)
+_LIST_WORDS = re.compile(r"\b(which|list|show|who|clients|customers|accounts|invoices|orders)\b")
+_COMPARE = re.compile(r"\b(vs\.?|versus|compare[ds]?|comparison|against|difference)\b")
+_TREND = re.compile(r"\b(trend|over time|monthly|by month|per month|each month|month over month)\b")
+_GROUP_BY = re.compile(r"\b(?:by|per|for each)\s+([a-z][a-z0-9_ ]{1,40})")
+_THRESHOLD = re.compile(
+    r"(>=|<=|>|<|at least|at most|more than|greater than|less than|above|over|below|under|exceeding)"
+    r"\s*\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m)?\b",
+    re.IGNORECASE
+)
+_OPERATORS = {
+    ">=": ">=", "at least": ">=", "<=": "<=", "at most": "<=",
+    ">": ">", "more than": ">", "greater than": ">", "above": ">", "over": ">", "exceeding": ">",
+    "<": "<", "less than": "<", "below": "<", "under": "<",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "the", "a", "an", "of", "in", "on", "for", "to", "and", "or", "with", "what", "was", "were", "is", "are",
+    "our", "we", "by", "per", "vs", "versus", "how", "much", "many", "which", "show", "list", "me", "all",
+    "than", "more", "less", "over", "under", "above", "below", "at", "least", "most", "from", "each",
+    "total", "sum", "average", "mean", "count", "number", "highest", "lowest", "top", "compare", "trend",
+}
+# Values this long or longer are free text, not categories worth matching
+_MAX_CATEGORY_LENGTH = 80
+# Column names marking a money/amount measure, and ones marking a ratio that must never be summed
+_AMOUNT_WORDS = {
+    "amount", "amt", "cost", "costs", "spend", "spending", "spent", "expense", "expenses", "total", "value",
+    "revenue", "sales", "price", "budget", "actual", "paid", "payment", "balance", "usd", "eur", "gbp",
+}
+_RATIO_WORDS = {"pct", "percent", "percentage", "rate", "ratio", "share"}
+
+
+def _tokens(text: Any) -> List[str]:
+    return _WORD.findall(str(text).lower())
+
+
+def _terms(text: str) -> Set[str]:
+    return {token for token in _tokens(text) if token not in _STOPWORDS}
+
+
+def _periods(query: str, date_mentions: Iterable[Any]) -> Dict[str, Set[int]]:
+    """Months, quarters and years named in the question (relative periods are ignored)"""
+    words = set(_tokens(query))
+    for mention in date_mentions or []:
+        words.update(_tokens(" ".join(mention) if isinstance(mention, tuple) else mention))
+    return {
+        "month": {_MONTHS[word] for word in words if word in _MONTHS},
+        "quarter": {int(match.group(1)) for match in map(_QUARTER.match, words) if match},
+        "year": {int(word) for word in words if _YEAR.match(word)},
+    }
+
+
+def _column_periods(name: str) -> Dict[str, Set[int]]:
+    return _periods(name, ())
+
+
+def _label_periods(value: Any) -> Dict[str, Set[int]]:
+    """Periods of a label such as "January" or "Q1 2024"; a month label also gives its quarter"""
+    periods = _column_periods(str(value))
+    periods["quarter"] |= {(month - 1) // 3 + 1 for month in periods["month"]}
+    return periods
+
+
+def _label_order(value: Any) -> Tuple[int, int]:
+    """Chronological sort key of a period label: (year or 0, first month)"""
+    periods = _column_periods(str(value))
+    month = min(periods["month"], default=None)
+    if month is None:
+        month = (min(periods["quarter"], default=1) - 1) * 3 + 1
+    return min(periods["year"], default=0), month
+
+
+def _amount_measure(measures: List[str]) -> Optional[str]:
+    """The one money/amount column an unnamed "total"/"spend"/"cost" refers to; None when ambiguous"""
+    candidates = [c for c in measures if "%" not in c and not _RATIO_WORDS & set(_tokens(c))]
+    money = [c for c in candidates if any(symbol in c for symbol in "$€£") or _AMOUNT_WORDS & set(_tokens(c))]
+    if len(money) == 1:
+        return money[0]
+    if not money and len(candidates) == 1:
+        return candidates[0]
+    return None
+
+
+def _thresholds(query: str) -> List[Tuple[str, float]]:
+    found = []
+    for operator, number, suffix in _THRESHOLD.findall(query):
+        value = float(number.replace(",", ""))
+        value *= {"k": 1e3, "m": 1e6}.get(suffix.lower(), 1)
+        found.append((_OPERATORS[operator.lower()], value))
+    return found
+
+
+def _aggregate(query_lower: str) -> Optional[str]:
+    for name, keywords in _AGGREGATES:
+        if any(re.search(rf"\b{re.escape(keyword)}\b", query_lower) for keyword in keywords):
+            return name
+    return None
+
+
+def _round(value: Any) -> Any:
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else round(float(value), 2)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+class TableQueryEngine:
+    """
+    Deterministic planner + pandas executor for one question over candidate tables
+    Returns None whenever the question cannot be tied to a table's columns,
+    in which case the normal text path answers it
+    """
+
+    def __init__(self):
+        self._frames = TTLCache(settings.TABLE_QUERY_FRAME_CACHE_ENTRIES, 600)
+        self.stats = {"attempts": 0, "answered": 0, "compute_ms": 0.0}
+
+    def _frame(self, table: Dict[str, Any]) -> pd.DataFrame:
+        """Table contents, cached per file version"""
+        path = os.path.join(tabular_store.root, table["path"])
+        key = (path, os.path.getmtime(path))
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = tabular_store.read(table)
+            self._frames.set(key, frame)
+        return frame
+
+    def run(self, query: str, query_analysis: Dict[str, Any], tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Computed results for the best matching tables (blocking; run in a thread)"""
+        self.stats["attempts"] += 1
+        start = time.perf_counter()
+        planned = []
+        for table in tables:
+            try:
+                frame = self._frame(table)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Table {table.get('path')} unreadable: {e}")
+                continue
+            plan = self.plan(query, query_analysis, frame)
+            if plan is not None:
+                planned.append((plan["score"], table, frame, plan))
+
+        planned.sort(key=lambda item: item[0], reverse=True)
+        results = []
+        for score, table, frame, plan in planned[:settings.TABLE_QUERY_MAX_TABLES]:
+            if score * 2 < planned[0][0]:
+                break  # Much weaker matches are other tables that merely share a date column
+            result = self.execute(frame, plan)
+            result.update({"table": table.get("sheet") or table.get("name"), "source": table.get("source")})
+            results.append(result)
+
+        self.stats["compute_ms"] += (time.perf_counter() - start) * 1000
+        if results:
+            self.stats["answered"] += 1
+        return results
+
+    def plan(self, query: str, query_analysis: Dict[str, Any], frame: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """Map the question onto this table's columns; None when nothing lines up"""
+        query_lower = query.lower()
+        terms = _terms(query)
+        periods = _periods(query, query_analysis.get("date_mentions"))
+        wanted_periods = any(periods.values())
+
+        columns = [column for column in frame.columns if column != SOURCE_ROW_COLUMN]
+        numeric = [c for c in columns if pd.api.types.is_numeric_dtype(frame[c]) and not pd.api.types.is_bool_dtype(frame[c])]
+        dates = [c for c in columns if pd.api.types.is_datetime64_any_dtype(frame[c])]
+        text = [c for c in columns if c not in numeric and c not in dates and not pd.api.types.is_bool_dtype(frame[c])]
+        measures = [c for c in numeric if not re.search(r"(^|_|\b)(id|no|number|code|zip)$", c.lower())]
+        # Long layout with period labels ("January", "Q1 2024") instead of dates
+        labels = None if dates else self._period_label_column(frame, text)
+        if labels:
+            text = [c for c in text if c != labels]
+
+        # Wide layout: one numeric column per period ("January", "Q1 2024")
+        period_columns = []
+        if wanted_periods:
+            for column in measures:
+                column_periods = _column_periods(column)
+                if any(column_periods[kind] and column_periods[kind] <= periods[kind] for kind in periods):
+                    period_columns.append(column)
+
+        named = [c for c in measures if terms & set(_tokens(c))]
+        amount = _amount_measure(measures)
+        metrics = period_columns or named
+
+        filters = self._category_filters(frame, text, terms, query_analysis.get("entities") or [])
+        thresholds = _thresholds(query)
+        threshold_column = (named or metrics or [amount])[0]
+        if thresholds and threshold_column is None:
+            thresholds = []
+
+        date_column = dates[0] if dates else labels
+        date_filter = periods if (wanted_periods and date_column and not period_columns) else None
+
+        group_by = None
+        match = _GROUP_BY.search(query_lower)
+        if match:
+            wanted = set(_tokens(match.group(1))[:2])
+            group_by = next((c for c in text if wanted & set(_tokens(c))), None)
+
+        # A date or a threshold alone fits most tables; the question must name a column or a value of this one
+        anchors = len(set(named) | set(period_columns)) + len(filters)
+        if anchors == 0:
+            return None
+        score = anchors + len(thresholds) + (1 if date_filter else 0)
+
+        aggregate = _aggregate(query_lower)
+        if aggregate is None:
+            aggregate = "rows" if (thresholds or filters) and _LIST_WORDS.search(query_lower) else "sum"
+        if not metrics and aggregate != "count":
+            if amount is None and aggregate != "rows":
+                return None  # An amount nobody can pin to a column; a row count would be a wrong answer
+            metrics = [amount] if amount else []
+
+        if _TREND.search(query_lower) and date_column:
+            shape = "trend"
+        elif _COMPARE.search(query_lower) and (len(period_columns) > 1 or (date_filter and date_column)):
+            shape = "compare"
+        elif group_by:
+            shape = "group"
+        else:
+            shape = "rows" if aggregate == "rows" else "total"
+
+        return {
+            "score": score,
+            "metrics": metrics,
+            "wide_periods": bool(period_columns),
+            "filters": filters,
+            "thresholds": [(threshold_column, operator, value) for operator, value in thresholds],
+            "date_column": date_column,
+            "date_labels": bool(labels),
+            "date_filter": date_filter,
+            "group_by": group_by,
+            "aggregate": aggregate,
+            "shape": shape,
+        }
+
+    @staticmethod
+    def _period_label_column(frame: pd.DataFrame, text_columns: List[str]) -> Optional[str]:
+        """First text column whose every value names a month or quarter"""
+        for column in text_columns:
+            values = frame[column].dropna().unique()
+            if not 0 < len(values) <= settings.TABLE_QUERY_MAX_CATEGORIES:
+                continue
+            if all(len(value) <= _MAX_CATEGORY_LENGTH and _label_periods(value)["quarter"] for value in values):
+                return column
+        return None
+
+    @staticmethod
+    def _category_filters(frame: pd.DataFrame, text_columns: List[str], terms: Set[str],
+                          entities: List[str]) -> Dict[str, List[str]]:
+        """Per text column, the category values the question names (best token overlap wins)"""
+        entity_terms = set(_tokens(" ".join(entities)))
+        wanted = terms | entity_terms
+        filters = {}
+        if not wanted:
+            return filters
+        for column in text_columns:
+            values = frame[column].dropna().unique()
+            if len(values) > settings.TABLE_QUERY_MAX_CATEGORIES:
+                continue
+            best, best_score = [], 0.0
+            for value in values:
+                if len(value) > _MAX_CATEGORY_LENGTH:
+                    continue
+                value_tokens = set(_tokens(value)) - _STOPWORDS
+                if not value_tokens:
+                    continue
+                overlap = value_tokens & wanted
+                score = len(overlap) / len(value_tokens)
+                if score > best_score:
+                    best, best_score = [value], score
+                elif score == best_score and score > 0:
+                    best.append(value)
+            if best_score >= 0.5:
+                filters[column] = best
+        return filters
+
+    def execute(self, frame: pd.DataFrame, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a plan; every step is a vectorized mask or groupby"""
+        mask = np.ones(len(frame), dtype=bool)
+        described = []
+        for column, values in plan["filters"].items():
+            mask &= frame[column].isin(values).to_numpy()
+            described.append(f"{column} in {values}")
+        for column, operator, value in plan["thresholds"]:
+            series = frame[column]
+            mask &= {
+                ">": series > value, ">=": series >= value, "<": series < value, "<=": series <= value
+            }[operator].fillna(False).to_numpy()
+            described.append(f"{column} {operator} {value:g}")
+        if plan["date_filter"] and plan["date_labels"]:
+            wanted = plan["date_filter"]
+            labels = [
+                value for value in frame[plan["date_column"]].dropna().unique()
+                if all(
+                    not wanted[kind] or (wanted[kind] & periods[kind]) or (kind == "year" and not periods[kind])
+                    for periods in [_label_periods(value)] for kind in wanted
+                )
+            ]
+            labels.sort(key=_label_order)
+            mask &= frame[plan["date_column"]].isin(labels).to_numpy()
+            described.append(f"{plan['date_column']} in {labels}")
+        elif plan["date_filter"]:
+            dates = frame[plan["date_column"]].dt
+            for kind, accessor in (("month", dates.month), ("quarter", dates.quarter), ("year", dates.year)):
+                if plan["date_filter"][kind]:
+                    mask &= accessor.isin(plan["date_filter"][kind]).fillna(False).to_numpy()
+                    described.append(f"{plan['date_column']} {kind} in {sorted(plan['date_filter'][kind])}")
+
+        matched = frame[mask]
+        metrics, aggregate = plan["metrics"], plan["aggregate"]
+
+        if plan["shape"] == "rows":
+            shown = matched.head(settings.TABLE_QUERY_MAX_RESULT_ROWS)
+            columns = [c for c in matched.columns if c != SOURCE_ROW_COLUMN]
+            rows = shown[columns].to_numpy().tolist()
+            summary = {"matching_rows": int(len(matched))}
+            if metrics:
+                summary[f"sum of {metrics[0]}"] = _round(matched[metrics[0]].sum())
+        elif plan["shape"] == "compare" and plan["wide_periods"]:
+            # One row per period column
+            columns = ["period", aggregate]
+            rows = [[metric, _round(self._agg(matched[metric], aggregate))] for metric in metrics]
+            summary = self._change(rows)
+        elif plan["shape"] in ("compare", "trend") and plan["date_labels"]:
+            order = sorted(matched[plan["date_column"]].dropna().unique(), key=_label_order)
+            key = pd.Series(
+                pd.Categorical(matched[plan["date_column"]], categories=order, ordered=True),
+                index=matched.index, name=plan["date_column"]
+            )
+            columns, rows = self._grouped(matched, key, metrics, aggregate)
+            summary = self._change(rows) if plan["shape"] == "compare" else {}
+        elif plan["shape"] in ("compare", "trend"):
+            key = matched[plan["date_column"]].dt.tz_localize(None).dt.to_period("M" if plan["shape"] == "trend" or plan["date_filter"]["month"] else "Q")
+            grouped = self._grouped(matched, key.astype(str), metrics, aggregate)
+            columns, rows = grouped
+            summary = self._change(rows) if plan["shape"] == "compare" else {}
+        elif plan["shape"] == "group":
+            columns, rows = self._grouped(matched, matched[plan["group_by"]], metrics, aggregate)
+            summary = {}
+        else:
+            columns = metrics if aggregate != "count" else ["count"]
+            rows = [[_round(self._agg(matched[metric], aggregate)) for metric in metrics]] if aggregate != "count" \
+                else [[int(len(matched))]]
+            summary = {}
+
+        return {
+            "operation": self._describe(plan),
+            "filters": described,
+            "columns": [str(column) for column in columns],
+            "rows": [[_round(value) for value in row] for row in rows][:settings.TABLE_QUERY_MAX_RESULT_ROWS],
+            "matched_rows": int(len(matched)),
+            "source_rows": matched[SOURCE_ROW_COLUMN].head(20).tolist() if SOURCE_ROW_COLUMN in matched else [],
+            "summary": summary,
+        }
+
+    @staticmethod
+    def _describe(plan: Dict[str, Any]) -> str:
+        if plan["shape"] == "rows":
+            return "matching rows"
+        operation = f"{plan['aggregate']} of {', '.join(plan['metrics']) or 'rows'}"
+        if plan["shape"] == "group":
+            operation += f" by {plan['group_by']}"
+        elif plan["shape"] == "trend":
+            operation += " by month"
+        return operation
+
+    @staticmethod
+    def _agg(series: pd.Series, aggregate: str) -> Any:
+        if aggregate == "count":
+            return int(series.notna().sum())
+        return getattr(series, aggregate if aggregate != "rows" else "sum")()
+
+    def _grouped(self, frame: pd.DataFrame, key: pd.Series, metrics: List[str], aggregate: str) -> Tuple[List[str], List[List[Any]]]:
+        if aggregate == "count" or not metrics:
+            counts = frame.groupby(key, sort=True, observed=True).size()
+            return [key.name or "group", "count"], [[index, int(value)] for index, value in counts.items()]
+        function = "sum" if aggregate == "rows" else aggregate
+        table = frame.groupby(key, sort=True, observed=True)[metrics].agg(function)
+        return [key.name or "group", *metrics], [[index, *values] for index, values in zip(table.index, table.to_numpy().tolist())]
+
+    @staticmethod
+    def _change(rows: List[List[Any]]) -> Dict[str, Any]:
+        """Absolute and relative change between the first and last compared value"""
+        if len(rows) < 2 or rows[0][-1] in (None, 0) or rows[-1][-1] is None:
+            return {}
+        first, last = rows[0][-1], rows[-1][-1]
+        return {"change": _round(last - first), "change_pct": _round((last - first) / abs(first) * 100)}
+
+    def report(self) -> Dict[str, Any]:
+        attempts = self.stats["attempts"]
+        return {
+            **self.stats,
+            "compute_ms": round(self.stats["compute_ms"], 1),
+            "hit_rate": round(self.stats["answered"] / attempts, 3) if attempts else 0.0,
+        }
+
+
+def result_to_context(result: Dict[str, Any]) -> str:
+    """Compact text of a computed result for the prompt"""
+    lines = [
+        f"Computed from '{result['table']}' in {result['source']}: {result['operation']}"
+        + (f" where {'; '.join(result['filters'])}" if result["filters"] else "")
+        + f" ({result['matched_rows']} matching rows)",
+        " | ".join(result["columns"]),
+    ]
+    lines.extend(" | ".join("" if value is None else str(value) for value in row) for row in result["rows"])
+    for name, value in result["summary"].items():
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+# Global engine instance
+table_query_engine = TableQueryEngine()
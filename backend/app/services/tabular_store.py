@@ -0,0 +1,339 @@
+"""
+Tabular Store - Spreadsheet ingestion into per-enterprise Parquet tables
+CSV files and Excel sheets are streamed (pandas chunks / openpyxl read-only)
+into one typed Parquet file per sheet, with the source row number of every
+record, instead of being flattened into text chunks for embedding
+"""
+import csv
+import logging
+import os
+import re
+import shutil
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+logger = logging.getLogger(__name__)
+
+TABULAR_EXTENSIONS = {".csv", ".xlsx", ".xlsm"}
+
+# Source row number (1-based, as shown in Excel / a text editor) of every record
+SOURCE_ROW_COLUMN = "_source_row"
+
+# Share of non-empty values that must parse for a column to get a typed dtype
+TYPE_INFERENCE_THRESHOLD = 0.9
+
+_CURRENCY = re.compile(r"^\(?\s*-?\s*[$€£]?\s*-?[\d,]*\.?\d+\s*%?\s*\)?$")
+# A four-digit year or a numeric date ("3/14/24"); "January" or "14 Mar" alone would get an invented year
+_HAS_YEAR = re.compile(r"\b\d{4}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b")
+_SLUG = re.compile(r"[^a-z0-9]+")
+
+
+def is_tabular(filename: str) -> bool:
+    return os.path.splitext(filename or "")[1].lower() in TABULAR_EXTENSIONS
+
+
+def _slug(name: str) -> str:
+    return _SLUG.sub("_", str(name).lower()).strip("_") or "sheet"
+
+
+def _parse_number(value: Any) -> Optional[float]:
+    """"$1,200", "(300)", "12.5%" -> float; None when not a number"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text or not _CURRENCY.match(text):
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    cleaned = re.sub(r"[()$€£,%\s]", "", text)
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return None
+    return -number if negative else number
+
+
+def _has_year(value: Any) -> bool:
+    """Whether a date-like value pins down its year"""
+    if isinstance(value, str):
+        return bool(_HAS_YEAR.search(value))
+    return hasattr(value, "year")
+
+
+def _parse_datetimes(series: pd.Series) -> pd.Series:
+    """Datetimes in UTC; values without a year (month names, "14 Mar") become NaT"""
+    dated = series.where(series.map(_has_year), None)
+    return pd.to_datetime(dated, errors="coerce", format="mixed", utc=True)
+
+
+def _clean_headers(raw: List[Any]) -> List[str]:
+    """Non-empty, unique column names"""
+    headers, seen = [], {}
+    for index, value in enumerate(raw):
+        name = str(value).strip() if value is not None and str(value).strip() else f"column_{index + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        headers.append(name)
+    return headers
+
+
+def _infer_column(series: pd.Series) -> Dict[str, Any]:
+    """Decide a column's type from its first batch: number, datetime, boolean or string"""
+    values = series.dropna()
+    values = values[values.astype(str).str.strip() != ""]
+    if values.empty:
+        return {"type": "string"}
+
+    if pd.api.types.is_bool_dtype(values):
+        return {"type": "boolean"}
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return {"type": "datetime"}
+
+    parsed = values.map(_parse_number)
+    if parsed.notna().mean() >= TYPE_INFERENCE_THRESHOLD:
+        text = values.astype(str)
+        unit = None
+        if text.str.contains("%", regex=False).mean() >= 0.5:
+            unit = "%"
+        elif text.str.contains(r"[$€£]").mean() >= 0.5:
+            unit = next(symbol for symbol in "$€£" if text.str.contains(symbol, regex=False).any())
+        return {"type": "number", "unit": unit}
+
+    if values.map(lambda value: hasattr(value, "year")).mean() >= TYPE_INFERENCE_THRESHOLD:
+        return {"type": "datetime"}
+    if values.map(lambda value: isinstance(value, str)).all():
+        # Labels such as month names stay strings rather than dates in an invented year
+        if _parse_datetimes(values).notna().mean() >= TYPE_INFERENCE_THRESHOLD:
+            return {"type": "datetime"}
+    return {"type": "string"}
+
+
+def _coerce(frame: pd.DataFrame, columns: Dict[str, Dict[str, Any]]) -> Tuple[pd.DataFrame, Dict[str, List[int]]]:
+    """
+    Cast a batch to the column types decided on the first batch
+    Also returns, per column, the source rows of non-empty values that did not fit its type
+    """
+    out, unparsed = {}, {}
+    for name, spec in columns.items():
+        series = frame[name] if name in frame else pd.Series([None] * len(frame), index=frame.index)
+        if spec["type"] == "number":
+            out[name] = series.map(_parse_number).astype("float64")
+        elif spec["type"] == "datetime":
+            out[name] = _parse_datetimes(series)
+        elif spec["type"] == "boolean":
+            out[name] = series.map(lambda value: value if isinstance(value, bool) else None).astype("boolean")
+        else:
+            out[name] = series.map(lambda value: None if value is None or pd.isna(value) else str(value)).astype("object")
+            continue
+        present = series.notna() & (series.astype(str).str.strip() != "")
+        rejected = present & out[name].isna()
+        if rejected.any():
+            unparsed[name] = frame.loc[rejected, SOURCE_ROW_COLUMN].astype(int).tolist()
+    out[SOURCE_ROW_COLUMN] = frame[SOURCE_ROW_COLUMN].astype("int64")
+    return pd.DataFrame(out), unparsed
+
+
+_ARROW_TYPES = {
+    "number": lambda: pa.float64(),
+    "datetime": lambda: pa.timestamp("us", tz="UTC"),
+    "boolean": lambda: pa.bool_(),
+    "string": lambda: pa.string(),
+}
+
+
+class TabularStore:
+    """
+    Parquet tables under <root>/enterprise_<id>/doc_<id>/<sheet>.parquet
+    The table catalog (columns, types, row counts, paths) is returned by
+    ingest() and kept in Document.doc_metadata["tables"]
+    """
+
+    def __init__(self, root: Optional[str] = None, batch_rows: Optional[int] = None):
+        self.root = root or settings.TABULAR_STORE_PATH
+        self.batch_rows = batch_rows or settings.TABULAR_BATCH_ROWS
+
+    def document_dir(self, enterprise_id: int, document_id: int) -> str:
+        return os.path.join(self.root, f"enterprise_{enterprise_id}", f"doc_{document_id}")
+
+    def ingest(self, enterprise_id: int, document_id: int, file_path: str, filename: str) -> List[Dict[str, Any]]:
+        """
+        Parse a CSV or workbook into Parquet tables; blocking, run it in a thread
+        Returns one catalog entry per non-empty sheet
+        """
+        if pq is None:
+            raise RuntimeError("pyarrow is required for spreadsheet ingestion")
+
+        target = self.document_dir(enterprise_id, document_id)
+        shutil.rmtree(target, ignore_errors=True)  # Reprocessing replaces the previous tables
+        os.makedirs(target, exist_ok=True)
+
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == ".csv":
+            sheets = [(os.path.splitext(os.path.basename(filename))[0], self._csv_batches(file_path))]
+        else:
+            sheets = self._workbook_sheets(file_path)
+
+        tables = []
+        used_names = set()
+        for sheet_name, batches in sheets:
+            name = _slug(sheet_name)
+            while name in used_names:
+                name += "_"
+            used_names.add(name)
+
+            entry = self._write_table(
+                batches,
+                os.path.join(target, f"{name}.parquet"),
+                {"document_id": str(document_id), "filename": filename, "sheet": sheet_name}
+            )
+            if entry is not None:
+                tables.append({"name": name, "sheet": sheet_name, "source": filename, **entry})
+
+        logger.info(f"📊 Ingested {len(tables)} table(s) from {filename}")
+        return tables
+
+    @staticmethod
+    def _csv_header_line(file_path: str) -> Tuple[int, int]:
+        """
+        (lines before the header, line the header ends on), like _sheet_batches:
+        the header is the first row with 2+ values; title rows above it are skipped
+        """
+        first_nonempty = None
+        with open(file_path, newline="", encoding="utf-8", errors="replace") as handle:
+            reader = csv.reader(handle)
+            previous_line = 0
+            for row in reader:
+                filled = sum(bool(value.strip()) for value in row)
+                if filled >= 2:
+                    return previous_line, reader.line_num
+                if filled and first_nonempty is None:
+                    first_nonempty = (previous_line, reader.line_num)
+                previous_line = reader.line_num
+        # Single-column files: the first non-empty row
+        return first_nonempty or (0, 1)
+
+    def _csv_batches(self, file_path: str) -> Iterator[pd.DataFrame]:
+        skipped, header_line = self._csv_header_line(file_path)
+        reader = pd.read_csv(
+            file_path, chunksize=self.batch_rows, dtype=object, keep_default_na=False,
+            na_values=[""], skip_blank_lines=False, encoding_errors="replace",
+            skiprows=skipped, header=0
+        )
+        first_row = header_line + 1
+        for chunk in reader:
+            chunk = chunk.copy()
+            chunk.columns = _clean_headers(list(chunk.columns))
+            chunk[SOURCE_ROW_COLUMN] = range(first_row, first_row + len(chunk))
+            first_row += len(chunk)
+            yield chunk.dropna(how="all", subset=[c for c in chunk.columns if c != SOURCE_ROW_COLUMN])
+
+    def _workbook_sheets(self, file_path: str) -> List[Tuple[str, Iterator[pd.DataFrame]]]:
+        if load_workbook is None:
+            raise RuntimeError("openpyxl is required for Excel ingestion")
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        return [(sheet.title, self._sheet_batches(sheet)) for sheet in workbook.worksheets]
+
+    def _sheet_batches(self, sheet: Any) -> Iterator[pd.DataFrame]:
+        """Rows of a read-only worksheet in DataFrame batches; the header is the first row with 2+ values"""
+        headers = None
+        batch: List[List[Any]] = []
+        for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+            if all(value is None or (isinstance(value, str) and not value.strip()) for value in row):
+                continue
+            if headers is None:
+                if sum(value is not None for value in row) >= 2:
+                    headers = _clean_headers(list(row))
+                continue
+            batch.append(list(row[:len(headers)]) + [None] * (len(headers) - len(row)) + [row_number])
+            if len(batch) >= self.batch_rows:
+                yield pd.DataFrame(batch, columns=headers + [SOURCE_ROW_COLUMN])
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=headers + [SOURCE_ROW_COLUMN])
+
+    def _write_table(self, batches: Iterator[pd.DataFrame], path: str, provenance: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Stream batches into one Parquet file typed after the first batch"""
+        writer = None
+        columns: Dict[str, Dict[str, Any]] = {}
+        unparsed: Dict[str, List[int]] = {}
+        row_count = 0
+        try:
+            for frame in batches:
+                if frame.empty:
+                    continue
+                if writer is None:
+                    columns = {name: _infer_column(frame[name]) for name in frame.columns if name != SOURCE_ROW_COLUMN}
+                    fields = [pa.field(name, _ARROW_TYPES[spec["type"]]()) for name, spec in columns.items()]
+                    fields.append(pa.field(SOURCE_ROW_COLUMN, pa.int64()))
+                    schema = pa.schema(fields, metadata={key: str(value) for key, value in provenance.items()})
+                    writer = pq.ParquetWriter(path, schema, compression="zstd")
+                typed, rejected = _coerce(frame, columns)
+                for name, rows in rejected.items():
+                    unparsed.setdefault(name, []).extend(rows)
+                writer.write_table(pa.Table.from_pandas(typed, schema=writer.schema, preserve_index=False))
+                row_count += len(typed)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            return None
+        for name, rows in unparsed.items():
+            # Kept as empty cells; the count goes into the catalog so the loss is visible
+            columns[name]["unparsed"] = len(rows)
+            logger.warning(
+                f"⚠️ {provenance['filename']} [{provenance['sheet']}] column '{name}': {len(rows)} value(s) "
+                f"not a {columns[name]['type']}, stored empty (rows {', '.join(map(str, rows[:10]))}"
+                f"{', ...' if len(rows) > 10 else ''})"
+            )
+        return {
+            "path": os.path.relpath(path, self.root),
+            "row_count": row_count,
+            "columns": [{"name": name, **spec} for name, spec in columns.items()],
+        }
+
+    def read(self, table: Dict[str, Any], columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Load one catalog entry (optionally only some columns) as a DataFrame"""
+        return pq.read_table(os.path.join(self.root, table["path"]), columns=columns).to_pandas()
+
+    def delete(self, enterprise_id: int, document_id: int) -> None:
+        shutil.rmtree(self.document_dir(enterprise_id, document_id), ignore_errors=True)
+
+
+def describe_table(table: Dict[str, Any], preview: Optional[pd.DataFrame] = None) -> str:
+    """Text card of a table for the vector index, so searches still find spreadsheets"""
+    columns = ", ".join(
+        f"{column['name']} ({column['type']}{', ' + column['unit'] if column.get('unit') else ''})"
+        for column in table["columns"]
+    )
+    lines = [
+        f"Table '{table['sheet']}' from {table['source']} ({table['row_count']} rows)",
+        f"Columns: {columns}",
+    ]
+    if preview is not None and not preview.empty:
+        lines.append(preview.drop(columns=[SOURCE_ROW_COLUMN], errors="ignore").to_csv(index=False, sep="|"))
+    return "\n".join(lines)
+
+
+# Global store instance
+tabular_store = TabularStore()
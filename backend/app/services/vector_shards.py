@@ -0,0 +1,142 @@
+"""
+Vector Shards - Per-enterprise collections split by fiscal year or category
+With VECTOR_SHARD_BY set, a document's chunks go to the shard collection of
+its fiscal year or category instead of the single enterprise_{id}_docs
+collection, and the shard is recorded on Document.vector_shard. A search
+fans out in parallel to the enterprise's shards, skipping those a filter
+on the shard field rules out, and merges the hits into one top-k. Documents
+indexed before sharding (vector_shard NULL) stay in the base collection,
+which is searched like a shard, so enabling sharding needs no re-index
+"""
+import asyncio
+import heapq
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document
+from app.services.vector_store import Hit, Where, create_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Shard dimension -> chunk metadata field that filters on it
+SHARD_FIELDS = {"fiscal_year": "fiscal_year", "category": "category"}
+_YEAR = re.compile(r"(?:19|20)\d{2}")
+_SLUG = re.compile(r"[^a-z0-9]+")
+
+
+def fiscal_year(fiscal_period: Optional[str]) -> Optional[int]:
+    """Year of a fiscal period label ("2023-Q1", "FY2024", "2023-07"), if it has one"""
+    match = _YEAR.search(fiscal_period or "")
+    return int(match.group()) if match else None
+
+
+def base_collection(enterprise_id: int) -> str:
+    return f"enterprise_{enterprise_id}_docs"
+
+
+def shard_collection(enterprise_id: int, shard: Optional[str]) -> str:
+    """Collection of a shard ("fiscal_year:2023" -> enterprise_7_docs_fiscal-year-2023); None is the base"""
+    if shard is None:
+        return base_collection(enterprise_id)
+    slug = _SLUG.sub("-", shard.lower()).strip("-") or "unassigned"
+    return f"{base_collection(enterprise_id)}_{slug}"[:63].rstrip("-")
+
+
+class ShardRouter:
+    """Picks a document's shard and fans searches out to an enterprise's shards"""
+
+    def __init__(self):
+        # Shards per enterprise; ingestion in this process updates it, other workers' after the TTL
+        self._shards = TTLCache(settings.VECTOR_SHARD_CACHE_ENTRIES, settings.VECTOR_SHARD_CACHE_SECONDS)
+        self.stats = {"searches": 0, "shards_searched": 0, "shards_pruned": 0}
+
+    def shard_for(self, document: Document) -> Optional[str]:
+        """"dimension:value" for a document, or None when sharding is off"""
+        dimension = settings.VECTOR_SHARD_BY
+        if not dimension:
+            return None
+        if dimension not in SHARD_FIELDS:
+            raise ValueError(f"Unknown VECTOR_SHARD_BY {dimension!r}; expected one of {', '.join(SHARD_FIELDS)}")
+        value = fiscal_year(document.fiscal_period) if dimension == "fiscal_year" else document.category
+        return f"{dimension}:{'' if value is None else str(value).lower()}"
+
+    async def shards(self, enterprise_id: int) -> List[Optional[str]]:
+        """Distinct Document.vector_shard values of processed documents (None = the base collection)"""
+        cached = self._shards.get(enterprise_id)
+        if cached is not None:
+            return cached
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Document.vector_shard)
+                .where(Document.enterprise_id == enterprise_id, Document.processed == True)
+                .distinct()
+            )
+            shards = sorted(result.scalars().all(), key=lambda shard: shard or "")
+        self._shards.set(enterprise_id, shards)
+        return shards
+
+    def register(self, enterprise_id: int, shard: Optional[str]) -> None:
+        """A document was just indexed into `shard`"""
+        cached = self._shards.get(enterprise_id)
+        if cached is not None and shard not in cached:
+            logger.info(f"🧩 Enterprise {enterprise_id} vector collection gained shard {shard or 'base'}")
+            self._shards.set(enterprise_id, cached + [shard])
+
+    @staticmethod
+    def _may_match(shard: Optional[str], where: Optional[Where]) -> bool:
+        """False when the filter rules out every chunk of the shard"""
+        if shard is None or not where:
+            return True
+        dimension, _, value = shard.partition(":")
+        field = SHARD_FIELDS.get(dimension)
+        if field not in where:
+            return True
+        expected = where[field]
+        accepted = expected if isinstance(expected, (list, tuple, set)) else [expected]
+        return value in {str(item).lower() for item in accepted if item is not None}
+
+    async def route(self, enterprise_id: int, where: Optional[Where] = None) -> List[str]:
+        """Collections a search with `where` has to visit"""
+        shards = await self.shards(enterprise_id)
+        selected = [shard for shard in shards if self._may_match(shard, where)]
+        self.stats["searches"] += 1
+        self.stats["shards_searched"] += len(selected)
+        self.stats["shards_pruned"] += len(shards) - len(selected)
+        return [shard_collection(enterprise_id, shard) for shard in selected]
+
+    async def query(self, enterprise_id: int, vector: Sequence[float], k: int, where: Optional[Where] = None) -> List[Hit]:
+        """Global top-k over the matching shards, each searched for its own top-k in parallel"""
+        collections = await self.route(enterprise_id, where)
+        per_shard = await asyncio.gather(*(
+            asyncio.to_thread(lambda name=collection: create_vector_store(name).query(vector, k, where))
+            for collection in collections
+        ))
+        return heapq.nlargest(k, (hit for hits in per_shard for hit in hits), key=lambda hit: hit["score"])
+
+    async def get(self, enterprise_id: int, ids: Sequence[str]) -> List[Hit]:
+        """Chunks by id from whichever shard holds them"""
+        collections = [shard_collection(enterprise_id, shard) for shard in await self.shards(enterprise_id)]
+        per_shard = await asyncio.gather(*(
+            asyncio.to_thread(lambda name=collection: create_vector_store(name).get(list(ids)))
+            for collection in collections
+        ))
+        return [hit for hits in per_shard for hit in hits]
+
+    def report(self) -> Dict[str, Any]:
+        searches = self.stats["searches"]
+        return {
+            **self.stats,
+            "shard_by": settings.VECTOR_SHARD_BY or None,
+            "avg_shards_per_search": round(self.stats["shards_searched"] / searches, 2) if searches else 0.0,
+            "shard_cache": self._shards.stats(),
+        }
+
+
+# Global shard router
+shard_router = ShardRouter()
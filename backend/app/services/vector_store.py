@@ -0,0 +1,313 @@
+"""
+Vector Store - One interface over the chunk embedding backends
+DocumentService embeds text itself and talks to a VectorStore: add, upsert,
+delete by ids or metadata filter, query with a filter, get by ids, count.
+Adapters cover Chroma, the memory-mapped quantized index, an in-memory NumPy
+brute-force store (tests, evaluation) and FAISS when installed. Scores are
+cosine similarities (higher is closer) for every backend, and filters are
+{"field": value} or {"field": [any, of, these]} with all fields required
+"""
+import threading
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.quantized_index import open_index
+
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+Where = Dict[str, Any]
+Hit = Dict[str, Any]  # {"id", "content", "metadata", "score"}
+
+VECTOR_BACKENDS = ("chroma", "quantized", "memory", "faiss")
+
+
+class VectorStore(Protocol):
+    def add(self, ids: Sequence[str], vectors: np.ndarray, contents: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Insert chunks under new ids (what an existing id does is backend-specific; use upsert to replace)"""
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, contents: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Insert chunks, replacing any with the same id"""
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Where] = None) -> None:
+        ...
+
+    def query(self, vector: Sequence[float], k: int, where: Optional[Where] = None) -> List[Hit]:
+        """The k closest chunks matching `where`, best first"""
+
+    def get(self, ids: Sequence[str]) -> List[Hit]:
+        ...
+
+    def count(self, where: Optional[Where] = None) -> int:
+        ...
+
+
+def _normalized(vectors: Any) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class ChromaStore:
+    """A Chroma collection, written with precomputed embeddings"""
+
+    def __init__(self, collection_name: str, persist_directory: str):
+        if chromadb is None:
+            raise RuntimeError("chromadb is not installed; set VECTOR_BACKEND to another backend")
+        client = chromadb.PersistentClient(path=persist_directory)
+        # Collections created earlier through LangChain keep their original (l2) space
+        self.collection = client.get_or_create_collection(collection_name, metadata={"hnsw:space": "cosine"})
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+
+    @staticmethod
+    def _where(where: Optional[Where]) -> Optional[Dict[str, Any]]:
+        if not where:
+            return None
+        clauses = [
+            {key: {"$in": list(value)} if isinstance(value, (list, tuple, set)) else {"$eq": value}}
+            for key, value in where.items()
+        ]
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    @staticmethod
+    def _metadatas(metadatas: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Chroma rejects None values
+        return [{key: value for key, value in (metadata or {}).items() if value is not None} for metadata in metadatas]
+
+    def _similarity(self, distance: float) -> float:
+        # Embeddings are unit length: squared l2 = 2 - 2 cos; cosine and ip distances are 1 - cos
+        return 1.0 - distance / 2 if self.space == "l2" else 1.0 - distance
+
+    def add(self, ids, vectors, contents, metadatas) -> None:
+        self.collection.add(ids=list(ids), embeddings=_normalized(vectors).tolist(),
+                            documents=list(contents), metadatas=self._metadatas(metadatas))
+
+    def upsert(self, ids, vectors, contents, metadatas) -> None:
+        self.collection.upsert(ids=list(ids), embeddings=_normalized(vectors).tolist(),
+                               documents=list(contents), metadatas=self._metadatas(metadatas))
+
+    def delete(self, ids=None, where=None) -> None:
+        if ids is not None or where:
+            self.collection.delete(ids=list(ids) if ids is not None else None, where=self._where(where))
+
+    def query(self, vector, k, where=None) -> List[Hit]:
+        found = self.collection.query(
+            query_embeddings=_normalized(vector).tolist(), n_results=k, where=self._where(where),
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            {"id": chunk, "content": content, "metadata": metadata or {}, "score": self._similarity(distance)}
+            for chunk, content, metadata, distance in zip(
+                found["ids"][0], found["documents"][0], found["metadatas"][0], found["distances"][0]
+            )
+        ]
+
+    def get(self, ids) -> List[Hit]:
+        found = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return [
+            {"id": chunk, "content": content, "metadata": metadata or {}, "score": 0}
+            for chunk, content, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        ]
+
+    def count(self, where=None) -> int:
+        if not where:
+            return self.collection.count()
+        return len(self.collection.get(where=self._where(where), include=[])["ids"])
+
+
+class QuantizedStore:
+    """The memory-mapped int8 IVF index (see quantized_index.py); filters run in its SQLite records"""
+
+    def __init__(self, collection_name: str, persist_directory: str):
+        self.index = open_index(persist_directory, collection_name)
+
+    def add(self, ids, vectors, contents, metadatas) -> None:
+        self.index.add(ids, np.asarray(vectors, dtype=np.float32), contents, metadatas)
+
+    upsert = add  # The index already replaces rows whose id exists
+
+    def delete(self, ids=None, where=None) -> None:
+        if ids is not None:
+            self.index.delete(ids)
+        if where:
+            self.index.delete_where(where)
+
+    def query(self, vector, k, where=None) -> List[Hit]:
+        return self.index.query(vector, k, where)
+
+    def get(self, ids) -> List[Hit]:
+        return [{**record, "score": 0} for record in self.index.get(ids)]
+
+    def count(self, where=None) -> int:
+        return self.index.count(where)
+
+
+class NumpyStore:
+    """Exact brute force over an in-memory float32 matrix; not persisted (tests, evaluation, small tenants)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._ids: List[str] = []
+        self._contents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}  # Metadata field -> value per row, built on first filter
+
+    def _store_vectors(self, start: int, vectors: np.ndarray) -> None:
+        if self._size and vectors.shape[1] != self._vectors.shape[1]:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} != store dimension {self._vectors.shape[1]}")
+        end = start + len(vectors)
+        if end > len(self._vectors):
+            grown = np.empty((max(1024, 2 * end), vectors.shape[1]), dtype=np.float32)
+            if start:
+                grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:end] = vectors
+
+    def add(self, ids, vectors, contents, metadatas) -> None:
+        vectors = _normalized(vectors)
+        with self._lock:
+            start, end = self._size, self._size + len(vectors)
+            self._store_vectors(start, vectors)
+            if end > len(self._alive):
+                self._alive = np.concatenate([self._alive, np.zeros(max(1024, end), dtype=bool)])
+            self._alive[start:end] = True
+            self._size = end
+            for offset, chunk in enumerate(ids):
+                self._rows[chunk] = start + offset
+            self._ids.extend(ids)
+            self._contents.extend(contents)
+            self._metadatas.extend(dict(metadata or {}) for metadata in metadatas)
+            self._columns.clear()
+
+    def upsert(self, ids, vectors, contents, metadatas) -> None:
+        with self._lock:
+            self.delete(ids=ids)
+            self.add(ids, vectors, contents, metadatas)
+
+    def delete(self, ids=None, where=None) -> None:
+        with self._lock:
+            rows = [self._rows[chunk] for chunk in (ids or []) if chunk in self._rows]
+            if where:
+                rows.extend(self._allowed_rows(where))
+            for row in rows:
+                self._alive[row] = False
+                self._rows.pop(self._ids[row], None)
+
+    def _allowed_rows(self, where: Optional[Where]) -> Optional[np.ndarray]:
+        """Live rows matching `where`; None when that is every row"""
+        if where:
+            mask = self._alive[:self._size].copy()
+            for key, expected in where.items():
+                if key not in self._columns:
+                    column = np.empty(self._size, dtype=object)
+                    column[:] = [metadata.get(key) for metadata in self._metadatas]
+                    self._columns[key] = column
+                column = self._columns[key]
+                if isinstance(expected, (list, tuple, set)):
+                    accepted = set(expected)
+                    mask &= np.fromiter((value in accepted for value in column), dtype=bool, count=self._size)
+                else:
+                    mask &= column == expected
+            return np.flatnonzero(mask).astype(np.int64)
+        if len(self._rows) < self._size:
+            return np.flatnonzero(self._alive[:self._size]).astype(np.int64)
+        return None
+
+    def _hit(self, row: int, score: float) -> Hit:
+        return {"id": self._ids[row], "content": self._contents[row], "metadata": self._metadatas[row], "score": score}
+
+    def query(self, vector, k, where=None) -> List[Hit]:
+        query = _normalized(vector)[0]
+        with self._lock:
+            if not self._rows:
+                return []
+            rows = self._allowed_rows(where)
+            if rows is None:
+                rows = np.arange(self._size)
+                scores = self._vectors[:self._size] @ query
+            else:
+                scores = self._vectors[rows] @ query
+            if len(rows) == 0:
+                return []
+            best = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [self._hit(int(rows[i]), float(scores[i])) for i in best]
+
+    def get(self, ids) -> List[Hit]:
+        with self._lock:
+            return [self._hit(self._rows[chunk], 0) for chunk in ids if chunk in self._rows]
+
+    def count(self, where=None) -> int:
+        with self._lock:
+            return len(self._allowed_rows(where)) if where else len(self._rows)
+
+
+class FaissStore(NumpyStore):
+    """
+    A FAISS index (FAISS_INDEX_FACTORY, inner product) instead of the NumPy
+    matrix, with the same in-memory records; not persisted. Deleted and
+    filtered-out rows are excluded with an id selector, so the index is
+    never rebuilt
+    """
+
+    def __init__(self):
+        if faiss is None:
+            raise RuntimeError("faiss is not installed; set VECTOR_BACKEND to another backend")
+        super().__init__()
+        self._index = None
+
+    def _store_vectors(self, start: int, vectors: np.ndarray) -> None:
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(
+                faiss.index_factory(vectors.shape[1], settings.FAISS_INDEX_FACTORY, faiss.METRIC_INNER_PRODUCT)
+            )
+        if not self._index.is_trained:
+            self._index.train(vectors)  # IVF factories train on the first batch
+        self._index.add_with_ids(vectors, np.arange(start, start + len(vectors), dtype=np.int64))
+
+    def query(self, vector, k, where=None) -> List[Hit]:
+        query = _normalized(vector)
+        with self._lock:
+            if self._index is None:
+                return []
+            params = None
+            allowed = self._allowed_rows(where)
+            if allowed is not None:
+                if len(allowed) == 0:
+                    return []
+                params = faiss.SearchParameters()
+                params.sel = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+            scores, rows = self._index.search(query, k, params=params)
+            return [self._hit(int(row), float(score)) for row, score in zip(rows[0], scores[0]) if row >= 0]
+
+
+_memory_stores: Dict[str, NumpyStore] = {}
+_memory_stores_lock = threading.Lock()
+
+
+def create_vector_store(collection_name: str, backend: Optional[str] = None) -> VectorStore:
+    """The collection in VECTOR_BACKEND (or `backend`); in-memory collections live for the process"""
+    backend = backend or settings.VECTOR_BACKEND
+    if backend == "chroma":
+        return ChromaStore(collection_name, settings.VECTOR_STORE_PATH)
+    if backend == "quantized":
+        return QuantizedStore(collection_name, settings.VECTOR_STORE_PATH)
+    if backend in ("memory", "faiss"):
+        with _memory_stores_lock:
+            key = f"{backend}:{collection_name}"
+            if key not in _memory_stores:
+                _memory_stores[key] = FaissStore() if backend == "faiss" else NumpyStore()
+            return _memory_stores[key]
+    raise ValueError(f"Unknown VECTOR_BACKEND {backend!r}; expected one of {', '.join(VECTOR_BACKENDS)}")
@@ -0,0 +1,171 @@
+"""
+Throughput and peak memory of the streaming document loaders
+Generates large synthetic DOCX, PPTX and JSON files (no fixtures needed),
+runs each through its loader and reports sections/sec, MB/sec and peak
+Python heap (tracemalloc). Where python-docx is installed the DOCX file is
+also loaded with it, as the whole-tree baseline
+
+Usage (from backend/):
+    python -m benchmarks.document_loaders --paragraphs 50000 --slides 1000 --records 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from typing import Callable, Dict, Iterable
+from xml.sax.saxutils import escape
+
+from app.services.document_loaders import detect_format, load_document
+
+WORDS = ("revenue margin forecast customer pipeline budget invoice quarter growth region "
+         "supplier contract churn retention headcount payroll capex opex audit").split()
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+</Types>"""
+_W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+_P_NS = ('xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+         'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"')
+_RELS_NS = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _sentence(rng: random.Random, words: int = 18) -> str:
+    return escape(" ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + ".")
+
+
+def make_docx(path: str, paragraphs: int, rng: random.Random) -> None:
+    """Headings every 20 paragraphs and a 6x4 table every 50"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        # Package parts python-docx needs to open the file for the baseline
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES.replace(
+            "</Types>",
+            '<Override PartName="/word/document.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+        ))
+        archive.writestr(
+            "_rels/.rels",
+            f'<Relationships {_RELS_NS}><Relationship Id="rId1" Type="{_REL_TYPE}/officeDocument" Target="word/document.xml"/></Relationships>'
+        )
+        with archive.open("word/document.xml", "w") as xml:
+            xml.write(f'<?xml version="1.0" encoding="UTF-8"?><w:document {_W_NS}><w:body>'.encode())
+            for index in range(paragraphs):
+                if index % 20 == 0:
+                    xml.write(f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Section {index // 20}</w:t></w:r></w:p>'.encode())
+                xml.write(f"<w:p><w:r><w:t>{_sentence(rng)}</w:t></w:r></w:p>".encode())
+                if index % 50 == 49:
+                    rows = "".join(
+                        "<w:tr>" + "".join(f"<w:tc><w:p><w:r><w:t>{rng.randint(0, 99999)}</w:t></w:r></w:p></w:tc>" for _ in range(4)) + "</w:tr>"
+                        for _ in range(6)
+                    )
+                    xml.write(f"<w:tbl>{rows}</w:tbl>".encode())
+            xml.write(b"</w:body></w:document>")
+
+
+def _text_shape(text: str, placeholder: str = "") -> str:
+    ph = f'<p:nvPr><p:ph type="{placeholder}"/></p:nvPr>' if placeholder else "<p:nvPr/>"
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="1" name="s"/><p:cNvSpPr/>{ph}</p:nvSpPr>'
+            f"<p:txBody><a:p><a:r><a:t>{text}</a:t></a:r></a:p></p:txBody></p:sp>")
+
+
+def make_pptx(path: str, slides: int, rng: random.Random) -> None:
+    """Title + 5 bullets per slide, a table on every 4th slide, speaker notes on each"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        ids = "".join(f'<p:sldId id="{256 + n}" r:id="rId{n}"/>' for n in range(1, slides + 1))
+        archive.writestr("ppt/presentation.xml", f"<p:presentation {_P_NS}><p:sldIdLst>{ids}</p:sldIdLst></p:presentation>")
+        rels = "".join(f'<Relationship Id="rId{n}" Type="{_REL_TYPE}/slide" Target="slides/slide{n}.xml"/>' for n in range(1, slides + 1))
+        archive.writestr("ppt/_rels/presentation.xml.rels", f"<Relationships {_RELS_NS}>{rels}</Relationships>")
+        for n in range(1, slides + 1):
+            shapes = _text_shape(f"Slide {n}: {_sentence(rng, 5)}") + "".join(_text_shape(_sentence(rng)) for _ in range(5))
+            if n % 4 == 0:
+                rows = "".join("<a:tr>" + "".join(f"<a:tc><a:txBody><a:p><a:r><a:t>{rng.randint(0, 9999)}</a:t></a:r></a:p></a:txBody></a:tc>" for _ in range(4)) + "</a:tr>" for _ in range(5))
+                shapes += f"<p:graphicFrame><a:graphic><a:graphicData><a:tbl>{rows}</a:tbl></a:graphicData></a:graphic></p:graphicFrame>"
+            archive.writestr(f"ppt/slides/slide{n}.xml", f"<p:sld {_P_NS}><p:cSld><p:spTree>{shapes}</p:spTree></p:cSld></p:sld>")
+            archive.writestr(
+                f"ppt/slides/_rels/slide{n}.xml.rels",
+                f'<Relationships {_RELS_NS}><Relationship Id="rId1" Type="{_REL_TYPE}/notesSlide" Target="../notesSlides/notesSlide{n}.xml"/></Relationships>'
+            )
+            notes = _text_shape(_sentence(rng, 30)) + _text_shape(str(n), "sldNum")
+            archive.writestr(f"ppt/notesSlides/notesSlide{n}.xml", f"<p:notes {_P_NS}><p:cSld><p:spTree>{notes}</p:spTree></p:cSld></p:notes>")
+
+
+def make_json(path: str, records: int, rng: random.Random) -> None:
+    """Top-level array of nested invoice records"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for index in range(records):
+            record = {
+                "invoice": f"INV-{index:07d}",
+                "customer": {"name": f"Customer {rng.randint(1, 5000)}", "address": {"city": rng.choice(["Austin", "Denver", "Boston"])}},
+                "lines": [{"sku": f"SKU-{rng.randint(1, 999)}", "amount": round(rng.uniform(10, 5000), 2)} for _ in range(3)],
+                "status": rng.choice(["paid", "pending", "overdue"]),
+            }
+            f.write(("," if index else "") + json.dumps(record) + "\n")
+        f.write("]\n")
+
+
+def _measure(label: str, path: str, run: Callable[[], Iterable]) -> Dict[str, float]:
+    """Timed run, then a second run under tracemalloc (which slows allocation) for the peak"""
+    start = time.perf_counter()
+    sections = sum(1 for _ in run())
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    for _ in run():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"{label:<22}{size_mb:>9.1f}{sections:>10}{sections / elapsed:>14.0f}{size_mb / elapsed:>10.1f}{peak / 1e6:>12.1f}")
+    return {"sections": sections, "seconds": elapsed, "peak_mb": peak / 1e6}
+
+
+def _python_docx_paragraphs(path: str) -> Iterable:
+    import docx
+
+    document = docx.Document(path)
+    return [paragraph.text for paragraph in document.paragraphs]
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as folder:
+        files = {
+            "docx": os.path.join(folder, "report.docx"),
+            "pptx": os.path.join(folder, "deck.pptx"),
+            "json": os.path.join(folder, "invoices.json"),
+        }
+        make_docx(files["docx"], args.paragraphs, rng)
+        make_pptx(files["pptx"], args.slides, rng)
+        make_json(files["json"], args.records, rng)
+
+        print(f"{'loader':<22}{'file MB':>9}{'sections':>10}{'sections/sec':>14}{'MB/sec':>10}{'peak MB':>12}")
+        for name, path in files.items():
+            # Extension-less copy name: detection must come from the content
+            assert detect_format(path, "upload.bin") == name, name
+            _measure(f"{name} (streaming)", path, lambda path=path: load_document(path))
+
+        try:
+            import docx  # noqa: F401
+        except ImportError:
+            print("\npython-docx not installed; skipping the whole-tree baseline")
+        else:
+            _measure("docx (python-docx)", files["docx"], lambda: _python_docx_paragraphs(files["docx"]))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=50000)
+    parser.add_argument("--slides", type=int, default=1000)
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,144 @@
+"""
+Latency distribution per model route, against a local LLM stub
+The stub sleeps for a per-model time-to-first-token plus per-token decode time,
+so the run needs no API key and shows what routing saves relative to sending
+every query to the large model with a 2000 token budget
+
+Usage (from backend/):
+    python -m benchmarks.llm_routing --queries 400 --time-scale 0.02
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List
+
+from app.core.config import settings
+from app.models.enterprise_query import QueryType, QueryComplexity
+from app.services.model_router import ModelRouter, default_routes
+
+# Simulated (time to first token ms, decode ms per token) per model
+MODEL_PROFILES = {
+    settings.LLM_FAST_MODEL: (180, 9),
+    settings.LLM_MODEL: (650, 38),
+}
+
+# Share of traffic per (type, complexity), roughly what the query log shows
+WORKLOAD = [
+    (QueryType.SIMPLE, QueryComplexity.LOW, 0.50),
+    (QueryType.SIMPLE, QueryComplexity.MEDIUM, 0.10),
+    (QueryType.ANALYTICAL, QueryComplexity.MEDIUM, 0.20),
+    (QueryType.FINANCIAL, QueryComplexity.HIGH, 0.15),
+    (QueryType.OPERATIONAL, QueryComplexity.CRITICAL, 0.05),
+]
+
+# Typical answer length in tokens per template
+ANSWER_TOKENS = {"concise": 90, "executive": 700, "financial": 900}
+
+
+class StubCompletions:
+    def __init__(self, time_scale: float, low_confidence_rate: float, rng: random.Random):
+        self.time_scale = time_scale
+        self.low_confidence_rate = low_confidence_rate
+        self.rng = rng
+
+    async def create(self, model: str, messages: List[Dict[str, str]], max_tokens: int, **kwargs):
+        prompt = messages[-1]["content"]
+        template = prompt.split(":", 1)[0]
+        tokens = min(max_tokens, max(1, int(self.rng.gauss(ANSWER_TOKENS.get(template, 500), 60))))
+        first_token_ms, per_token_ms = MODEL_PROFILES.get(model, MODEL_PROFILES[settings.LLM_MODEL])
+        await asyncio.sleep((first_token_ms + tokens * per_token_ms) * self.time_scale / 1000)
+
+        logprobs = None
+        if kwargs.get("logprobs"):
+            unsure = self.rng.random() < self.low_confidence_rate
+            mean = -1.2 if unsure else -0.05
+            logprobs = SimpleNamespace(content=[SimpleNamespace(logprob=mean) for _ in range(min(tokens, 50))])
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"stub answer ({model})"), logprobs=logprobs)],
+            usage=SimpleNamespace(total_tokens=tokens + len(prompt) // 4)
+        )
+
+
+def stub_client(time_scale: float, low_confidence_rate: float, seed: int) -> SimpleNamespace:
+    completions = StubCompletions(time_scale, low_confidence_rate, random.Random(seed))
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def _workload(count: int, seed: int) -> List[Dict[str, object]]:
+    rng = random.Random(seed)
+    kinds = [(t, c) for t, c, _ in WORKLOAD]
+    weights = [w for _, _, w in WORKLOAD]
+    return [{"type": t, "complexity": c} for t, c in rng.choices(kinds, weights, k=count)]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _run(router: ModelRouter, workload: List[Dict[str, object]], time_scale: float,
+               concurrency: int) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(analysis: Dict[str, object]) -> None:
+        async with gate:
+            result = await router.generate(analysis, lambda template: f"{template}: question")
+        label = result["route"] if "escalated_from" not in result else f"{result['escalated_from']}->{result['route']}"
+        simulated_ms = result["latency_ms"] / time_scale
+        latencies[label].append(simulated_ms)
+        latencies["ALL"].append(simulated_ms)
+
+    await asyncio.gather(*(one(analysis) for analysis in workload))
+    return latencies
+
+
+def _report(title: str, latencies: Dict[str, List[float]]) -> None:
+    print(f"\n{title}")
+    print(f"{'route':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for label in sorted(latencies, key=lambda name: (name == "ALL", name)):
+        values = latencies[label]
+        print(f"{label:<22}{len(values):>6}{_percentile(values, 0.5):>10.0f}"
+              f"{_percentile(values, 0.95):>10.0f}{statistics.mean(values):>10.0f}")
+
+
+async def main(args: argparse.Namespace) -> int:
+    workload = _workload(args.queries, args.seed)
+
+    # Previous behaviour: every query on the large model with max_tokens=2000,
+    # financial questions on the financial template, everything else executive
+    routes = default_routes()
+    baseline = ModelRouter(
+        client=stub_client(args.time_scale, args.low_confidence_rate, args.seed),
+        routes={
+            "standard": {**routes["deep"], "max_tokens": 2000},
+            "financial": {**routes["financial"], "max_tokens": 2000},
+        },
+        routing_table={}
+    )
+    routed = ModelRouter(client=stub_client(args.time_scale, args.low_confidence_rate, args.seed))
+
+    before = await _run(baseline, workload, args.time_scale, args.concurrency)
+    after = await _run(routed, workload, args.time_scale, args.concurrency)
+
+    _report("Single model (before)", before)
+    _report("Routed by complexity (after)", after)
+    print(f"\n⚡ p50 {_percentile(before['ALL'], 0.5):.0f} ms -> {_percentile(after['ALL'], 0.5):.0f} ms, "
+          f"mean {statistics.mean(before['ALL']):.0f} ms -> {statistics.mean(after['ALL']):.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--time-scale", type=float, default=0.02, help="Fraction of simulated time actually slept")
+    parser.add_argument("--low-confidence-rate", type=float, default=0.15,
+                        help="Share of fast answers the stub makes unsure, to exercise escalation")
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,107 @@
+"""
+PDF extraction throughput, single process vs page-parallel
+Runs the pipeline over a PDF with 1 worker and with N workers and reports
+pages/sec, pages/sec/core and tables found. Without --pdf, a synthetic
+annual-report-like PDF (prose plus ruled and unruled financial tables) is
+generated with reportlab
+
+Usage (from backend/):
+    python -m benchmarks.pdf_pipeline --pages 400 --workers 4
+    python -m benchmarks.pdf_pipeline --pdf annual_report.pdf
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app.services.pdf_pipeline import PdfPipeline
+
+WORDS = ("revenue margin forecast customer pipeline budget invoice quarter growth region "
+         "supplier contract churn retention headcount payroll capex opex audit").split()
+LINE_ITEMS = ["Revenue", "Cost of sales", "Gross profit", "Operating expenses", "EBITDA", "Net income"]
+
+
+def make_report(path: str, pages: int, seed: int) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    width, height = A4
+    pdf = canvas.Canvas(path, pagesize=A4)
+    for number in range(1, pages + 1):
+        y = height - 60
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(50, y, f"Section {number}: {rng.choice(WORDS).title()} review")
+        pdf.setFont("Helvetica", 10)
+        for _ in range(18):
+            y -= 14
+            pdf.drawString(50, y, " ".join(rng.choice(WORDS) for _ in range(14)))
+
+        y -= 30
+        ruled = number % 2 == 0
+        columns = [50, 230, 330, 430, 530]
+        top = y + 10
+        pdf.drawString(columns[1] + 5, y, "FY2023")
+        pdf.drawString(columns[2] + 5, y, "FY2024")
+        pdf.drawString(columns[3] + 5, y, "Change")
+        for item in LINE_ITEMS:
+            y -= 16
+            before, after = rng.randint(1000, 90000), rng.randint(1000, 90000)
+            pdf.drawString(columns[0] + 5, y, item)
+            pdf.drawString(columns[1] + 5, y, f"{before:,}")
+            pdf.drawString(columns[2] + 5, y, f"{after:,}")
+            pdf.drawString(columns[3] + 5, y, f"{(after - before) / before * 100:.1f}%")
+        if ruled:
+            bottom = y - 6
+            for x in columns:
+                pdf.line(x, top, x, bottom)
+            for row in range(len(LINE_ITEMS) + 2):
+                pdf.line(columns[0], top - row * 16, columns[-1], top - row * 16)
+        pdf.showPage()
+    pdf.save()
+
+
+def _run(path: str, workers: int) -> None:
+    pipeline = PdfPipeline(workers=workers)
+    try:
+        if workers > 1:
+            # Start the pool outside the timing, as a long-running server would have it warm
+            list(pipeline._executor().map(abs, range(workers)))
+        start = time.perf_counter()
+        pages = list(pipeline.pages(path))
+        elapsed = time.perf_counter() - start
+    finally:
+        pipeline.shutdown()
+    report = pipeline.report()
+    tables = sum(len(page["tables"]) for page in pages)
+    print(f"{workers:>8}{len(pages):>8}{tables:>8}{elapsed:>10.2f}{len(pages) / elapsed:>12.1f}"
+          f"{report['pages_per_sec_per_core']:>16.1f}")
+
+
+def main(args: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory() as folder:
+        path = args.pdf
+        if path is None:
+            try:
+                path = os.path.join(folder, "report.pdf")
+                make_report(path, args.pages, args.seed)
+            except ImportError:
+                print("reportlab is not installed: pass --pdf with a real document")
+                return 1
+
+        print(f"{'workers':>8}{'pages':>8}{'tables':>8}{'seconds':>10}{'pages/sec':>12}{'pages/sec/core':>16}")
+        _run(path, 1)
+        if args.workers > 1:
+            _run(path, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to extract (default: a generated report)")
+    parser.add_argument("--pages", type=int, default=120)
+    parser.add_argument("--workers", type=int, default=max(2, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,167 @@
+"""
+Vector search at scale: quantized IVF index vs float32 and Chroma
+Builds each backend over the same synthetic, clustered embeddings and
+reports recall@k against exact float32 search, p50/p99 query latency and
+the memory of a fresh process that opens the built index and serves the
+queries: peak RSS, and the anonymous part of it (memory-mapped index pages
+are clean page cache the kernel can drop, heap memory is not). Chroma is included when chromadb is installed; otherwise the
+in-RAM float32 brute force stands in as the baseline
+
+Usage (from backend/):
+    python -m benchmarks.quantized_index --chunks 1000000 --dim 1536
+    python -m benchmarks.quantized_index --chunks 200000 --nprobe 8 16 32
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BATCH = 50000
+
+
+def make_embeddings(path: str, chunks: int, dim: int, seed: int) -> None:
+    """Normalized vectors around a few thousand topics, like chunks of many documents"""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(16, chunks // 250), dim)).astype(np.float32)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(chunks, dim))
+    for start in range(0, chunks, BATCH):
+        size = min(BATCH, chunks - start)
+        batch = topics[rng.integers(0, len(topics), size)] + 1.5 * rng.standard_normal((size, dim)).astype(np.float32)
+        out[start:start + size] = batch / np.linalg.norm(batch, axis=1, keepdims=True)
+    out.flush()
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = np.concatenate([queries @ vectors[start:start + BATCH].T for start in range(0, len(vectors), BATCH)], axis=1)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _memory_mb() -> dict:
+    """Peak and anonymous RSS; ru_maxrss would include the parent's peak, as it survives exec on Linux"""
+    memory = {"rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "anon_mb": float("nan")}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    memory["rss_mb"] = int(line.split()[1]) / 1024
+                elif line.startswith("RssAnon:"):
+                    memory["anon_mb"] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def _serve(name, folder, queries, k, nprobe, result_queue):
+    """Runs in a fresh process: open the built backend, answer every query, report latency and RSS"""
+    if name == "float32":
+        vectors = np.load(os.path.join(folder, "embeddings.npy"))  # Brute force holds everything in RAM
+        search = lambda q: np.argsort(-(vectors @ q))[:k]  # noqa: E731
+    elif name == "quantized":
+        from app.services.quantized_index import QuantizedIndex
+        index = QuantizedIndex(os.path.join(folder, "quantized"))
+
+        def search(query):
+            rows = [row for row, _ in index.search(query, k, nprobe=nprobe)]
+            records = index.records(rows)  # Compaction renumbers rows; results are compared by chunk id
+            return [int(records[row]["id"]) for row in rows]
+    else:
+        import chromadb
+        collection = chromadb.PersistentClient(path=os.path.join(folder, "chroma")).get_collection("bench")
+        search = lambda q: [int(i) for i in collection.query(query_embeddings=[q.tolist()], n_results=k)["ids"][0]]  # noqa: E731
+
+    found, latencies = [], []
+    for query in queries:
+        began = time.perf_counter()
+        found.append(list(search(query)))
+        latencies.append((time.perf_counter() - began) * 1000)
+    result_queue.put({"found": found, "latencies": latencies, **_memory_mb()})
+
+
+def _build(name, folder, result_queue):
+    embeddings = np.load(os.path.join(folder, "embeddings.npy"), mmap_mode="r")
+    began = time.perf_counter()
+    if name == "quantized":
+        from app.services.quantized_index import QuantizedIndex
+        index = QuantizedIndex(os.path.join(folder, "quantized"))
+        for start in range(0, len(embeddings), BATCH):
+            batch = np.asarray(embeddings[start:start + BATCH])
+            ids = [str(start + i) for i in range(len(batch))]
+            index.add(ids, batch, [""] * len(batch), [{}] * len(batch))
+    elif name == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=os.path.join(folder, "chroma")).create_collection(
+            "bench", metadata={"hnsw:space": "ip"}
+        )
+        for start in range(0, len(embeddings), 5000):
+            batch = np.asarray(embeddings[start:start + 5000])
+            collection.add(ids=[str(start + i) for i in range(len(batch))], embeddings=batch.tolist())
+    result_queue.put({"build_s": time.perf_counter() - began})
+
+
+def _in_process(target, *args):
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=target, args=(*args, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def _disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1e6
+
+
+def main(args) -> int:
+    backends = ["float32", "quantized"]
+    try:
+        import chromadb  # noqa: F401
+        backends.append("chroma")
+    except ImportError:
+        print("chromadb not installed; comparing against in-RAM float32 brute force only\n")
+
+    with tempfile.TemporaryDirectory() as folder:
+        embeddings_path = os.path.join(folder, "embeddings.npy")
+        make_embeddings(embeddings_path, args.chunks, args.dim, args.seed)
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        rng = np.random.default_rng(args.seed + 1)
+        # Queries are perturbed copies of stored chunks, as a question is close to the passage answering it
+        queries = np.asarray(embeddings[rng.integers(0, args.chunks, args.queries)])
+        queries = queries + 0.8 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+        truth = exact_top_k(embeddings, queries, args.k)
+        print(f"{args.chunks:,} chunks x {args.dim} dims, {args.queries} queries, k={args.k} "
+              f"(float32 embeddings: {embeddings.nbytes / 1e6:,.0f} MB)\n")
+
+        print(f"{'backend':<22}{'build s':>9}{'disk MB':>10}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'peak RSS MB':>13}{'anon MB':>9}")
+        for name in backends:
+            build_s = _in_process(_build, name, folder)["build_s"] if name != "float32" else 0.0
+            disk = _disk_mb(os.path.join(folder, name)) if name != "float32" else embeddings.nbytes / 1e6
+            for nprobe in (args.nprobe if name == "quantized" else [None]):
+                served = _in_process(_serve, name, folder, queries, args.k, nprobe)
+                recall = np.mean([len(set(found) & set(expected)) / args.k
+                                  for found, expected in zip(served["found"], truth.tolist())])
+                latencies = np.asarray(served["latencies"])
+                label = f"{name} (nprobe={nprobe})" if nprobe else name
+                print(f"{label:<22}{build_s:>9.1f}{disk:>10,.0f}{recall:>10.3f}"
+                      f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 99):>9.2f}{served['rss_mb']:>13,.0f}{served['anon_mb']:>9,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(main(parser.parse_args()))
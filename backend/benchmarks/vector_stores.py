@@ -0,0 +1,130 @@
+"""
+VectorStore backends on the same synthetic corpus
+Loads a reproducible corpus (clustered embeddings, document/fiscal period/
+category metadata like ingested chunks) into every available backend and
+reports ingest throughput, then query latency percentiles and recall@k
+against exact search, without and with a fiscal period filter. Backends
+whose library is not installed (chromadb, faiss) are skipped
+
+Usage (from backend/):
+    python -m benchmarks.vector_stores --chunks 200000 --dim 384
+    python -m benchmarks.vector_stores --backends memory quantized --queries 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import vector_store
+from benchmarks.quantized_index import make_embeddings
+
+PERIODS = ["FY2019", "FY2020", "FY2021", "FY2022", "FY2023", "FY2024"]
+CATEGORIES = ["financial", "accounting", "budget", "hr", "legal", "operations"]
+CHUNKS_PER_DOCUMENT = 40
+
+
+def make_metadata(chunks: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    documents = chunks // CHUNKS_PER_DOCUMENT + 1
+    periods = rng.integers(0, len(PERIODS), documents)
+    categories = rng.integers(0, len(CATEGORIES), documents)
+    return [
+        {
+            "document_id": int(i // CHUNKS_PER_DOCUMENT),
+            "fiscal_period": PERIODS[periods[i // CHUNKS_PER_DOCUMENT]],
+            "category": CATEGORIES[categories[i // CHUNKS_PER_DOCUMENT]],
+            "chunk_index": int(i % CHUNKS_PER_DOCUMENT),
+        }
+        for i in range(chunks)
+    ]
+
+
+def open_backend(name: str, folder: str):
+    if name == "memory":
+        return vector_store.NumpyStore()
+    if name == "faiss":
+        return vector_store.FaissStore()
+    if name == "quantized":
+        return vector_store.QuantizedStore("bench", folder)
+    return vector_store.ChromaStore("bench", os.path.join(folder, "chroma"))
+
+
+def available(name: str) -> bool:
+    if name == "chroma":
+        return vector_store.chromadb is not None
+    if name == "faiss":
+        return vector_store.faiss is not None
+    return True
+
+
+def main(args) -> int:
+    embeddings_file = tempfile.NamedTemporaryFile(suffix=".npy", delete=False)
+    embeddings_file.close()
+    try:
+        make_embeddings(embeddings_file.name, args.chunks, args.dim, args.seed)
+        embeddings = np.load(embeddings_file.name)
+    finally:
+        os.remove(embeddings_file.name)
+    metadatas = make_metadata(args.chunks, args.seed)
+    ids = [f"{metadata['document_id']}:{metadata['chunk_index']}" for metadata in metadatas]
+    contents = [f"chunk {chunk}" for chunk in ids]
+
+    rng = np.random.default_rng(args.seed + 1)
+    queries = embeddings[rng.integers(0, args.chunks, args.queries)]
+    queries = queries + 0.8 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    filters = [{"fiscal_period": PERIODS[i]} for i in rng.integers(0, len(PERIODS), args.queries)]
+
+    # Exact answers: brute force over the (filtered) corpus
+    periods = np.asarray([metadata["fiscal_period"] for metadata in metadatas])
+    scores = queries @ embeddings.T
+    truth = {
+        "unfiltered": [set(np.argsort(-row)[:args.k]) for row in scores],
+        "fiscal_period": [set(np.argsort(-np.where(periods == where["fiscal_period"], row, -np.inf))[:args.k])
+                          for row, where in zip(scores, filters)],
+    }
+    row_of = {chunk: row for row, chunk in enumerate(ids)}
+    print(f"{args.chunks:,} chunks x {args.dim} dims, {args.queries} queries per set, k={args.k}\n")
+
+    print(f"{'backend':<11}{'ingest/s':>10}  {'queries':<15}{'recall@k':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name in args.backends:
+        if not available(name):
+            print(f"{name:<11}{'skipped (library not installed)':>40}")
+            continue
+        with tempfile.TemporaryDirectory() as folder:
+            store = open_backend(name, folder)
+            began = time.perf_counter()
+            for start in range(0, args.chunks, args.batch):
+                end = start + args.batch
+                store.upsert(ids[start:end], embeddings[start:end], contents[start:end], metadatas[start:end])
+            ingest_rate = args.chunks / (time.perf_counter() - began)
+            assert store.count() == args.chunks
+
+            for label, where_of in (("unfiltered", lambda i: None), ("fiscal_period", lambda i: filters[i])):
+                latencies, recalls = [], []
+                for i, query in enumerate(queries):
+                    began = time.perf_counter()
+                    hits = store.query(query, args.k, where_of(i))
+                    latencies.append((time.perf_counter() - began) * 1000)
+                    recalls.append(len({row_of[hit["id"]] for hit in hits} & truth[label][i]) / args.k)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                first = label == "unfiltered"
+                print(f"{name if first else '':<11}{f'{ingest_rate:,.0f}' if first else '':>10}  "
+                      f"{label:<15}{np.mean(recalls):>9.3f}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(vector_store.VECTOR_BACKENDS[::-1]),
+                        choices=vector_store.VECTOR_BACKENDS)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1000, help="chunks per upsert (about one document's worth is 40)")
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,242 @@
+"""initial schema
+
+Baseline of the tables previously created by Base.metadata.create_all.
+Databases that were bootstrapped with create_all already have these tables;
+for them this revision is a no-op and only records the version.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Adopt databases created by create_all before migrations existed
+    if sa.inspect(op.get_bind()).has_table("enterprises"):
+        return
+
+    op.create_table("departments",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("enterprise_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("code", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("specialized_instructions", sa.Text(), nullable=True),
+        sa.Column("allowed_data_types", sa.JSON(), nullable=True),
+        sa.Column("can_access_all_data", sa.Boolean(), nullable=True),
+        sa.Column("restricted_keywords", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_departments_enterprise_id"), "departments", ["enterprise_id"], unique=False)
+    op.create_index(op.f("ix_departments_id"), "departments", ["id"], unique=False)
+
+    op.create_table("enterprises",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("slug", sa.String(), nullable=False),
+        sa.Column("industry", sa.String(), nullable=True),
+        sa.Column("company_size", sa.String(), nullable=True),
+        sa.Column("headquarters", sa.String(), nullable=True),
+        sa.Column("website", sa.String(), nullable=True),
+        sa.Column("company_description", sa.Text(), nullable=True),
+        sa.Column("business_context", sa.Text(), nullable=True),
+        sa.Column("ai_instructions", sa.Text(), nullable=True),
+        sa.Column("primary_color", sa.String(), nullable=True),
+        sa.Column("secondary_color", sa.String(), nullable=True),
+        sa.Column("logo_url", sa.String(), nullable=True),
+        sa.Column("brand_guidelines", sa.Text(), nullable=True),
+        sa.Column("fiscal_year_start", sa.Integer(), nullable=True),
+        sa.Column("currency", sa.String(), nullable=True),
+        sa.Column("timezone", sa.String(), nullable=True),
+        sa.Column("date_format", sa.String(), nullable=True),
+        sa.Column("connected_systems", sa.JSON(), nullable=True),
+        sa.Column("data_refresh_schedule", sa.String(), nullable=True),
+        sa.Column("last_data_sync", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("max_documents", sa.Integer(), nullable=True),
+        sa.Column("max_users", sa.Integer(), nullable=True),
+        sa.Column("max_queries_per_day", sa.Integer(), nullable=True),
+        sa.Column("max_file_size_mb", sa.Integer(), nullable=True),
+        sa.Column("enable_analytics", sa.Boolean(), nullable=True),
+        sa.Column("enable_auto_reports", sa.Boolean(), nullable=True),
+        sa.Column("report_recipients", sa.JSON(), nullable=True),
+        sa.Column("enable_audit_log", sa.Boolean(), nullable=True),
+        sa.Column("data_retention_days", sa.Integer(), nullable=True),
+        sa.Column("enable_data_export", sa.Boolean(), nullable=True),
+        sa.Column("compliance_requirements", sa.JSON(), nullable=True),
+        sa.Column("subscription_plan", sa.String(), nullable=True),
+        sa.Column("billing_email", sa.String(), nullable=True),
+        sa.Column("monthly_query_limit", sa.Integer(), nullable=True),
+        sa.Column("overage_rate", sa.Float(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("is_trial", sa.Boolean(), nullable=True),
+        sa.Column("trial_expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_enterprises_id"), "enterprises", ["id"], unique=False)
+    op.create_index(op.f("ix_enterprises_slug"), "enterprises", ["slug"], unique=True)
+
+    op.create_table("users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("enterprise_id", sa.Integer(), nullable=False),
+        sa.Column("department_id", sa.Integer(), nullable=True),
+        sa.Column("role", sa.String(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("is_verified", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("last_login", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["department_id"], ["departments.id"], ),
+        sa.ForeignKeyConstraint(["enterprise_id"], ["enterprises.id"], ),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
+    op.create_index(op.f("ix_users_id"), "users", ["id"], unique=False)
+
+    op.create_table("documents",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("original_filename", sa.String(), nullable=False),
+        sa.Column("file_path", sa.String(), nullable=False),
+        sa.Column("file_size", sa.Integer(), nullable=True),
+        sa.Column("file_type", sa.String(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("enterprise_id", sa.Integer(), nullable=False),
+        sa.Column("department_id", sa.Integer(), nullable=True),
+        sa.Column("category", sa.String(), nullable=True),
+        sa.Column("tags", sa.JSON(), nullable=True),
+        sa.Column("is_confidential", sa.Boolean(), nullable=True),
+        sa.Column("fiscal_period", sa.String(), nullable=True),
+        sa.Column("processed", sa.Boolean(), nullable=True),
+        sa.Column("processing_status", sa.String(), nullable=True),
+        sa.Column("chunks_count", sa.Integer(), nullable=True),
+        sa.Column("processing_time_seconds", sa.Float(), nullable=True),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("metadata", sa.JSON(), nullable=True),
+        sa.Column("language", sa.String(), nullable=True),
+        sa.Column("content_hash", sa.String(), nullable=True),
+        sa.Column("access_level", sa.String(), nullable=True),
+        sa.Column("allowed_roles", sa.JSON(), nullable=True),
+        sa.Column("access_count", sa.Integer(), nullable=True),
+        sa.Column("last_accessed", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["department_id"], ["departments.id"], ),
+        sa.ForeignKeyConstraint(["enterprise_id"], ["enterprises.id"], ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_documents_id"), "documents", ["id"], unique=False)
+
+    op.create_table("enterprise_queries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("enterprise_id", sa.Integer(), nullable=False),
+        sa.Column("department_id", sa.Integer(), nullable=True),
+        sa.Column("original_query", sa.Text(), nullable=False),
+        sa.Column("processed_query", sa.Text(), nullable=True),
+        sa.Column("query_intent", sa.String(), nullable=True),
+        sa.Column("query_type", sa.String(), nullable=False),
+        sa.Column("complexity", sa.String(), nullable=False),
+        sa.Column("category", sa.String(), nullable=True),
+        sa.Column("subcategory", sa.String(), nullable=True),
+        sa.Column("entities_mentioned", sa.JSON(), nullable=True),
+        sa.Column("date_range_requested", sa.JSON(), nullable=True),
+        sa.Column("numerical_filters", sa.JSON(), nullable=True),
+        sa.Column("keywords_detected", sa.JSON(), nullable=True),
+        sa.Column("ai_response", sa.Text(), nullable=True),
+        sa.Column("response_format", sa.String(), nullable=True),
+        sa.Column("structured_data", sa.JSON(), nullable=True),
+        sa.Column("confidence_score", sa.Float(), nullable=True),
+        sa.Column("documents_used", sa.JSON(), nullable=True),
+        sa.Column("chunks_analyzed", sa.Integer(), nullable=True),
+        sa.Column("processing_time_ms", sa.Integer(), nullable=True),
+        sa.Column("tokens_used", sa.Integer(), nullable=True),
+        sa.Column("is_sensitive", sa.Boolean(), nullable=True),
+        sa.Column("requires_approval", sa.Boolean(), nullable=True),
+        sa.Column("is_starred", sa.Boolean(), nullable=True),
+        sa.Column("is_public", sa.Boolean(), nullable=True),
+        sa.Column("parent_query_id", sa.Integer(), nullable=True),
+        sa.Column("has_follow_ups", sa.Boolean(), nullable=True),
+        sa.Column("conversation_context", sa.JSON(), nullable=True),
+        sa.Column("user_satisfaction", sa.Integer(), nullable=True),
+        sa.Column("was_helpful", sa.Boolean(), nullable=True),
+        sa.Column("feedback_text", sa.Text(), nullable=True),
+        sa.Column("similar_queries_count", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("responded_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_accessed", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["department_id"], ["departments.id"], ),
+        sa.ForeignKeyConstraint(["enterprise_id"], ["enterprises.id"], ),
+        sa.ForeignKeyConstraint(["parent_query_id"], ["enterprise_queries.id"], ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_enterprise_queries_id"), "enterprise_queries", ["id"], unique=False)
+
+    op.create_table("saved_queries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("enterprise_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("query_template", sa.Text(), nullable=False),
+        sa.Column("parameters", sa.JSON(), nullable=True),
+        sa.Column("usage_count", sa.Integer(), nullable=True),
+        sa.Column("last_used", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("is_shared", sa.Boolean(), nullable=True),
+        sa.Column("shared_with_departments", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["enterprise_id"], ["enterprises.id"], ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_saved_queries_id"), "saved_queries", ["id"], unique=False)
+
+    op.create_table("query_exports",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("query_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("export_format", sa.String(), nullable=False),
+        sa.Column("export_filename", sa.String(), nullable=False),
+        sa.Column("file_size_bytes", sa.Integer(), nullable=True),
+        sa.Column("download_count", sa.Integer(), nullable=True),
+        sa.Column("is_confidential", sa.Boolean(), nullable=True),
+        sa.Column("access_level", sa.String(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("last_downloaded", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["query_id"], ["enterprise_queries.id"], ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_query_exports_id"), "query_exports", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_table("query_exports")
+    op.drop_table("saved_queries")
+    op.drop_table("enterprise_queries")
+    op.drop_table("documents")
+    op.drop_table("users")
+    op.drop_table("enterprises")
+    op.drop_table("departments")
@@ -0,0 +1,50 @@
+"""hot path indexes
+
+Composite and partial indexes matching the predicates of the enterprise,
+documents and analytics routers. Built CONCURRENTLY so existing tables stay
+writable while the indexes are created.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns, partial predicate)
+INDEXES = [
+    ("ix_documents_enterprise_created", "documents", "enterprise_id, created_at, id", None),
+    ("ix_documents_enterprise_category_processed", "documents", "enterprise_id, category", "processed = true"),
+    ("ix_documents_enterprise_processed", "documents", "enterprise_id, processed", None),
+    ("ix_documents_enterprise_department", "documents", "enterprise_id, department_id", None),
+    ("ix_enterprise_queries_enterprise_created", "enterprise_queries", "enterprise_id, created_at, id", None),
+    ("ix_enterprise_queries_enterprise_type_created", "enterprise_queries", "enterprise_id, query_type, created_at", None),
+    ("ix_enterprise_queries_enterprise_complexity_created", "enterprise_queries", "enterprise_id, complexity, created_at", None),
+    ("ix_enterprise_queries_enterprise_user_created", "enterprise_queries", "enterprise_id, user_id, created_at", None),
+    ("ix_enterprise_queries_rated", "enterprise_queries", "enterprise_id, created_at", "user_satisfaction IS NOT NULL"),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, predicate in INDEXES:
+            where = f" WHERE {predicate}" if predicate else ""
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}){where}")
+        op.execute("ANALYZE documents")
+        op.execute("ANALYZE enterprise_queries")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
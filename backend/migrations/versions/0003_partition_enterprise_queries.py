@@ -0,0 +1,136 @@
+"""partition enterprise_queries by month
+
+Rebuilds enterprise_queries as a table range-partitioned on created_at with
+one partition per month, so retention can drop whole months and dashboard
+scans only touch the partitions inside their date window.
+
+The primary key becomes (id, created_at) and the foreign keys pointing at
+enterprise_queries.id (parent_query_id, query_exports.query_id) are dropped,
+since PostgreSQL cannot reference a partitioned table by id alone.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_enterprise_queries_id", "id", None),
+    ("ix_enterprise_queries_enterprise_created", "enterprise_id, created_at, id", None),
+    ("ix_enterprise_queries_enterprise_type_created", "enterprise_id, query_type, created_at", None),
+    ("ix_enterprise_queries_enterprise_complexity_created", "enterprise_id, complexity, created_at", None),
+    ("ix_enterprise_queries_enterprise_user_created", "enterprise_id, user_id, created_at", None),
+    ("ix_enterprise_queries_rated", "enterprise_id, created_at", "user_satisfaction IS NOT NULL"),
+]
+
+MONTHS_AHEAD = 3
+
+
+# Partition helpers are inlined (not imported from app.services) so this revision stays frozen
+def month_start(value):
+    return value.replace(day=1)
+
+
+def add_months(value, months: int):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_ddl(table: str, month) -> str:
+    start = month_start(month)
+    end = add_months(start, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_p{start.year:04d}{start.month:02d} "
+        f"PARTITION OF {table} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def _drop_indexes() -> None:
+    for name, _, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _create_indexes() -> None:
+    for name, columns, predicate in INDEXES:
+        where = f" WHERE {predicate}" if predicate else ""
+        op.execute(f"CREATE INDEX {name} ON enterprise_queries ({columns}){where}")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    op.execute("ALTER TABLE query_exports DROP CONSTRAINT IF EXISTS query_exports_query_id_fkey")
+    op.execute("ALTER TABLE enterprise_queries DROP CONSTRAINT IF EXISTS enterprise_queries_parent_query_id_fkey")
+    op.execute("UPDATE enterprise_queries SET created_at = now() WHERE created_at IS NULL")
+
+    # Move the existing heap aside and free the index names
+    op.execute("ALTER TABLE enterprise_queries RENAME TO enterprise_queries_legacy")
+    op.execute("ALTER TABLE enterprise_queries_legacy RENAME CONSTRAINT enterprise_queries_pkey TO enterprise_queries_legacy_pkey")
+    _drop_indexes()
+
+    # Same columns and defaults (including the id sequence), partitioned by month
+    op.execute(
+        "CREATE TABLE enterprise_queries "
+        "(LIKE enterprise_queries_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE enterprise_queries ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE enterprise_queries ADD PRIMARY KEY (id, created_at)")
+    for column, target in (("user_id", "users"), ("enterprise_id", "enterprises"), ("department_id", "departments")):
+        op.execute(f"ALTER TABLE enterprise_queries ADD FOREIGN KEY ({column}) REFERENCES {target} (id)")
+
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM enterprise_queries_legacy")).scalar()
+    current = month_start(datetime.utcnow().date())
+    month = month_start(oldest.date()) if oldest else current
+    while month <= add_months(current, MONTHS_AHEAD):
+        op.execute(partition_ddl("enterprise_queries", month))
+        month = add_months(month, 1)
+
+    op.execute("INSERT INTO enterprise_queries SELECT * FROM enterprise_queries_legacy")
+    op.execute("ALTER SEQUENCE enterprise_queries_id_seq OWNED BY enterprise_queries.id")
+    op.execute("DROP TABLE enterprise_queries_legacy")
+
+    _create_indexes()
+    op.execute("CREATE INDEX IF NOT EXISTS ix_query_exports_query_id ON query_exports (query_id)")
+    op.execute("ANALYZE enterprise_queries")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_query_exports_query_id")
+    op.execute("ALTER TABLE enterprise_queries RENAME TO enterprise_queries_partitioned")
+    _drop_indexes()
+
+    op.execute(
+        "CREATE TABLE enterprise_queries "
+        "(LIKE enterprise_queries_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    op.execute("INSERT INTO enterprise_queries SELECT * FROM enterprise_queries_partitioned")
+    op.execute("ALTER SEQUENCE enterprise_queries_id_seq OWNED BY enterprise_queries.id")
+    op.execute("DROP TABLE enterprise_queries_partitioned CASCADE")
+
+    op.execute("ALTER TABLE enterprise_queries ALTER COLUMN created_at DROP NOT NULL")
+    op.execute("ALTER TABLE enterprise_queries ADD PRIMARY KEY (id)")
+    for column, target in (("user_id", "users"), ("enterprise_id", "enterprises"), ("department_id", "departments")):
+        op.execute(f"ALTER TABLE enterprise_queries ADD FOREIGN KEY ({column}) REFERENCES {target} (id)")
+    op.execute(
+        "ALTER TABLE enterprise_queries ADD CONSTRAINT enterprise_queries_parent_query_id_fkey "
+        "FOREIGN KEY (parent_query_id) REFERENCES enterprise_queries (id)"
+    )
+    op.execute(
+        "ALTER TABLE query_exports ADD CONSTRAINT query_exports_query_id_fkey "
+        "FOREIGN KEY (query_id) REFERENCES enterprise_queries (id)"
+    )
+    _create_indexes()
@@ -0,0 +1,189 @@
+"""move query response bodies to compressed cold storage
+
+Creates enterprise_query_bodies (partitioned by month like
+enterprise_queries), moves ai_response, structured_data and
+conversation_context into it as compressed JSON, then drops those columns
+so analytic scans of enterprise_queries read narrow rows.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+import json
+import zlib
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+ZLIB_LEVEL = 6
+
+bodies = sa.table(
+    "enterprise_query_bodies",
+    sa.column("query_id", sa.Integer),
+    sa.column("created_at", sa.DateTime(timezone=True)),
+    sa.column("codec", sa.String),
+    sa.column("payload", sa.LargeBinary),
+    sa.column("raw_bytes", sa.Integer),
+)
+
+
+# Body and partition helpers are inlined (not imported from app.services) so this revision stays frozen
+def partition_ddl(table: str, month: date) -> str:
+    index = month.year * 12 + month.month
+    end = date(index // 12, index % 12 + 1, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_p{month.year:04d}{month.month:02d} "
+        f"PARTITION OF {table} FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def build_body_row(query_id, created_at, ai_response, structured_data, conversation_context) -> dict:
+    """Row values for enterprise_query_bodies; always zlib, which every reader understands"""
+    raw = json.dumps(
+        {"ai_response": ai_response, "structured_data": structured_data, "conversation_context": conversation_context},
+        default=str,
+        separators=(",", ":")
+    ).encode("utf-8")
+    return {
+        "query_id": query_id,
+        "created_at": created_at,
+        "codec": "zlib",
+        "payload": zlib.compress(raw, ZLIB_LEVEL),
+        "raw_bytes": len(raw),
+    }
+
+
+def decompress_body(codec: str, payload: bytes) -> dict:
+    """Bodies written since the upgrade may be zstd"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed query bodies")
+        return json.loads(zstandard.ZstdDecompressor().decompress(payload))
+    if codec == "zlib":
+        return json.loads(zlib.decompress(payload))
+    raise ValueError(f"Unknown query body codec: {codec}")
+
+
+def _query_log_months(bind) -> list:
+    """First day of every month that has an enterprise_queries partition"""
+    rows = bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'enterprise_queries'"
+    )).fetchall()
+    months = []
+    for (name,) in rows:
+        suffix = name.rsplit("_p", 1)[-1]
+        if suffix.isdigit() and len(suffix) == 6:
+            months.append(date(int(suffix[:4]), int(suffix[4:]), 1))
+    return sorted(months)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    op.execute(
+        "CREATE TABLE enterprise_query_bodies ("
+        "query_id INTEGER NOT NULL, "
+        "created_at TIMESTAMP WITH TIME ZONE NOT NULL, "
+        "codec VARCHAR NOT NULL, "
+        "payload BYTEA NOT NULL, "
+        "raw_bytes INTEGER NOT NULL, "
+        "PRIMARY KEY (query_id, created_at)"
+        ") PARTITION BY RANGE (created_at)"
+    )
+    for month in _query_log_months(bind):
+        op.execute(partition_ddl("enterprise_query_bodies", month))
+
+    op.add_column("enterprise_queries", sa.Column("response_length", sa.Integer(), nullable=True))
+
+    # Copy existing bodies in keyset-ordered batches, compressing client-side
+    last = None
+    while True:
+        where = "WHERE (ai_response IS NOT NULL OR structured_data IS NOT NULL OR conversation_context IS NOT NULL)"
+        params = {"limit": BATCH_SIZE}
+        if last:
+            where += " AND (created_at, id) > (:last_created_at, :last_id)"
+            params.update({"last_created_at": last[0], "last_id": last[1]})
+        rows = bind.execute(sa.text(
+            "SELECT id, created_at, ai_response, structured_data, conversation_context "
+            f"FROM enterprise_queries {where} ORDER BY created_at, id LIMIT :limit"
+        ), params).fetchall()
+        if not rows:
+            break
+        bind.execute(bodies.insert(), [
+            build_body_row(
+                query_id=row.id,
+                created_at=row.created_at,
+                ai_response=row.ai_response,
+                structured_data=row.structured_data,
+                conversation_context=row.conversation_context
+            )
+            for row in rows
+        ])
+        last = (rows[-1].created_at, rows[-1].id)
+
+    op.execute("UPDATE enterprise_queries SET response_length = length(ai_response) WHERE ai_response IS NOT NULL")
+    op.drop_column("enterprise_queries", "ai_response")
+    op.drop_column("enterprise_queries", "structured_data")
+    op.drop_column("enterprise_queries", "conversation_context")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    op.add_column("enterprise_queries", sa.Column("ai_response", sa.Text(), nullable=True))
+    op.add_column("enterprise_queries", sa.Column("structured_data", sa.JSON(), nullable=True))
+    op.add_column("enterprise_queries", sa.Column("conversation_context", sa.JSON(), nullable=True))
+
+    last = None
+    while True:
+        where, params = "", {"limit": BATCH_SIZE}
+        if last:
+            where = "WHERE (created_at, query_id) > (:last_created_at, :last_id)"
+            params.update({"last_created_at": last[0], "last_id": last[1]})
+        rows = bind.execute(sa.text(
+            "SELECT query_id, created_at, codec, payload FROM enterprise_query_bodies "
+            f"{where} ORDER BY created_at, query_id LIMIT :limit"
+        ), params).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            body = decompress_body(row.codec, row.payload)
+            bind.execute(
+                sa.text(
+                    "UPDATE enterprise_queries SET ai_response = :ai_response, "
+                    "structured_data = CAST(:structured_data AS JSON), "
+                    "conversation_context = CAST(:conversation_context AS JSON) "
+                    "WHERE id = :query_id AND created_at = :created_at"
+                ),
+                {
+                    "ai_response": body.get("ai_response"),
+                    "structured_data": json.dumps(body.get("structured_data")),
+                    "conversation_context": json.dumps(body.get("conversation_context")),
+                    "query_id": row.query_id,
+                    "created_at": row.created_at,
+                }
+            )
+        last = (rows[-1].created_at, rows[-1].query_id)
+
+    op.drop_column("enterprise_queries", "response_length")
+    op.execute("DROP TABLE enterprise_query_bodies")
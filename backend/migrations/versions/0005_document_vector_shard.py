@@ -0,0 +1,39 @@
+"""record the vector collection shard of each document
+
+Adds documents.vector_shard ("fiscal_year:2023", "category:financial", ...)
+so searches can list an enterprise's shards and skip the ones a filter rules
+out. Existing rows stay NULL: their chunks are in the unsharded
+enterprise_{id}_docs collection, which is searched like any other shard.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable without a default: a catalog-only change, no table rewrite
+    op.add_column("documents", sa.Column("vector_shard", sa.String(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_enterprise_vector_shard "
+            "ON documents (enterprise_id, vector_shard)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_enterprise_vector_shard")
+    op.drop_column("documents", "vector_shard")
@@ -0,0 +1,227 @@
+"""partition the query log by retention tier, then by month
+
+Rebuilds enterprise_queries and enterprise_query_bodies as tables
+LIST-partitioned on a new retention_days column (one partition per
+retention tier), each tier RANGE-partitioned by month on created_at. Every
+enterprise's rows go to the tier of its data_retention_days, so retention
+is always DETACH/DROP of a monthly partition and never a row DELETE.
+
+Adds query_log_retention, recording the tier each enterprise's rows are in,
+so a later change of data_retention_days moves the rows once.
+
+The primary keys become (id, created_at, retention_days) and
+(query_id, created_at, retention_days).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Tiers, default and helpers are inlined (not imported from app.services) so this revision stays frozen
+RETENTION_TIERS = (30, 90, 180, 365, 730, 1095, 1825, 2555, 3650)
+DEFAULT_RETENTION_DAYS = 2555
+MONTHS_AHEAD = 3
+
+QUERY_INDEXES = [
+    ("ix_enterprise_queries_id", "id", None),
+    ("ix_enterprise_queries_enterprise_created", "enterprise_id, created_at, id", None),
+    ("ix_enterprise_queries_enterprise_type_created", "enterprise_id, query_type, created_at", None),
+    ("ix_enterprise_queries_enterprise_complexity_created", "enterprise_id, complexity, created_at", None),
+    ("ix_enterprise_queries_enterprise_user_created", "enterprise_id, user_id, created_at", None),
+    ("ix_enterprise_queries_rated", "enterprise_id, created_at", "user_satisfaction IS NOT NULL"),
+]
+FOREIGN_KEYS = (("user_id", "users"), ("enterprise_id", "enterprises"), ("department_id", "departments"))
+
+
+def retention_tier(retention_days) -> int:
+    days = retention_days or DEFAULT_RETENTION_DAYS
+    eligible = [tier for tier in RETENTION_TIERS if tier <= days]
+    return eligible[-1] if eligible else RETENTION_TIERS[0]
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def add_months(value, months: int):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def months_between(first, last) -> list:
+    months, month = [], month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def range_partition_ddl(parent: str, name: str, month) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {name}_p{month.year:04d}{month.month:02d} "
+        f"PARTITION OF {parent} FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def _columns(bind, table: str) -> str:
+    rows = bind.execute(
+        sa.text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = :table AND column_name <> 'retention_days' ORDER BY ordinal_position"
+        ),
+        {"table": table}
+    ).fetchall()
+    return ", ".join(row[0] for row in rows)
+
+
+def _drop_query_indexes() -> None:
+    for name, _, _ in QUERY_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _create_query_indexes() -> None:
+    for name, columns, predicate in QUERY_INDEXES:
+        where = f" WHERE {predicate}" if predicate else ""
+        op.execute(f"CREATE INDEX {name} ON enterprise_queries ({columns}){where}")
+
+
+def _set_aside(table: str, suffix: str) -> None:
+    """Rename a table (and its primary key) out of the way of its replacement"""
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_{suffix}")
+    op.execute(f"ALTER TABLE {table}_{suffix} RENAME CONSTRAINT {table}_pkey TO {table}_{suffix}_pkey")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    current = month_start(datetime.utcnow().date())
+
+    op.create_table(
+        "query_log_retention",
+        sa.Column("enterprise_id", sa.Integer(), sa.ForeignKey("enterprises.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("retention_days", sa.Integer(), nullable=False),
+        sa.Column("changed_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    enterprises = bind.execute(sa.text("SELECT id, data_retention_days FROM enterprises")).fetchall()
+    if enterprises:
+        bind.execute(
+            sa.text("INSERT INTO query_log_retention (enterprise_id, retention_days) VALUES (:enterprise_id, :tier)"),
+            [{"enterprise_id": row.id, "tier": retention_tier(row.data_retention_days)} for row in enterprises]
+        )
+
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM enterprise_queries")).scalar()
+    history = months_between(oldest.date() if oldest else current, add_months(current, MONTHS_AHEAD))
+    upcoming = months_between(current, add_months(current, MONTHS_AHEAD))
+    tiers_in_use = {retention_tier(row.data_retention_days) for row in enterprises}
+
+    # Query rows
+    _set_aside("enterprise_queries", "monthly")
+    _drop_query_indexes()
+    op.execute("ALTER TABLE enterprise_queries_monthly ADD COLUMN retention_days INTEGER")
+    op.execute(
+        "CREATE TABLE enterprise_queries "
+        "(LIKE enterprise_queries_monthly INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY LIST (retention_days)"
+    )
+    op.execute("ALTER TABLE enterprise_queries ALTER COLUMN retention_days SET NOT NULL")
+    op.execute("ALTER TABLE enterprise_queries ADD PRIMARY KEY (id, created_at, retention_days)")
+    for column, target in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE enterprise_queries ADD FOREIGN KEY ({column}) REFERENCES {target} (id)")
+
+    # Response bodies
+    _set_aside("enterprise_query_bodies", "monthly")
+    op.execute("ALTER TABLE enterprise_query_bodies_monthly ADD COLUMN retention_days INTEGER")
+    op.execute(
+        "CREATE TABLE enterprise_query_bodies "
+        "(LIKE enterprise_query_bodies_monthly INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY LIST (retention_days)"
+    )
+    op.execute("ALTER TABLE enterprise_query_bodies ALTER COLUMN retention_days SET NOT NULL")
+    op.execute("ALTER TABLE enterprise_query_bodies ADD PRIMARY KEY (query_id, created_at, retention_days)")
+
+    for table in ("enterprise_queries", "enterprise_query_bodies"):
+        for tier in RETENTION_TIERS:
+            op.execute(
+                f"CREATE TABLE {table}_r{tier} PARTITION OF {table} "
+                f"FOR VALUES IN ({tier}) PARTITION BY RANGE (created_at)"
+            )
+            # Past months only where existing rows can land; expired ones are dropped by the next retention cycle
+            for month in (history if tier in tiers_in_use or tier == DEFAULT_RETENTION_DAYS else upcoming):
+                op.execute(range_partition_ddl(f"{table}_r{tier}", f"{table}_r{tier}", month))
+
+    query_columns = _columns(bind, "enterprise_queries_monthly")
+    op.execute(
+        f"INSERT INTO enterprise_queries ({query_columns}, retention_days) "
+        f"SELECT {', '.join('q.' + column for column in query_columns.split(', '))}, "
+        f"COALESCE(r.retention_days, {DEFAULT_RETENTION_DAYS}) "
+        "FROM enterprise_queries_monthly q LEFT JOIN query_log_retention r ON r.enterprise_id = q.enterprise_id"
+    )
+    body_columns = _columns(bind, "enterprise_query_bodies_monthly")
+    op.execute(
+        f"INSERT INTO enterprise_query_bodies ({body_columns}, retention_days) "
+        f"SELECT {', '.join('b.' + column for column in body_columns.split(', '))}, q.retention_days "
+        "FROM enterprise_query_bodies_monthly b "
+        "JOIN enterprise_queries q ON q.id = b.query_id AND q.created_at = b.created_at"
+    )
+
+    op.execute("ALTER SEQUENCE enterprise_queries_id_seq OWNED BY enterprise_queries.id")
+    op.execute("DROP TABLE enterprise_query_bodies_monthly CASCADE")
+    op.execute("DROP TABLE enterprise_queries_monthly CASCADE")
+
+    _create_query_indexes()
+    op.execute("ANALYZE enterprise_queries")
+    op.execute("ANALYZE enterprise_query_bodies")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    current = month_start(datetime.utcnow().date())
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM enterprise_queries")).scalar()
+    months = months_between(oldest.date() if oldest else current, add_months(current, MONTHS_AHEAD))
+
+    _set_aside("enterprise_queries", "tiered")
+    _drop_query_indexes()
+    op.execute(
+        "CREATE TABLE enterprise_queries "
+        "(LIKE enterprise_queries_tiered INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE enterprise_queries DROP COLUMN retention_days")
+    op.execute("ALTER TABLE enterprise_queries ADD PRIMARY KEY (id, created_at)")
+    for column, target in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE enterprise_queries ADD FOREIGN KEY ({column}) REFERENCES {target} (id)")
+
+    _set_aside("enterprise_query_bodies", "tiered")
+    op.execute(
+        "CREATE TABLE enterprise_query_bodies "
+        "(LIKE enterprise_query_bodies_tiered INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE enterprise_query_bodies DROP COLUMN retention_days")
+    op.execute("ALTER TABLE enterprise_query_bodies ADD PRIMARY KEY (query_id, created_at)")
+
+    for table in ("enterprise_queries", "enterprise_query_bodies"):
+        for month in months:
+            op.execute(range_partition_ddl(table, table, month))
+        columns = _columns(bind, f"{table}_tiered")
+        op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_tiered")
+
+    op.execute("ALTER SEQUENCE enterprise_queries_id_seq OWNED BY enterprise_queries.id")
+    op.execute("DROP TABLE enterprise_query_bodies_tiered CASCADE")
+    op.execute("DROP TABLE enterprise_queries_tiered CASCADE")
+    op.drop_table("query_log_retention")
+
+    _create_query_indexes()
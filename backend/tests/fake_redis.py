@@ -0,0 +1,191 @@
+"""
+Fake Redis - In-memory stand-in for a redis.asyncio client in tests
+Covers what RedisRateLimitStore uses: register_script (EVALSHA, SCRIPT LOAD
+on NOSCRIPT, EVAL), HMGET/HSET/EXPIRE inside scripts and INCRBY/EXPIRE
+pipelines. There is no Lua interpreter: each script is mapped by its exact
+source to a Python port, so a script edited without its port fails loudly
+"""
+import hashlib
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.rate_limit import _TAKE_SCRIPT
+
+
+class NoScriptError(Exception):
+    """NOSCRIPT No matching script. Please use EVAL."""
+
+
+def _encode(value: Any) -> bytes:
+    """Arguments reach Redis as bytes, numbers in their repr"""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+def _tonumber(value: Optional[bytes]) -> Optional[float]:
+    """Lua tonumber(): None for nil or non-numeric strings"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _lua_number(value: float) -> bytes:
+    """A Lua number passed to redis.call (stored as %.17g)"""
+    return format(value, ".17g").encode()
+
+
+def _lua_tostring(value: float) -> bytes:
+    """Lua tostring() of a number (%.14g; integral floats print without a fraction)"""
+    return format(value, ".14g").encode()
+
+
+def _take_port(redis: "FakeRedis", keys: List[bytes], argv: List[bytes]) -> List[Any]:
+    """Python port of rate_limit._TAKE_SCRIPT"""
+    cost, now = _tonumber(argv[0]), _tonumber(argv[1])
+    levels, allowed = [], 1
+    for i, key in enumerate(keys):
+        capacity, rate = _tonumber(argv[2 + 2 * i]), _tonumber(argv[3 + 2 * i])
+        tokens_raw, ts_raw = redis.hmget(key, b"tokens", b"ts")
+        tokens = _tonumber(tokens_raw)
+        tokens = capacity if tokens is None else tokens
+        ts = _tonumber(ts_raw)
+        ts = now if ts is None else ts
+        levels.append(min(capacity, tokens + max(0, now - ts) * rate))
+        if levels[i] < cost:
+            allowed = 0
+    result: List[Any] = [allowed]
+    for i, key in enumerate(keys):
+        capacity, rate = _tonumber(argv[2 + 2 * i]), _tonumber(argv[3 + 2 * i])
+        if allowed == 1:
+            levels[i] -= cost
+        redis.hset(key, {b"tokens": _lua_number(levels[i]), b"ts": _lua_number(now)})
+        redis.expire_now(key, math.ceil(capacity / rate) + 1)
+        result.append(_lua_tostring(levels[i]))
+    return result
+
+
+# Script source -> Python port
+SCRIPT_PORTS: Dict[str, Callable[["FakeRedis", List[bytes], List[bytes]], Any]] = {
+    _TAKE_SCRIPT: _take_port,
+}
+
+
+class FakeScript:
+    """Mirrors redis.commands.core.AsyncScript: EVALSHA, loading the script on NOSCRIPT"""
+
+    def __init__(self, client: "FakeRedis", source: str):
+        self.client = client
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def __call__(self, keys=(), args=(), client=None):
+        client = client or self.client
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            self.sha = await client.script_load(self.source)
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute(), like a MULTI/EXEC pipeline"""
+
+    def __init__(self, client: "FakeRedis"):
+        self.client = client
+        self._commands: List[Callable[[], Any]] = []
+
+    def incrby(self, key: str, amount: int) -> "FakePipeline":
+        self._commands.append(lambda: self.client.incrby_now(_encode(key), amount))
+        return self
+
+    def expire(self, key: str, seconds: int) -> "FakePipeline":
+        self._commands.append(lambda: self.client.expire_now(_encode(key), seconds))
+        return self
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        return [command() for command in commands]
+
+
+class FakeRedis:
+    """Single-process Redis with the commands the rate limiter needs; `clock` is a time()-provider"""
+
+    def __init__(self, clock: Any = time):
+        self.clock = clock
+        self._data: Dict[bytes, Any] = {}
+        self._expires: Dict[bytes, float] = {}
+        self._scripts: Dict[str, Callable] = {}
+        self.commands: List[str] = []
+
+    def _live(self, key: bytes) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= self.clock.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    # Commands as they run inside a script or pipeline
+    def hmget(self, key: bytes, *fields: bytes) -> List[Optional[bytes]]:
+        values = self._data[key] if self._live(key) else {}
+        return [values.get(field) for field in fields]
+
+    def hset(self, key: bytes, mapping: Dict[bytes, bytes]) -> int:
+        self._live(key)  # Expired state is dropped first
+        values = self._data.setdefault(key, {})
+        added = sum(field not in values for field in mapping)
+        values.update(mapping)
+        return added
+
+    def expire_now(self, key: bytes, seconds: int) -> int:
+        if not self._live(key):
+            return 0
+        self._expires[key] = self.clock.time() + seconds
+        return 1
+
+    def incrby_now(self, key: bytes, amount: int) -> int:
+        value = int(self._data[key]) + amount if self._live(key) else amount
+        self._data[key] = str(value).encode()
+        return value
+
+    # Client API
+    def register_script(self, source: str) -> FakeScript:
+        return FakeScript(self, source)
+
+    def pipeline(self) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def script_load(self, source: str) -> str:
+        self.commands.append("SCRIPT LOAD")
+        if source not in SCRIPT_PORTS:
+            raise NotImplementedError("FakeRedis has no Python port of this script; add one to SCRIPT_PORTS")
+        sha = hashlib.sha1(source.encode()).hexdigest()
+        self._scripts[sha] = SCRIPT_PORTS[source]
+        return sha
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self.commands.append("EVALSHA")
+        if sha not in self._scripts:
+            raise NoScriptError(f"NOSCRIPT No matching script: {sha}")
+        return self._run(self._scripts[sha], numkeys, keys_and_args)
+
+    async def eval(self, source: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self.commands.append("EVAL")
+        sha = await self.script_load(source)
+        return self._run(self._scripts[sha], numkeys, keys_and_args)
+
+    def _run(self, port: Callable, numkeys: int, keys_and_args: tuple) -> Any:
+        encoded = [_encode(value) for value in keys_and_args]
+        return port(self, encoded[:numkeys], encoded[numkeys:])
+
+    async def incrby(self, key: str, amount: int) -> int:
+        return self.incrby_now(_encode(key), amount)
+
+    async def expire(self, key: str, seconds: int) -> int:
+        return self.expire_now(_encode(key), seconds)
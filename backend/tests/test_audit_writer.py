@@ -0,0 +1,76 @@
+"""
+Audit writer buffering when the database rejects rows or is unreachable
+_write is replaced by an in-memory fake, so no database is needed
+"""
+import asyncio
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.services.audit_writer import AuditWriter
+
+BAD_DEPARTMENT = 99
+
+
+class FakeDatabase:
+    """Takes batches like AuditWriter._write; rows with BAD_DEPARTMENT fail the whole batch"""
+
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    async def write(self, batch):
+        if self.down:
+            raise OperationalError("INSERT", {}, ConnectionError("connection refused"))
+        if any(query_row["department_id"] == BAD_DEPARTMENT for query_row, _ in batch):
+            raise IntegrityError("INSERT", {}, Exception("violates foreign key constraint"))
+        self.rows.extend(query_row["id"] for query_row, _ in batch)
+
+
+def make_writer(**options):
+    writer = AuditWriter(mode="async", batch_size=8, max_pending=20, max_buffered=30, max_attempts=3, **options)
+    database = FakeDatabase()
+    writer._write = database.write
+    return writer, database
+
+
+def record(writer, query_id, department_id=1):
+    asyncio.run(writer.record({"id": query_id, "department_id": department_id}, {"query_id": query_id}))
+
+
+def test_bad_row_is_isolated_then_dropped():
+    writer, database = make_writer()
+    for query_id in range(10):
+        record(writer, query_id, BAD_DEPARTMENT if query_id == 4 else 1)
+
+    assert asyncio.run(writer.flush()) == 9
+    assert sorted(database.rows) == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+    assert writer.is_pending(4)
+
+    asyncio.run(writer.flush())
+    asyncio.run(writer.flush())
+    assert not writer.is_pending(4)
+    assert writer.stats["rows_dropped"] == 1
+
+
+def test_unreachable_database_keeps_rows_up_to_the_hard_cap():
+    writer, database = make_writer()
+    database.down = True
+    for query_id in range(50):
+        record(writer, query_id)
+
+    assert len(writer._pending) == 30
+    assert writer.stats["rows_evicted"] == 20
+    assert not writer.is_pending(0) and writer.is_pending(49)
+
+    database.down = False
+    assert asyncio.run(writer.flush()) == 30
+    assert database.rows == list(range(20, 50))
+
+
+def test_ensure_written_flushes_a_pending_query():
+    writer, database = make_writer()
+    record(writer, 1)
+    assert database.rows == []
+    asyncio.run(writer.ensure_written(1))
+    assert database.rows == [1]
+    assert not writer.is_pending(1)
@@ -0,0 +1,63 @@
+"""
+Extractive answers cite the document their figure came from
+Chunks carry the metadata DocumentService.process_document stores with them
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("dateparser")
+
+from app.core.config import settings
+from app.models.enterprise_query import QueryType
+from app.services.enterprise_analysis_service import EnterpriseAnalysisService
+from app.services.extractive_answering import ExtractiveAnswerer
+
+
+def stored_chunk(content: str, original_filename: str, document_id: int) -> dict:
+    """A retrieved chunk with the metadata written at ingestion"""
+    return {
+        "content": content,
+        "score": 0.9,
+        "metadata": {
+            "source": original_filename,
+            "document_id": document_id,
+            "enterprise_id": 1,
+            "category": "financial",
+            "fiscal_period": "FY2024",
+            "fiscal_year": 2024,
+            "chunk_index": 0,
+            "is_confidential": False,
+        },
+    }
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    return EnterpriseAnalysisService()
+
+
+def test_extractive_answer_cites_the_source_file(service):
+    chunk = stored_chunk(
+        "Department | January | February\n"
+        "Marketing | $12,000 | $15,000\n"
+        "Sales | $18,000 | $18,500\n"
+        "\n"
+        "Figures exclude travel.",
+        "q1_expenses.pdf",
+        7
+    )
+    query_analysis = {"type": QueryType.FINANCIAL, "is_lookup": True}
+    processed = asyncio.run(service._process_document_data([chunk], query_analysis))
+    assert processed["text_content"][0]["source"] == "q1_expenses.pdf"
+
+    answer = ExtractiveAnswerer(min_confidence=0.5).answer(
+        "What was Marketing in January?", processed["tables"], processed["financial_data"]
+    )
+    assert answer is not None
+    assert answer["text"].endswith("(source: q1_expenses.pdf)")
+    assert answer["answer"]["source"] == "q1_expenses.pdf"
+    assert answer["answer"]["document_id"] == 7
@@ -0,0 +1,57 @@
+"""
+Filtered search recall on a trained IVF QuantizedIndex
+Clustered random embeddings, with exact brute-force neighbours as ground truth
+"""
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.quantized_index import QuantizedIndex
+
+DIM = 32
+COUNT = 6000
+K = 10
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QUANTIZED_TRAIN_MIN_VECTORS", 2000)
+    monkeypatch.setattr(settings, "QUANTIZED_NPROBE", 4)
+    monkeypatch.setattr(settings, "QUANTIZED_RERANK_FACTOR", 8)
+    rng = np.random.default_rng(7)
+    centers = rng.normal(size=(40, DIM))
+    vectors = (centers[rng.integers(0, 40, COUNT)] + rng.normal(scale=0.6, size=(COUNT, DIM))).astype(np.float32)
+    # One chunk in five is in the filtered period: too many rows to score them all
+    periods = ["Q1-2024" if i % 5 == 0 else "Q2-2024" for i in range(COUNT)]
+    index = QuantizedIndex(str(tmp_path / "collection"))
+    index.add(
+        [f"chunk-{i}" for i in range(COUNT)], vectors, [f"chunk {i}" for i in range(COUNT)],
+        [{"fiscal_period": period} for period in periods]
+    )
+    assert index.centroids is not None
+    return index, vectors / np.linalg.norm(vectors, axis=1, keepdims=True), np.array(periods)
+
+
+def recall(index, vectors, allowed_mask, queries) -> float:
+    found = 0
+    for query in queries:
+        scores = np.where(allowed_mask, vectors @ (query / np.linalg.norm(query)), -np.inf)
+        truth = {f"chunk-{i}" for i in np.argsort(-scores)[:K]}
+        where = {"fiscal_period": "Q1-2024"} if not allowed_mask.all() else None
+        found += len(truth & {hit["id"] for hit in index.query(query, K, where=where)})
+    return found / (K * len(queries))
+
+
+def test_filtered_recall_keeps_up_with_unfiltered(index):
+    index, vectors, periods = index
+    queries = np.random.default_rng(11).normal(size=(40, DIM)).astype(np.float32)
+    unfiltered = recall(index, vectors, np.ones(COUNT, dtype=bool), queries)
+    filtered = recall(index, vectors, periods == "Q1-2024", queries)
+    assert filtered >= unfiltered - 0.05
+
+
+def test_filtered_search_returns_k_allowed_rows(index):
+    index, vectors, periods = index
+    hits = index.query(vectors[3], K, where={"fiscal_period": "Q1-2024"})
+    assert len(hits) == K
+    assert all(hit["metadata"]["fiscal_period"] == "Q1-2024" for hit in hits)
@@ -0,0 +1,165 @@
+"""
+Rate limiter stores and the query-limit dependency
+Every case runs against MemoryRateLimitStore and against RedisRateLimitStore
+on tests/fake_redis.FakeRedis, with time driven by a fake clock
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.core import rate_limit
+from app.core.config import settings
+from tests.fake_redis import FakeRedis
+
+
+class FakeClock:
+    """Stands in for the time module: one clock behind time() and monotonic()"""
+
+    def __init__(self, start: float = 1_700_000_000.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, clock):
+    if request.param == "memory":
+        return rate_limit.MemoryRateLimitStore()
+    return rate_limit.RedisRateLimitStore(client=FakeRedis(clock=clock))
+
+
+def test_bucket_drains_then_refills(store, clock):
+    bucket = [("bucket:user:1", 2, 1.0)]
+    assert run(store.take(bucket))[0]
+    assert run(store.take(bucket))[0]
+
+    allowed, [(tokens, retry_after)] = run(store.take(bucket))
+    assert not allowed
+    assert tokens == pytest.approx(0)
+    assert retry_after == pytest.approx(1.0)
+
+    clock.advance(1.0)
+    allowed, [(tokens, _)] = run(store.take(bucket))
+    assert allowed
+    assert tokens == pytest.approx(0)
+
+
+def test_refill_is_capped_at_capacity(store, clock):
+    bucket = [("bucket:user:1", 3, 1.0)]
+    run(store.take(bucket))
+    clock.advance(3600)
+    _, [(tokens, _)] = run(store.take(bucket))
+    assert tokens == pytest.approx(2)
+
+
+def test_short_bucket_takes_nothing_from_the_others(store):
+    user = ("bucket:user:1", 5, 1.0)
+    enterprise = ("bucket:enterprise:1", 1, 1.0)
+    assert run(store.take([user, enterprise]))[0]
+
+    allowed, [(user_tokens, _), (enterprise_tokens, _)] = run(store.take([user, enterprise]))
+    assert not allowed
+    assert user_tokens == pytest.approx(4)
+    assert enterprise_tokens == pytest.approx(0)
+
+    # The user's own bucket is untouched by the rejection
+    _, [(user_tokens, _)] = run(store.take([user]))
+    assert user_tokens == pytest.approx(3)
+
+
+def test_counter_resets_with_its_window(store, clock):
+    assert run(store.incr("quota:day:1", 1, 60)) == 1
+    assert run(store.incr("quota:day:1", 1, 60)) == 2
+    assert run(store.incr("quota:day:1", -1, 60)) == 1
+    clock.advance(61)
+    assert run(store.incr("quota:day:1", 1, 60)) == 1
+
+
+def test_redis_store_loads_its_script_on_noscript(clock):
+    client = FakeRedis(clock=clock)
+    store = rate_limit.RedisRateLimitStore(client=client)
+    run(store.take([("bucket:user:1", 2, 1.0)]))
+    run(store.take([("bucket:user:1", 2, 1.0)]))
+    assert client.commands == ["EVALSHA", "SCRIPT LOAD", "EVALSHA", "EVALSHA"]
+
+
+@pytest.fixture
+def limits(monkeypatch, store):
+    """enforce_query_limits wired to `store`; returns the plan quotas to edit per test"""
+    quotas = {"daily": None, "monthly": None}
+
+    async def get_limits(enterprise_id):
+        return dict(quotas)
+
+    monkeypatch.setattr(rate_limit, "rate_limit_store", store)
+    monkeypatch.setattr(rate_limit, "_get_enterprise_limits", get_limits)
+    monkeypatch.setattr(settings, "ENABLE_API_RATE_LIMITING", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 60)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENTERPRISE_PER_MINUTE", 600)
+    return quotas
+
+
+def enforce(user_id: int = 1, enterprise_id: int = 1) -> Response:
+    response = Response()
+    user = SimpleNamespace(id=user_id, enterprise_id=enterprise_id)
+    run(rate_limit.enforce_query_limits(response, current_user=user))
+    return response
+
+
+def test_zero_limit_disables_the_bucket(limits, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENTERPRISE_PER_MINUTE", 0)
+    for _ in range(5):
+        response = enforce()
+    assert "X-RateLimit-Limit" not in response.headers
+
+
+def test_enterprise_rejection_keeps_the_user_token(limits, monkeypatch, store):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENTERPRISE_PER_MINUTE", 1)
+    assert enforce(user_id=1).headers["X-RateLimit-Remaining"] == "59"
+
+    with pytest.raises(HTTPException) as rejected:
+        enforce(user_id=2)
+    assert rejected.value.status_code == 429
+    assert "enterprise" in rejected.value.detail
+    assert rejected.value.headers["X-RateLimit-Remaining"] == "60"
+
+
+def test_rejections_do_not_consume_quota(limits, monkeypatch, clock):
+    limits["daily"] = 2
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENTERPRISE_PER_MINUTE", 1)
+    enforce()
+
+    # Rejected by the burst limit: the daily quota is handed back
+    with pytest.raises(HTTPException) as rejected:
+        enforce()
+    assert "enterprise" in rejected.value.detail
+    assert rejected.value.headers["Retry-After"] == "60"
+
+    clock.advance(60)
+    assert enforce().headers["X-Quota-Daily-Remaining"] == "0"
+
+    clock.advance(60)
+    with pytest.raises(HTTPException) as rejected:
+        enforce()
+    assert "Daily" in rejected.value.detail
@@ -0,0 +1,104 @@
+"""
+Reranker latency budget with a cross-encoder configured
+The model is a fake whose predict() advances a fake clock by a set cost per pair
+"""
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import reranker as reranker_module
+from app.services.reranker import Reranker
+
+
+class FakeClock:
+    """Stands in for the time module behind perf_counter()"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class FakeCrossEncoder:
+    """Scores pairs by content length; `ms_per_pair` is what each pair costs on the clock"""
+
+    clock = None
+    ms_per_pair = 1.0
+    first_call_ms = 0.0
+    calls = []
+
+    def __init__(self, name, device=None):
+        pass
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=None):
+        cls = type(self)
+        cls.clock.now += (cls.first_call_ms if not cls.calls else cls.ms_per_pair * len(pairs)) / 1000
+        cls.calls.append([content for _, content in pairs])
+        return [len(content) / 10 for _, content in pairs]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(reranker_module, "time", clock)
+    monkeypatch.setattr(reranker_module, "CrossEncoder", FakeCrossEncoder)
+    monkeypatch.setattr(settings, "RERANK_MODEL", "fake-cross-encoder")
+    monkeypatch.setattr(settings, "RERANK_BUDGET_MS", 150)
+    monkeypatch.setattr(FakeCrossEncoder, "clock", clock)
+    monkeypatch.setattr(FakeCrossEncoder, "calls", [])
+    monkeypatch.setattr(FakeCrossEncoder, "ms_per_pair", 1.0)
+    monkeypatch.setattr(FakeCrossEncoder, "first_call_ms", 0.0)
+    return FakeCrossEncoder
+
+
+def candidates(count: int, query_word: str = "revenue"):
+    """Chunk i mentions the query word i times, so the lexical order is the reverse of the list"""
+    return [
+        {"content": f"chunk {i} " + " ".join([query_word] * i), "score": 0.5}
+        for i in range(count)
+    ]
+
+
+def rerank(reranker: Reranker, query: str, docs):
+    return asyncio.run(reranker.rerank(query, docs, top_n=5))
+
+
+def test_slow_first_predict_does_not_lock_the_model_out(model):
+    model.first_call_ms = 5000
+    reranker = Reranker()
+    rerank(reranker, "revenue one", candidates(50))
+    rerank(reranker, "revenue two", candidates(50))
+    rerank(reranker, "revenue three", candidates(50))
+    assert [len(call) for call in model.calls] == [50, 50, 50]
+    assert reranker.stats["model_over_budget"] == 0
+
+
+def test_model_scores_only_the_lexical_top_that_fits(model):
+    reranker = Reranker()
+    rerank(reranker, "revenue warm", candidates(50))  # Warm-up, unmeasured
+    model.ms_per_pair = 10.0
+    rerank(reranker, "revenue measured", candidates(50))  # Measured at 10 ms per pair
+    kept = rerank(reranker, "revenue budget", candidates(50))
+
+    sent = model.calls[-1]
+    assert len(sent) == 15
+    # The candidates mentioning the query word most were sent, and they make up the top
+    assert sent[0].count("revenue") == 49
+    assert all(doc["content"] in sent for doc in kept)
+    assert reranker.stats["model_over_budget"] >= 1
+
+
+def test_model_is_probed_again_after_a_slow_spell(model):
+    reranker = Reranker()
+    rerank(reranker, "revenue warm", candidates(20))
+    model.ms_per_pair = 1000.0
+    rerank(reranker, "revenue slow", candidates(20))
+    calls = len(model.calls)
+
+    model.ms_per_pair = 1.0
+    for i in range(30):
+        rerank(reranker, f"revenue query {i}", candidates(20))
+    assert len(model.calls) > calls
+    assert len(model.calls[-1]) == 20
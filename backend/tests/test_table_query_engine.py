@@ -0,0 +1,66 @@
+"""
+Planning and executing questions over an ingested spreadsheet
+The CSV goes through TabularStore.ingest, so column types are the ones production sees
+"""
+import pytest
+
+from app.services.tabular_store import tabular_store
+from app.services.table_query_engine import TableQueryEngine
+
+EXPENSES = (
+    "Month,Department,Amount($),Pct(%)\n"
+    "January,Marketing,\"$12,000\",40%\n"
+    "January,Sales,\"$18,000\",60%\n"
+    "February,Marketing,\"$15,000\",45%\n"
+    "February,Sales,\"$18,500\",55%\n"
+    "March,Marketing,\"$9,000\",35%\n"
+)
+
+
+@pytest.fixture
+def tables(tmp_path, monkeypatch):
+    """Catalog entries for EXPENSES, ingested into a store rooted in tmp_path"""
+    monkeypatch.setattr(tabular_store, "root", str(tmp_path))
+    path = tmp_path / "expenses.csv"
+    path.write_text(EXPENSES)
+    return [
+        {"path": table["path"], "name": table["name"], "source": table["source"]}
+        for table in tabular_store.ingest(1, 1, str(path), "expenses.csv")
+    ]
+
+
+def ask(query, tables):
+    return TableQueryEngine().run(query, {"date_mentions": [], "entities": []}, tables)
+
+
+def test_month_comparison_sums_the_amount(tables):
+    [result] = ask("January vs February marketing expenses", tables)
+    assert result["operation"] == "sum of Amount($)"
+    assert result["rows"] == [["January", 12000.0], ["February", 15000.0]]
+    assert result["summary"] == {"change": 3000.0, "change_pct": 25.0}
+
+
+def test_total_for_one_month(tables):
+    [result] = ask("What was the total marketing spend in January?", tables)
+    assert result["columns"] == ["Amount($)"]
+    assert result["rows"] == [[12000.0]]
+    assert result["matched_rows"] == 1
+
+
+def test_named_measure_is_used_as_asked(tables):
+    [result] = ask("Average pct for marketing", tables)
+    assert result["operation"] == "mean of Pct(%)"
+    assert result["rows"] == [[40.0]]
+
+
+def test_counts_only_when_asked(tables):
+    [result] = ask("How many marketing entries are there?", tables)
+    assert result["rows"] == [[3]]
+
+
+def test_unresolvable_amount_falls_back_to_the_llm(tmp_path, monkeypatch):
+    monkeypatch.setattr(tabular_store, "root", str(tmp_path))
+    path = tmp_path / "budget.csv"
+    path.write_text("Month,Department,Budget($),Actual($)\nJanuary,Marketing,100,90\n")
+    [table] = tabular_store.ingest(1, 2, str(path), "budget.csv")
+    assert ask("Marketing expenses in January", [table]) == []
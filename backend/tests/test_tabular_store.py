@@ -0,0 +1,71 @@
+"""
+Spreadsheet ingestion into Parquet tables
+CSV files are written to tmp_path and ingested into a TabularStore rooted there
+"""
+import logging
+
+import pandas as pd
+
+from app.services.tabular_store import SOURCE_ROW_COLUMN, TabularStore
+
+
+def ingest(tmp_path, text: str, batch_rows: int = 1000):
+    path = tmp_path / "upload.csv"
+    path.write_text(text)
+    store = TabularStore(root=str(tmp_path / "tables"), batch_rows=batch_rows)
+    [table] = store.ingest(1, 1, str(path), "expenses.csv")
+    return table, store.read(table)
+
+
+def column_types(table):
+    return {column["name"]: column["type"] for column in table["columns"]}
+
+
+def test_month_names_stay_labels(tmp_path):
+    table, frame = ingest(tmp_path, (
+        "Month,Department,Amount($)\n"
+        "January,Marketing,\"$12,000\"\n"
+        "February,Marketing,\"$15,000\"\n"
+    ))
+    assert column_types(table) == {"Month": "string", "Department": "string", "Amount($)": "number"}
+    assert frame["Month"].tolist() == ["January", "February"]
+    assert frame["Amount($)"].tolist() == [12000.0, 15000.0]
+
+
+def test_dates_with_a_year_are_datetimes(tmp_path):
+    table, frame = ingest(tmp_path, "Date,Amount\n2024-01-15,10\n3/2/2024,20\nJan 5 2024,30\n")
+    assert column_types(table)["Date"] == "datetime"
+    assert frame["Date"].dt.month.tolist() == [1, 3, 1]
+    assert frame["Date"].dt.year.tolist() == [2024, 2024, 2024]
+
+
+def test_title_rows_are_skipped_and_source_rows_kept(tmp_path):
+    table, frame = ingest(tmp_path, (
+        "Quarterly expenses report\n"
+        "\n"
+        "Month,Amount\n"
+        "January,10\n"
+        "\n"
+        "February,20\n"
+    ))
+    assert [column["name"] for column in table["columns"]] == ["Month", "Amount"]
+    assert frame[SOURCE_ROW_COLUMN].tolist() == [4, 6]
+    assert table["row_count"] == 2
+
+
+def test_values_not_fitting_the_inferred_type_are_reported(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.services.tabular_store"):
+        table, frame = ingest(tmp_path, "Item,Amount\na,1\nb,2\nc,pending\nd,4\n", batch_rows=2)
+
+    amount = next(column for column in table["columns"] if column["name"] == "Amount")
+    assert amount["type"] == "number"
+    assert amount["unparsed"] == 1
+    assert pd.isna(frame["Amount"].iloc[2])
+    assert "column 'Amount': 1 value(s) not a number" in caplog.text
+    assert "rows 4" in caplog.text
+
+
+def test_quarter_labels_stay_labels(tmp_path):
+    table, frame = ingest(tmp_path, "Period,Amount\nQ1 2024,5\nQ2 2024,7\n")
+    assert column_types(table)["Period"] == "string"
+    assert frame["Period"].tolist() == ["Q1 2024", "Q2 2024"]